@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+API 延迟压测 - 批量签到运行期间，模拟多个仪表盘并发轮询，统计接口延迟分位数
+
+对比两种模式：
+- inline: 数据库方法和 SMTP 直接在事件循环中执行（旧实现的行为）
+- async: 数据库方法在独立线程池中执行，SMTP 在线程中执行（当前实现）
+
+签到请求和 SMTP 发送都是模拟的，不会访问网络。
+
+用法: python benchmarks/bench_api_latency.py [--accounts 20] [--pollers 20] [--smtp-delay 0.2]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+# 使用临时数据库，避免写入项目目录
+_data_dir = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_PATH', os.path.join(_data_dir, 'checkin.db'))
+os.environ.setdefault('DATABASE_KEY_PATH', os.path.join(_data_dir, 'secret.key'))
+
+import httpx
+
+import checkin
+import web.api as api
+from utils.notify import NotificationKit
+from web.auth import create_access_token
+from web.database import AsyncDatabase, db
+
+POLL_PATHS = ['/api/statistics', '/api/accounts', '/api/logs?limit=50']
+
+
+class InlineDatabase:
+	"""旧实现的行为：在事件循环中直接调用同步数据库方法"""
+
+	def __init__(self, database):
+		self._database = database
+
+	def __getattr__(self, name):
+		attr = getattr(self._database, name)
+		if not callable(attr):
+			return attr
+
+		async def method(*args, **kwargs):
+			return attr(*args, **kwargs)
+
+		return method
+
+	def shutdown(self):
+		pass
+
+
+def percentile(samples: list, p: float) -> float:
+	return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def seed(accounts: int) -> int:
+	user_id = db.add_user('bench', 'bench', 'Bench', role='admin')
+	for i in range(accounts):
+		account_id = db.add_account(
+			user_id, f'account-{i}', cookies='{"session": "x"}', api_user=str(i), email=f'user{i}@example.com'
+		)
+		db.add_balance_record(account_id, 100.0, 1.0)
+	return user_id
+
+
+async def run(mode: str, args, headers: dict) -> list:
+	api.adb = AsyncDatabase(db) if mode == 'async' else InlineDatabase(db)
+
+	async def fake_check_in_account(account, account_index, app_config):
+		await asyncio.sleep(args.checkin_delay)
+		return True, {'success': True, 'quota': 100.0, 'used_quota': 1.0}
+
+	def fake_send_email_to(self, to_email, title, content, msg_type='text'):
+		time.sleep(args.smtp_delay)
+
+	checkin.check_in_account = fake_check_in_account
+	NotificationKit.send_email_to = fake_send_email_to
+	if mode == 'inline':
+		# 旧实现在事件循环中直接调用 smtplib
+		async def inline_send_email_to(self, to_email, title, content, msg_type='text'):
+			self.send_email_to(to_email, title, content, msg_type)
+
+		NotificationKit.asend_email_to = inline_send_email_to
+
+	latencies = []
+	transport = httpx.ASGITransport(app=api.app)
+	async with httpx.AsyncClient(transport=transport, base_url='http://bench', headers=headers) as client:
+		checkin_task = asyncio.create_task(client.post('/api/checkin-all', timeout=None))
+
+		async def poll(index: int):
+			# 按固定节奏发起请求，延迟从计划发起时间算起，事件循环被阻塞的时间也会计入
+			scheduled = time.perf_counter()
+			i = index
+			while not checkin_task.done():
+				await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+				response = await client.get(POLL_PATHS[i % len(POLL_PATHS)])
+				latencies.append((time.perf_counter() - scheduled) * 1000)
+				response.raise_for_status()
+				i += 1
+				scheduled = max(scheduled + args.poll_interval, time.perf_counter())
+
+		await asyncio.gather(*(poll(i) for i in range(args.pollers)))
+		(await checkin_task).raise_for_status()
+
+	api.adb.shutdown()
+	return sorted(latencies)
+
+
+def main():
+	parser = argparse.ArgumentParser(description='API latency under concurrent dashboard polling')
+	parser.add_argument('--accounts', type=int, default=20)
+	parser.add_argument('--pollers', type=int, default=20)
+	parser.add_argument('--poll-interval', type=float, default=0.05, help='seconds between polls per client')
+	parser.add_argument('--checkin-delay', type=float, default=0.05, help='simulated check-in request time')
+	parser.add_argument('--smtp-delay', type=float, default=0.2, help='simulated blocking SMTP send time')
+	args = parser.parse_args()
+
+	user_id = seed(args.accounts)
+	token = create_access_token({'user_id': user_id, 'username': 'bench', 'role': 'admin'})
+	headers = {'Authorization': f'Bearer {token}'}
+	original_send_email_to = NotificationKit.send_email_to
+	original_asend_email_to = NotificationKit.asend_email_to
+
+	print(f'{"mode":<10}{"requests":>10}{"mean(ms)":>10}{"p50(ms)":>10}{"p95(ms)":>10}{"p99(ms)":>10}{"max(ms)":>10}')
+	for mode in ('inline', 'async'):
+		NotificationKit.send_email_to = original_send_email_to
+		NotificationKit.asend_email_to = original_asend_email_to
+		samples = asyncio.run(run(mode, args, headers))
+		print(
+			f'{mode:<10}{len(samples):>10}{statistics.mean(samples):>10.1f}{percentile(samples, 0.5):>10.1f}'
+			f'{percentile(samples, 0.95):>10.1f}{percentile(samples, 0.99):>10.1f}{samples[-1]:>10.1f}'
+		)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+签到流程压测 - 针对本地模拟 provider（benchmarks/fake_provider.py）运行完整的签到流程
+
+三种入口分别测试：
+- checkin: checkin.check_in_account（命令行 / GitHub Actions 使用的流程）
+- scheduler: web.scheduler.auto_checkin_task（定时任务，不分散签到）
+- api: POST /api/checkin-all（Web 批量签到后台任务）
+
+每个场景在独立的子进程中运行（使用临时数据库和 WAF cookies 缓存），输出吞吐量、总耗时、
+子进程峰值内存以及各阶段耗时（utils.timing 记录的 p50/p95）。WAF cookies 通过 HTTP 方式获取，不启动浏览器。
+
+用法: python benchmarks/bench_checkin.py [--accounts 10 100 1000] [--modes checkin scheduler api]
+	[--concurrency 20] [--latency-ms 20] [--block-rate 0.05]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+REPORT_STAGES = ['total', 'prepare_cookies', 'get_user_info', 'execute_check_in']
+
+
+def configure_environment(args, data_dir: str):
+	"""子进程导入项目模块前设置环境变量"""
+	os.environ['DATABASE_PATH'] = os.path.join(data_dir, 'checkin.db')
+	os.environ['DATABASE_KEY_PATH'] = os.path.join(data_dir, 'secret.key')
+	os.environ['PROVIDERS'] = json.dumps({'fake': {'domain': args.provider_url, 'bypass_method': 'waf_cookies'}})
+	os.environ['WAF_BYPASS_MODE'] = 'http'
+	os.environ['CHECKIN_CONCURRENCY'] = str(args.concurrency)
+	os.environ['SCHEDULER_CONCURRENCY'] = str(args.concurrency)
+	os.environ['CHECKIN_ALL_CONCURRENCY'] = str(args.concurrency)
+	os.environ['SCHEDULER_PROVIDER_RATE'] = '0'
+	os.environ['HTTP_POOL_MAX_CONNECTIONS'] = str(max(20, args.concurrency))
+	os.environ['HTTP_POOL_MAX_KEEPALIVE'] = str(max(5, args.concurrency))
+
+
+async def run_checkin(accounts: int) -> tuple[list[dict], int]:
+	import checkin
+	from utils.concurrency import run_bounded
+	from utils.config import AccountConfig, AppConfig
+	from utils.http_pool import http_pool
+	from utils.timing import record_timings, span
+
+	app_config = AppConfig.load_from_env()
+	configs = [
+		AccountConfig(cookies={'session': f's{i}'}, api_user=str(i), provider='fake', name=f'account-{i}')
+		for i in range(accounts)
+	]
+
+	async def worker(account: AccountConfig, index: int):
+		with span('total'):
+			return await checkin.check_in_account(account, index, app_config)
+
+	with record_timings() as recorder:
+		try:
+			results = await run_bounded(
+				configs,
+				worker,
+				max_concurrency=app_config.max_concurrency,
+				per_key_limit=app_config.provider_concurrency,
+				key=lambda account: account.provider,
+			)
+		finally:
+			await http_pool.aclose()
+	failures = sum(1 for success, _ in results if not success)
+	return recorder.spans, failures
+
+
+def seed_accounts(accounts: int) -> int:
+	from web.database import db
+
+	user_id = db.get_user_by_username('admin')['id']
+	for i in range(accounts):
+		db.add_account(
+			user_id, f'account-{i}', cookies=json.dumps({'session': f's{i}'}), api_user=str(i), provider='fake'
+		)
+	return user_id
+
+
+def read_timings() -> tuple[list[dict], int]:
+	"""读取本次运行写入的耗时记录和失败的签到数（每个场景使用独立的临时数据库）"""
+	from web.database import db
+
+	with db.get_connection() as conn:
+		cursor = conn.cursor()
+		cursor.execute('SELECT stage, duration_ms, success FROM checkin_timings')
+		spans = [dict(row) for row in cursor.fetchall()]
+		cursor.execute('SELECT COUNT(*) FROM checkin_logs WHERE success = 0')
+		failures = cursor.fetchone()[0]
+	return spans, failures
+
+
+async def run_scheduler(accounts: int) -> tuple[list[dict], int]:
+	import web.scheduler as scheduler
+	from utils.http_pool import http_pool
+
+	try:
+		await scheduler.auto_checkin_task(spread=False)
+	finally:
+		await http_pool.aclose()
+	return read_timings()
+
+
+async def run_api(accounts: int, user_id: int) -> tuple[list[dict], int]:
+	import httpx
+
+	import web.api as api
+	from utils.http_pool import http_pool
+	from web.auth import create_access_token
+
+	token = create_access_token({'user_id': user_id, 'username': 'admin', 'role': 'admin'})
+	transport = httpx.ASGITransport(app=api.app)
+	try:
+		async with httpx.AsyncClient(
+			transport=transport, base_url='http://bench', headers={'Authorization': f'Bearer {token}'}
+		) as client:
+			response = await client.post('/api/checkin-all')
+			response.raise_for_status()
+			await api.jobs.get(response.json()['data']['job_id']).task
+	finally:
+		await http_pool.aclose()
+	return read_timings()
+
+
+def run_scenario(args) -> dict:
+	"""在当前（子）进程中运行一个场景，返回统计结果"""
+	import asyncio
+	import resource
+	import time
+
+	with tempfile.TemporaryDirectory() as data_dir:
+		configure_environment(args, data_dir)
+		import checkin
+		from utils.timing import summarize_spans
+		from utils.waf_cache import WafCookieCache
+
+		# WAF cookies 缓存写到临时目录，避免使用项目目录中的缓存文件
+		checkin.waf_cookie_cache = WafCookieCache(os.path.join(data_dir, 'waf_cookies_cache.json'))
+
+		if args.run == 'checkin':
+			start = time.perf_counter()
+			spans, failures = asyncio.run(run_checkin(args.accounts))
+		else:
+			user_id = seed_accounts(args.accounts)
+			start = time.perf_counter()
+			if args.run == 'scheduler':
+				spans, failures = asyncio.run(run_scheduler(args.accounts))
+			else:
+				spans, failures = asyncio.run(run_api(args.accounts, user_id))
+		wall = time.perf_counter() - start
+
+	return {
+		'mode': args.run,
+		'accounts': args.accounts,
+		'failures': failures,
+		'wall_s': wall,
+		'throughput': args.accounts / wall,
+		# Linux 上 ru_maxrss 的单位是 KB
+		'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+		'stages': summarize_spans(spans),
+	}
+
+
+def print_report(results: list[dict]):
+	print(
+		f'\n{"mode":<11}{"accounts":>9}{"failed":>8}{"wall(s)":>9}{"acct/s":>9}{"rss(MB)":>9}'
+		+ ''.join(f'{stage + " p50/p95(ms)":>30}' for stage in REPORT_STAGES)
+	)
+	for result in results:
+		stages = ''
+		for stage in REPORT_STAGES:
+			stats = result['stages'].get(stage)
+			cell = f'{stats["p50_ms"]:.1f}/{stats["p95_ms"]:.1f}' if stats else '-'
+			stages += f'{cell:>30}'
+		print(
+			f'{result["mode"]:<11}{result["accounts"]:>9}{result["failures"]:>8}{result["wall_s"]:>9.2f}'
+			f'{result["throughput"]:>9.1f}{result["peak_rss_mb"]:>9.1f}{stages}'
+		)
+
+
+def main():
+	parser = argparse.ArgumentParser(description='End-to-end check-in benchmark against a local fake provider')
+	parser.add_argument('--accounts', type=int, nargs='+', default=[10, 100, 1000])
+	parser.add_argument(
+		'--modes', nargs='+', choices=['checkin', 'scheduler', 'api'], default=['checkin', 'scheduler', 'api']
+	)
+	parser.add_argument('--concurrency', type=int, default=20)
+	parser.add_argument('--latency-ms', type=float, default=20, help='simulated provider latency per request')
+	parser.add_argument('--block-rate', type=float, default=0.05, help='probability that an API request is WAF-blocked')
+	parser.add_argument('--json', action='store_true', help='print results as JSON lines')
+	# 以下参数供子进程使用
+	parser.add_argument('--run', choices=['checkin', 'scheduler', 'api'], help=argparse.SUPPRESS)
+	parser.add_argument('--provider-url', help=argparse.SUPPRESS)
+	args = parser.parse_args()
+
+	if args.run:
+		args.accounts = args.accounts[0]
+		print('BENCH_RESULT ' + json.dumps(run_scenario(args)))
+		return
+
+	from fake_provider import FakeProvider, FakeProviderServer
+
+	results = []
+	with FakeProviderServer(FakeProvider(args.latency_ms, args.block_rate, seed=0)) as server:
+		print(f'[BENCH] Fake provider at {server.url} (latency {args.latency_ms}ms, block rate {args.block_rate})')
+		for mode in args.modes:
+			for accounts in args.accounts:
+				print(f'[BENCH] {mode}: {accounts} account(s)...', flush=True)
+				output = subprocess.run(
+					[
+						sys.executable, __file__, '--run', mode, '--accounts', str(accounts),
+						'--concurrency', str(args.concurrency), '--provider-url', server.url,
+					],
+					capture_output=True,
+					text=True,
+					check=True,
+					cwd=project_root,
+				).stdout  # fmt: skip
+				line = next(line for line in output.splitlines() if line.startswith('BENCH_RESULT '))
+				result = json.loads(line[len('BENCH_RESULT ') :])
+				results.append(result)
+				if args.json:
+					print(json.dumps(result))
+
+	print_report(results)
+
+
+if __name__ == '__main__':
+	main()
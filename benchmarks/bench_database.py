@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+数据库连接基准测试 - 对比每次新建连接（旧实现）与连接池 + WAL 的单次调用延迟
+
+用法: python benchmarks/bench_database.py [--accounts 100] [--iterations 500]
+"""
+
+import argparse
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from web.database import Database
+
+
+class LegacyDatabase(Database):
+	"""旧实现：每次调用都新建连接，使用默认的回滚日志模式"""
+
+	@contextmanager
+	def get_connection(self):
+		conn = sqlite3.connect(self.db_path)
+		conn.row_factory = sqlite3.Row
+		try:
+			yield conn
+			conn.commit()
+		except Exception:
+			conn.rollback()
+			raise
+		finally:
+			conn.close()
+
+
+def measure(func, iterations: int) -> dict:
+	"""执行 func 若干次，返回单次调用延迟统计（毫秒）"""
+	samples = []
+	for _ in range(iterations):
+		start = time.perf_counter()
+		func()
+		samples.append((time.perf_counter() - start) * 1000)
+	samples.sort()
+	return {
+		'mean': statistics.mean(samples),
+		'p50': samples[len(samples) // 2],
+		'p95': samples[int(len(samples) * 0.95) - 1],
+	}
+
+
+def seed(database: Database, accounts: int):
+	user_id = database.add_user('bench', 'bench', 'Bench')
+	for i in range(accounts):
+		account_id = database.add_account(user_id, f'account-{i}', cookies='{"session": "x"}', api_user=str(i))
+		database.add_balance_record(account_id, 100.0, 1.0)
+
+
+def run(label: str, database: Database, accounts: int, iterations: int) -> dict:
+	seed(database, accounts)
+	account_id = database.get_all_accounts()[0]['id']
+	cases = {
+		'get_config': lambda: database.get_config('email_user'),
+		'get_account': lambda: database.get_account(account_id),
+		'add_checkin_log': lambda: database.add_checkin_log(account_id, True, 'bench'),
+		'get_statistics': lambda: database.get_statistics(),
+	}
+	results = {name: measure(func, iterations) for name, func in cases.items()}
+
+	print(f'\n[{label}]')
+	print(f'{"method":<20}{"mean(ms)":>10}{"p50(ms)":>10}{"p95(ms)":>10}')
+	for name, stats in results.items():
+		print(f'{name:<20}{stats["mean"]:>10.3f}{stats["p50"]:>10.3f}{stats["p95"]:>10.3f}')
+	return results
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Database connection benchmark')
+	parser.add_argument('--accounts', type=int, default=100)
+	parser.add_argument('--iterations', type=int, default=500)
+	args = parser.parse_args()
+
+	with tempfile.TemporaryDirectory() as temp_dir:
+		legacy = LegacyDatabase(f'{temp_dir}/legacy.db', f'{temp_dir}/secret.key', pool_size=0)
+		before = run('before: new connection per call', legacy, args.accounts, args.iterations)
+
+		pooled = Database(f'{temp_dir}/pooled.db', f'{temp_dir}/secret.key')
+		after = run('after: connection pool + WAL', pooled, args.accounts, args.iterations)
+		pooled.close()
+
+	print('\n[speedup p50]')
+	for name in before:
+		print(f'{name:<20}{before[name]["p50"] / after[name]["p50"]:>10.1f}x')
+
+
+if __name__ == '__main__':
+	main()
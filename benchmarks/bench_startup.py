@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+启动耗时测试 - 测量导入 checkin（命令行 / GitHub Actions 入口）和 web.api（Web 服务入口）的耗时
+
+每次导入都在新的子进程中进行（使用临时目录中的数据库路径），输出导入耗时的中位数和最小值，
+以及导入过程中是否创建了数据库文件。导入阶段不应该读取数据库，配置在首次使用时才加载。
+
+用法: python benchmarks/bench_startup.py [--modules checkin web.api] [--runs 10]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+
+def run_import(module: str) -> dict:
+	"""在当前进程中导入模块（由子进程调用）"""
+	start = time.perf_counter()
+	__import__(module)
+	elapsed = time.perf_counter() - start
+	return {
+		'module': module,
+		'import_ms': elapsed * 1000,
+		'db_created': os.path.exists(os.environ['DATABASE_PATH']),
+	}
+
+
+def measure(module: str, runs: int) -> dict:
+	"""在新的子进程中多次导入模块"""
+	samples = []
+	db_created = False
+	for _ in range(runs):
+		with tempfile.TemporaryDirectory() as data_dir:
+			env = {
+				**os.environ,
+				'DATABASE_PATH': os.path.join(data_dir, 'checkin.db'),
+				'DATABASE_KEY_PATH': os.path.join(data_dir, 'secret.key'),
+			}
+			output = subprocess.run(
+				[sys.executable, __file__, '--run', module],
+				capture_output=True,
+				text=True,
+				check=True,
+				cwd=project_root,
+				env=env,
+			).stdout
+			line = next(line for line in output.splitlines() if line.startswith('BENCH_RESULT '))
+			result = json.loads(line[len('BENCH_RESULT ') :])
+			samples.append(result['import_ms'])
+			db_created = db_created or result['db_created']
+
+	return {
+		'module': module,
+		'runs': runs,
+		'median_ms': statistics.median(samples),
+		'min_ms': min(samples),
+		'db_created': db_created,
+	}
+
+
+def print_report(results: list[dict]):
+	print(f'\n{"module":<12}{"runs":>6}{"median(ms)":>12}{"min(ms)":>10}{"db created":>12}')
+	for result in results:
+		print(
+			f'{result["module"]:<12}{result["runs"]:>6}{result["median_ms"]:>12.1f}{result["min_ms"]:>10.1f}'
+			f'{"yes" if result["db_created"] else "no":>12}'
+		)
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Import-time benchmark for the CLI and web entry points')
+	parser.add_argument('--modules', nargs='+', choices=['checkin', 'web.api'], default=['checkin', 'web.api'])
+	parser.add_argument('--runs', type=int, default=10)
+	parser.add_argument('--json', action='store_true', help='print results as JSON lines')
+	# 以下参数供子进程使用
+	parser.add_argument('--run', choices=['checkin', 'web.api'], help=argparse.SUPPRESS)
+	args = parser.parse_args()
+
+	if args.run:
+		print('BENCH_RESULT ' + json.dumps(run_import(args.run)))
+		return
+
+	results = []
+	for module in args.modules:
+		print(f'[BENCH] import {module} x{args.runs}...', flush=True)
+		result = measure(module, args.runs)
+		results.append(result)
+		if args.json:
+			print(json.dumps(result))
+
+	print_report(results)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+模拟 new-api provider - 本地压测用，不访问真实站点
+
+- GET /login：没有有效的 acw_sc__v2 时返回 WAF 挑战页面并设置 acw_tc、cdn_sec_tc，
+  带上根据 arg1 计算出的 acw_sc__v2 再次请求时返回正常的登录页面
+- GET /api/user/self：校验 WAF cookies、session 和 new-api-user 请求头，返回余额
+- POST /api/user/sign_in：校验同上，返回签到成功
+
+每个请求延迟 latency_ms 毫秒；block_rate 为 /api 请求即使带着有效 WAF cookies 也被拦截（返回 403 挑战页面）的概率。
+
+用法: python benchmarks/fake_provider.py [--port 9000] [--latency-ms 20] [--block-rate 0.05]
+"""
+
+import argparse
+import asyncio
+import random
+import secrets
+import socket
+import sys
+import threading
+from pathlib import Path
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.waf_solver import compute_acw_sc_v2
+
+WAF_COOKIE_MAX_AGE = 1800
+
+
+class FakeProvider:
+	"""模拟 provider 的状态：已下发的 WAF 挑战和请求计数"""
+
+	def __init__(self, latency_ms: float = 20, block_rate: float = 0.0, seed: int | None = None):
+		self.latency = latency_ms / 1000
+		self.block_rate = block_rate
+		self._random = random.Random(seed)
+		self._valid_tokens: set[str] = set()
+		self.requests: dict[str, int] = {}
+		self.blocked = 0
+		self.app = self._create_app()
+
+	def _challenge(self, status_code: int) -> HTMLResponse:
+		arg1 = secrets.token_hex(20).upper()
+		self._valid_tokens.add(compute_acw_sc_v2(arg1))
+		response = HTMLResponse(f"<html><script>var arg1='{arg1}';</script>安全验证</html>", status_code=status_code)
+		response.set_cookie('acw_tc', secrets.token_hex(16), max_age=WAF_COOKIE_MAX_AGE)
+		response.set_cookie('cdn_sec_tc', secrets.token_hex(16), max_age=WAF_COOKIE_MAX_AGE)
+		return response
+
+	def _passes_waf(self, request: Request) -> bool:
+		return (
+			request.cookies.get('acw_sc__v2') in self._valid_tokens
+			and 'acw_tc' in request.cookies
+			and 'cdn_sec_tc' in request.cookies
+		)
+
+	async def _enter(self, request: Request):
+		self.requests[request.url.path] = self.requests.get(request.url.path, 0) + 1
+		if self.latency:
+			await asyncio.sleep(self.latency)
+
+	def _check_api_request(self, request: Request) -> HTMLResponse | JSONResponse | None:
+		"""返回拦截响应，请求合法时返回 None"""
+		if not self._passes_waf(request) or self._random.random() < self.block_rate:
+			self.blocked += 1
+			return self._challenge(403)
+		if not request.cookies.get('session') or not request.headers.get('new-api-user'):
+			return JSONResponse({'success': False, 'message': 'unauthorized'}, status_code=401)
+		return None
+
+	def _create_app(self) -> FastAPI:
+		app = FastAPI()
+
+		@app.get('/login')
+		async def login(request: Request):
+			await self._enter(request)
+			if not self._passes_waf(request):
+				return self._challenge(200)
+			return HTMLResponse('<html><body>login</body></html>')
+
+		@app.get('/api/user/self')
+		async def user_self(request: Request):
+			await self._enter(request)
+			rejected = self._check_api_request(request)
+			if rejected:
+				return rejected
+			api_user = int(request.headers['new-api-user'])
+			return {'success': True, 'data': {'quota': 500000 * (100 + api_user), 'used_quota': 500000}}
+
+		@app.post('/api/user/sign_in')
+		async def sign_in(request: Request):
+			await self._enter(request)
+			rejected = self._check_api_request(request)
+			if rejected:
+				return rejected
+			return {'success': True, 'message': '签到成功'}
+
+		return app
+
+
+class FakeProviderServer:
+	"""在后台线程中运行 FakeProvider，端口为 0 时自动选择空闲端口"""
+
+	def __init__(self, provider: FakeProvider, host: str = '127.0.0.1', port: int = 0):
+		self.provider = provider
+		self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self._socket.bind((host, port))
+		self.url = f'http://{host}:{self._socket.getsockname()[1]}'
+		self._server = uvicorn.Server(
+			uvicorn.Config(provider.app, log_level='warning', access_log=False, backlog=4096, limit_concurrency=None)
+		)
+		self._thread: threading.Thread | None = None
+
+	def __enter__(self) -> 'FakeProviderServer':
+		self._thread = threading.Thread(
+			target=self._server.run, kwargs={'sockets': [self._socket]}, name='fake-provider', daemon=True
+		)
+		self._thread.start()
+		while not self._server.started:
+			if not self._thread.is_alive():
+				raise RuntimeError('Fake provider failed to start')
+			threading.Event().wait(0.01)
+		return self
+
+	def __exit__(self, *exc_info):
+		self._server.should_exit = True
+		self._thread.join(timeout=5)
+		self._socket.close()
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Local fake new-api provider for benchmarks')
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=9000)
+	parser.add_argument('--latency-ms', type=float, default=20)
+	parser.add_argument('--block-rate', type=float, default=0.0)
+	args = parser.parse_args()
+
+	provider = FakeProvider(args.latency_ms, args.block_rate)
+	print(
+		f'[FAKE] Serving on http://{args.host}:{args.port} (latency {args.latency_ms}ms, block rate {args.block_rate})'
+	)
+	uvicorn.run(provider.app, host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+	main()
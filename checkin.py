@@ -12,35 +12,37 @@ from datetime import datetime
 
 import httpx
 from dotenv import load_dotenv
-from playwright.async_api import async_playwright
 
-from utils.config import AccountConfig, AppConfig, load_accounts_config
-from utils.notify import notify
+from utils.browser_pool import browser_pool
+from utils.concurrency import run_bounded
+from utils.config import AccountConfig, AppConfig, get_int_env, load_accounts_config
+from utils.email_digest import DigestEntry, EmailDigest
+from utils.http_pool import build_cookie_header, http_pool
+from utils.metrics import WAF_BLOCKS, WAF_CACHE_LOOKUPS, record_checkin
+from utils.notify import notify, push_http_pool
+from utils.singleflight import SingleFlight
+from utils.smtp_pool import smtp_pool
+from utils.timing import record_timings, summarize_spans, timed
+from utils.waf_cache import WafCookieCache
+from utils.waf_solver import solve_waf_challenge
 
 load_dotenv()
 
 BALANCE_HASH_FILE = 'balance_hash.txt'
 WAF_COOKIES_CACHE_FILE = 'waf_cookies_cache.json'
 
+# WAF cookies 缓存（内存 + 文件），按 provider 域名存储
+waf_cookie_cache = WafCookieCache(
+	WAF_COOKIES_CACHE_FILE,
+	default_ttl=get_int_env('WAF_COOKIES_DEFAULT_TTL', 1800),
+	refresh_margin=get_int_env('WAF_COOKIES_REFRESH_MARGIN', 120),
+)
 
-def load_waf_cookies_cache():
-	"""加载 WAF cookies 缓存"""
-	try:
-		if os.path.exists(WAF_COOKIES_CACHE_FILE):
-			with open(WAF_COOKIES_CACHE_FILE, 'r', encoding='utf-8') as f:
-				return json.load(f)
-	except Exception as e:
-		print(f'Warning: Failed to load WAF cookies cache: {e}')
-	return {}
-
+# WAF cookies 获取方式：auto / http / browser
+WAF_BYPASS_MODE = os.getenv('WAF_BYPASS_MODE', 'auto').lower()
 
-def save_waf_cookies_cache(cache_data):
-	"""保存 WAF cookies 缓存"""
-	try:
-		with open(WAF_COOKIES_CACHE_FILE, 'w', encoding='utf-8') as f:
-			json.dump(cache_data, f, ensure_ascii=False, indent=2)
-	except Exception as e:
-		print(f'Warning: Failed to save WAF cookies cache: {e}')
+# 按域名合并并发的 WAF cookies 刷新
+_waf_refresh = SingleFlight()
 
 
 def load_balance_hash():
@@ -86,75 +88,60 @@ def parse_cookies(cookies_data):
 	return {}
 
 
-async def get_waf_cookies_with_playwright(account_name: str, login_url: str):
-	"""使用 Playwright 获取 WAF cookies（隐私模式）"""
-	print(f'[PROCESSING] {account_name}: Starting browser to get WAF cookies...')
-
-	async with async_playwright() as p:
-		import tempfile
-
-		with tempfile.TemporaryDirectory() as temp_dir:
-			context = await p.chromium.launch_persistent_context(
-				user_data_dir=temp_dir,
-				headless=False,
-				user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36',
-				viewport={'width': 1920, 'height': 1080},
-				args=[
-					'--disable-blink-features=AutomationControlled',
-					'--disable-dev-shm-usage',
-					'--disable-web-security',
-					'--disable-features=VizDisplayCompositor',
-					'--no-sandbox',
-				],
-			)
+@timed('get_waf_cookies_with_playwright', success=bool)
+async def get_waf_cookies_with_playwright(account_name: str, login_url: str) -> tuple[dict, float | None] | None:
+	"""使用 Playwright 获取 WAF cookies（隐私模式），返回 (cookies, 最早过期时间)"""
+	print(f'[PROCESSING] {account_name}: Getting WAF cookies from pooled browser...')
 
+	try:
+		async with browser_pool.new_context() as context:
 			page = await context.new_page()
 
-			try:
-				print(f'[PROCESSING] {account_name}: Access login page to get initial cookies...')
-
-				await page.goto(login_url, wait_until='networkidle')
+			print(f'[PROCESSING] {account_name}: Access login page to get initial cookies...')
 
-				try:
-					await page.wait_for_function('document.readyState === "complete"', timeout=5000)
-				except Exception:
-					await page.wait_for_timeout(3000)
+			await page.goto(login_url, wait_until='networkidle')
 
-				cookies = await page.context.cookies()
-
-				waf_cookies = {}
-				for cookie in cookies:
-					cookie_name = cookie.get('name')
-					cookie_value = cookie.get('value')
-					if cookie_name in ['acw_tc', 'cdn_sec_tc', 'acw_sc__v2'] and cookie_value is not None:
-						waf_cookies[cookie_name] = cookie_value
+			try:
+				await page.wait_for_function('document.readyState === "complete"', timeout=5000)
+			except Exception:
+				await page.wait_for_timeout(3000)
 
-				print(f'[INFO] {account_name}: Got {len(waf_cookies)} WAF cookies')
+			cookies = await context.cookies()
+	except Exception as e:
+		print(f'[FAILED] {account_name}: Error occurred while getting WAF cookies: {e}')
+		return None
 
-				required_cookies = ['acw_tc', 'cdn_sec_tc', 'acw_sc__v2']
-				missing_cookies = [c for c in required_cookies if c not in waf_cookies]
+	waf_cookies = {}
+	expires_at = None
+	for cookie in cookies:
+		cookie_name = cookie.get('name')
+		cookie_value = cookie.get('value')
+		if cookie_name in ['acw_tc', 'cdn_sec_tc', 'acw_sc__v2'] and cookie_value is not None:
+			waf_cookies[cookie_name] = cookie_value
+			# 会话 cookie 的 expires 为 -1，取其余 cookie 中最早的过期时间
+			expires = cookie.get('expires')
+			if expires and expires > 0:
+				expires_at = expires if expires_at is None else min(expires_at, expires)
 
-				if missing_cookies:
-					print(f'[FAILED] {account_name}: Missing WAF cookies: {missing_cookies}')
-					await context.close()
-					return None
+	print(f'[INFO] {account_name}: Got {len(waf_cookies)} WAF cookies')
 
-				print(f'[SUCCESS] {account_name}: Successfully got all WAF cookies')
+	required_cookies = ['acw_tc', 'cdn_sec_tc', 'acw_sc__v2']
+	missing_cookies = [c for c in required_cookies if c not in waf_cookies]
 
-				await context.close()
+	if missing_cookies:
+		print(f'[FAILED] {account_name}: Missing WAF cookies: {missing_cookies}')
+		return None
 
-				return waf_cookies
+	print(f'[SUCCESS] {account_name}: Successfully got all WAF cookies')
 
-			except Exception as e:
-				print(f'[FAILED] {account_name}: Error occurred while getting WAF cookies: {e}')
-				await context.close()
-				return None
+	return waf_cookies, expires_at
 
 
-def get_user_info(client, headers, user_info_url: str):
+@timed('get_user_info', success=lambda result: bool(result and result.get('success')))
+async def get_user_info(client: httpx.AsyncClient, headers: dict, user_info_url: str):
 	"""获取用户信息"""
 	try:
-		response = client.get(user_info_url, headers=headers, timeout=30)
+		response = await client.get(user_info_url, headers=headers)
 
 		if response.status_code == 200:
 			data = response.json()
@@ -182,8 +169,52 @@ def is_waf_blocked(response):
 	return False
 
 
-async def prepare_cookies(account_name: str, provider_config, user_cookies: dict, force_refresh: bool = False) -> dict | None:
-	"""准备请求所需的 cookies（优先使用缓存，失败时才获取新的 WAF cookies）"""
+async def refresh_waf_cookies(account_name: str, provider_config) -> dict | None:
+	"""获取新的 WAF cookies 并写入缓存
+
+	WAF_BYPASS_MODE:
+	- auto（默认）：先用 HTTP 请求直接计算 acw_sc__v2，失败时再启动浏览器
+	- http：只使用 HTTP 方式
+	- browser：只使用浏览器方式
+	"""
+	login_url = f'{provider_config.domain}{provider_config.login_path}'
+	result = None
+
+	if WAF_BYPASS_MODE in ('auto', 'http'):
+		print(f'[PROCESSING] {account_name}: Solving WAF challenge over HTTP...')
+		result = await solve_waf_challenge(http_pool.get_client(provider_config.domain), account_name, login_url)
+		if result:
+			print(f'[SUCCESS] {account_name}: Got all WAF cookies without browser')
+		elif WAF_BYPASS_MODE == 'http':
+			return None
+		else:
+			print(f'[INFO] {account_name}: Falling back to browser for WAF cookies')
+
+	if not result:
+		result = await get_waf_cookies_with_playwright(account_name, login_url)
+	if not result:
+		return None
+
+	# 保存到缓存
+	waf_cookies, expires_at = result
+	waf_cookie_cache.set(provider_config.domain, waf_cookies, expires_at)
+	print(f'[INFO] {account_name}: WAF cookies cached for future use')
+	return waf_cookies
+
+
+@timed('prepare_cookies', success=bool)
+async def prepare_cookies(
+	account_name: str,
+	provider_config,
+	user_cookies: dict,
+	force_refresh: bool = False,
+	stale_cookies: dict | None = None,
+) -> dict | None:
+	"""准备请求所需的 cookies（优先使用缓存，失败时才获取新的 WAF cookies）
+
+	stale_cookies 为上一次被 WAF 拦截时使用的 cookies，强制刷新时如果缓存已经被其他账号更新过，
+	则直接使用缓存中的新 cookies，不再重复启动浏览器。
+	"""
 	if not provider_config.needs_waf_cookies():
 		print(f'[INFO] {account_name}: Bypass WAF not required, using user cookies directly')
 		return user_cookies
@@ -192,33 +223,36 @@ async def prepare_cookies(account_name: str, provider_config, user_cookies: dict
 	cache_key = f'{provider_config.domain}'
 	waf_cookies = {}
 
+	cached_cookies, cache_status = waf_cookie_cache.lookup(cache_key)
+	WAF_CACHE_LOOKUPS.labels(result=cache_status).inc()
 	if not force_refresh:
-		cache_data = load_waf_cookies_cache()
-		cached_cookies = cache_data.get(cache_key)
 		if cached_cookies:
 			print(f'[INFO] {account_name}: Using cached WAF cookies')
 			waf_cookies = cached_cookies
+		elif cache_status == 'expired':
+			print(f'[INFO] {account_name}: Cached WAF cookies expired or expiring soon, will obtain new ones')
 		else:
 			print(f'[INFO] {account_name}: No cached WAF cookies found, will obtain new ones')
+	elif cached_cookies and stale_cookies is not None:
+		if any(stale_cookies.get(name) != value for name, value in cached_cookies.items()):
+			print(f'[INFO] {account_name}: WAF cookies already refreshed by another account, reusing them')
+			waf_cookies = cached_cookies
 
 	# 如果强制刷新或没有缓存，则获取新的 WAF cookies
-	if force_refresh or not waf_cookies:
-		login_url = f'{provider_config.domain}{provider_config.login_path}'
-		waf_cookies = await get_waf_cookies_with_playwright(account_name, login_url)
+	# 同一域名的并发刷新合并为一次浏览器获取，其余账号等待并复用结果
+	if not waf_cookies:
+		if _waf_refresh.in_flight(cache_key):
+			print(f'[INFO] {account_name}: Waiting for in-flight WAF cookies refresh of {cache_key}')
+		waf_cookies = await _waf_refresh.do(cache_key, lambda: refresh_waf_cookies(account_name, provider_config))
 		if not waf_cookies:
 			print(f'[FAILED] {account_name}: Unable to get WAF cookies')
 			return None
 
-		# 保存到缓存
-		cache_data = load_waf_cookies_cache()
-		cache_data[cache_key] = waf_cookies
-		save_waf_cookies_cache(cache_data)
-		print(f'[INFO] {account_name}: WAF cookies cached for future use')
-
 	return {**waf_cookies, **user_cookies}
 
 
-def execute_check_in(client, account_name: str, provider_config, headers: dict):
+@timed('execute_check_in', success=bool)
+async def execute_check_in(client: httpx.AsyncClient, account_name: str, provider_config, headers: dict):
 	"""执行签到请求"""
 	print(f'[NETWORK] {account_name}: Executing check-in')
 
@@ -226,7 +260,7 @@ def execute_check_in(client, account_name: str, provider_config, headers: dict):
 	checkin_headers.update({'Content-Type': 'application/json', 'X-Requested-With': 'XMLHttpRequest'})
 
 	sign_in_url = f'{provider_config.domain}{provider_config.sign_in_path}'
-	response = client.post(sign_in_url, headers=checkin_headers, timeout=30)
+	response = await client.post(sign_in_url, headers=checkin_headers)
 
 	print(f'[RESPONSE] {account_name}: Response status code {response.status_code}')
 
@@ -255,11 +289,10 @@ def execute_check_in(client, account_name: str, provider_config, headers: dict):
 
 async def try_check_in_with_cookies(account_name: str, provider_config, account: AccountConfig, all_cookies: dict):
 	"""尝试使用给定的 cookies 进行签到"""
-	client = httpx.Client(http2=True, timeout=30.0)
+	# 同一 provider 的账号共享连接池，cookies 通过请求头按账号单独携带
+	client = http_pool.get_client(provider_config.domain)
 
 	try:
-		client.cookies.update(all_cookies)
-
 		headers = {
 			'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36',
 			'Accept': 'application/json, text/plain, */*',
@@ -267,21 +300,22 @@ async def try_check_in_with_cookies(account_name: str, provider_config, account:
 			'Accept-Encoding': 'gzip, deflate, br, zstd',
 			'Referer': provider_config.domain,
 			'Origin': provider_config.domain,
-			'Connection': 'keep-alive',
 			'Sec-Fetch-Dest': 'empty',
 			'Sec-Fetch-Mode': 'cors',
 			'Sec-Fetch-Site': 'same-origin',
+			'Cookie': build_cookie_header(all_cookies),
 			provider_config.api_user_key: account.api_user,
 		}
 
 		user_info_url = f'{provider_config.domain}{provider_config.user_info_path}'
-		user_info = get_user_info(client, headers, user_info_url)
+		user_info = await get_user_info(client, headers, user_info_url)
 
 		# 检查是否被 WAF 拦截
 		if user_info and not user_info.get('success'):
 			error_msg = user_info.get('error', '')
 			if '403' in error_msg or '412' in error_msg or '521' in error_msg:
 				print(f'[INFO] {account_name}: Detected WAF block, will refresh cookies')
+				WAF_BLOCKS.labels(provider=account.provider).inc()
 				return False, None, True  # waf_blocked = True
 
 		if user_info and user_info.get('success'):
@@ -290,7 +324,7 @@ async def try_check_in_with_cookies(account_name: str, provider_config, account:
 			print(user_info.get('error', 'Unknown error'))
 
 		if provider_config.needs_manual_check_in():
-			success = execute_check_in(client, account_name, provider_config, headers)
+			success = await execute_check_in(client, account_name, provider_config, headers)
 			return success, user_info, False
 		else:
 			print(f'[INFO] {account_name}: Check-in completed automatically (triggered by user info request)')
@@ -299,12 +333,19 @@ async def try_check_in_with_cookies(account_name: str, provider_config, account:
 	except Exception as e:
 		print(f'[FAILED] {account_name}: Error occurred during check-in process - {str(e)[:50]}...')
 		return False, None, False
-	finally:
-		client.close()
 
 
 async def check_in_account(account: AccountConfig, account_index: int, app_config: AppConfig):
 	"""为单个账号执行签到操作（优化版：优先使用现有cookies，失败时才刷新）"""
+	success = False
+	try:
+		success, user_info = await _check_in_account(account, account_index, app_config)
+		return success, user_info
+	finally:
+		record_checkin(account.provider, success)
+
+
+async def _check_in_account(account: AccountConfig, account_index: int, app_config: AppConfig):
 	account_name = account.get_display_name(account_index)
 	print(f'\n[PROCESSING] Starting to process {account_name}')
 
@@ -331,7 +372,9 @@ async def check_in_account(account: AccountConfig, account_index: int, app_confi
 	# 如果遇到 WAF 拦截，刷新 cookies 后重试
 	if waf_blocked and provider_config.needs_waf_cookies():
 		print(f'[INFO] {account_name}: Refreshing WAF cookies and retrying...')
-		all_cookies = await prepare_cookies(account_name, provider_config, user_cookies, force_refresh=True)
+		all_cookies = await prepare_cookies(
+			account_name, provider_config, user_cookies, force_refresh=True, stale_cookies=all_cookies
+		)
 		if not all_cookies:
 			return False, None
 
@@ -340,6 +383,90 @@ async def check_in_account(account: AccountConfig, account_index: int, app_confi
 	return success, user_info
 
 
+def build_account_email(account: AccountConfig, account_name: str, success: bool, user_info: dict | None):
+	"""构建单个账号的签到通知邮件（标题，正文）"""
+	status_text = 'Success' if success else 'Failed'
+	email_title = f'AnyRouter Check-in {status_text} - {account_name}'
+	email_content_lines = [
+		f'Account: {account_name}',
+		f'Provider: {account.provider}',
+		f'Status: {"[OK] Success" if success else "[FAIL] Failed"}',
+		f'Time: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}',
+		'',
+	]
+
+	if user_info and user_info.get('success'):
+		email_content_lines.append(f'Balance: ${user_info["quota"]}')
+		email_content_lines.append(f'Used: ${user_info["used_quota"]}')
+	elif user_info:
+		email_content_lines.append(f'Error: {user_info.get("error", "Unknown error")}')
+
+	return email_title, '\n'.join(email_content_lines)
+
+
+async def process_account(
+	account: AccountConfig, account_index: int, app_config: AppConfig, digest: EmailDigest | None = None
+) -> dict:
+	"""签到单个账号并发送个人邮件通知，返回 {'success', 'user_info', 'error'}
+
+	EMAIL_NOTIFY_MODE 不是 immediate 时，结果记录到 digest，运行结束后按收件人合并发送。
+	"""
+	account_name = account.get_display_name(account_index)
+	email_mode = digest.mode_for(account.email) if digest is not None and account.email else 'immediate'
+	try:
+		success, user_info = await check_in_account(account, account_index, app_config)
+	except Exception as e:
+		print(f'[FAILED] {account_name} processing exception: {e}')
+
+		if account.email and email_mode != 'immediate':
+			digest.add(account.email, DigestEntry(account_name, account.provider, False, error=str(e)))
+		# 异常时也尝试发送邮件通知
+		elif account.email:
+			print(f'[EMAIL] {account_name}: 检测到异常，准备发送错误邮件到 {account.email}')
+			try:
+				error_email_title = f'AnyRouter Check-in Error - {account_name}'
+				error_email_content = f'Account: {account_name}\nStatus: [FAIL] Exception\nError: {str(e)}\nTime: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'
+				await notify.asend_email_to(account.email, error_email_title, error_email_content, msg_type='text')
+				print(f'[EMAIL] {account_name}: [OK] 错误邮件发送成功')
+			except Exception as email_error:
+				print(f'[EMAIL] {account_name}: [FAIL] 错误邮件发送失败: {str(email_error)}')
+
+		return {'success': False, 'user_info': None, 'error': e}
+
+	# 如果账号配置了邮箱,发送单独的签到通知
+	if account.email and email_mode != 'immediate':
+		quota = user_info['quota'] if user_info and user_info.get('success') else None
+		used_quota = user_info['used_quota'] if quota is not None else None
+		error = user_info.get('error', 'Unknown error') if user_info and not user_info.get('success') else None
+		if digest.add(account.email, DigestEntry(account_name, account.provider, success, quota, used_quota, error)):
+			print(f'[EMAIL] {account_name}: 结果已加入 {account.email} 的汇总邮件')
+		else:
+			print(f'[EMAIL] {account_name}: {account.email} 只接收失败通知，跳过成功结果')
+	elif account.email:
+		print(f'[EMAIL] {account_name}: 检测到邮箱配置: {account.email}')
+		email_title, email_content = build_account_email(account, account_name, success, user_info)
+
+		print(f'[EMAIL] {account_name}: 准备发送邮件')
+		print(f'[EMAIL] {account_name}: 收件人: {account.email}')
+		print(f'[EMAIL] {account_name}: 标题: {email_title}')
+
+		try:
+			# smtplib 是阻塞调用，在线程中执行，避免阻塞其他账号的签到
+			await notify.asend_email_to(account.email, email_title, email_content, msg_type='text')
+			print(f'[EMAIL] {account_name}: [OK] 邮件发送成功')
+		except Exception as e:
+			print(f'[EMAIL] {account_name}: [FAIL] 邮件发送失败')
+			print(f'[EMAIL] {account_name}: 错误类型: {type(e).__name__}')
+			print(f'[EMAIL] {account_name}: 错误详情: {str(e)}')
+			import traceback
+
+			traceback.print_exc()
+	else:
+		print(f'[EMAIL] {account_name}: 未配置邮箱，跳过邮件通知')
+
+	return {'success': success, 'user_info': user_info, 'error': None}
+
+
 async def main():
 	"""主函数"""
 	print('[SYSTEM] AnyRouter.top multi-account auto check-in script started (using Playwright)')
@@ -354,6 +481,11 @@ async def main():
 		sys.exit(1)
 
 	print(f'[INFO] Found {len(accounts)} account configurations')
+	if app_config.max_concurrency > 1:
+		print(
+			f'[INFO] Concurrent mode: up to {app_config.max_concurrency} account(s) in flight'
+			+ (f', {app_config.provider_concurrency} per provider' if app_config.provider_concurrency else '')
+		)
 
 	last_balance_hash = load_balance_hash()
 
@@ -364,87 +496,63 @@ async def main():
 	need_notify = False  # 是否需要发送通知
 	balance_changed = False  # 余额是否有变化
 
-	for i, account in enumerate(accounts):
+	# 个人邮件按收件人汇总（EMAIL_NOTIFY_MODE 为 digest / failures_only 时），运行结束后发送
+	digest = EmailDigest('en')
+
+	# 所有账号的各阶段耗时记录到同一个 recorder，结束时输出汇总
+	with record_timings() as recorder:
+		try:
+			results = await run_bounded(
+				accounts,
+				lambda account, i: process_account(account, i, app_config, digest),
+				max_concurrency=app_config.max_concurrency,
+				per_key_limit=app_config.provider_concurrency,
+				key=lambda account: account.provider,
+			)
+		finally:
+			await http_pool.aclose()
+			await browser_pool.close()
+
+	for stage, stats in summarize_spans(recorder.spans).items():
+		print(
+			f'[TIMING] {stage}: count={stats["count"]} failures={stats["failures"]} '
+			f'p50={stats["p50_ms"]:.1f}ms p95={stats["p95_ms"]:.1f}ms max={stats["max_ms"]:.1f}ms'
+		)
+
+	if digest.recipients:
+		print(f'[EMAIL] Sending digest emails to {len(digest.recipients)} recipient(s)')
+		await digest.asend(notify)
+
+	# 按账号原始顺序汇总结果，保证通知内容与顺序执行时一致
+	for i, (account, result) in enumerate(zip(accounts, results)):
 		account_key = f'account_{i + 1}'
 		account_name = account.get_display_name(i)
-		try:
-			success, user_info = await check_in_account(account, i, app_config)
-			if success:
-				success_count += 1
 
-			should_notify_this_account = False
+		if result['error'] is not None:
+			need_notify = True  # 异常也需要通知
+			notification_content.append(f'[FAIL] {account_name} exception: {str(result["error"])[:50]}...')
+			continue
 
-			if not success:
-				should_notify_this_account = True
-				need_notify = True
-				print(f'[NOTIFY] {account_name} failed, will send notification')
+		success = result['success']
+		user_info = result['user_info']
+		if success:
+			success_count += 1
 
-			if user_info and user_info.get('success'):
-				current_quota = user_info['quota']
-				current_used = user_info['used_quota']
-				current_balances[account_key] = {'quota': current_quota, 'used': current_used}
-
-			# 如果账号配置了邮箱,发送单独的签到通知
-			if account.email:
-				print(f'[EMAIL] {account_name}: 检测到邮箱配置: {account.email}')
-				status_text = 'Success' if success else 'Failed'
-				email_title = f'AnyRouter Check-in {status_text} - {account_name}'
-				email_content_lines = [
-					f'Account: {account_name}',
-					f'Provider: {account.provider}',
-					f'Status: {"[OK] Success" if success else "[FAIL] Failed"}',
-					f'Time: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}',
-					'',
-				]
-
-				if user_info and user_info.get('success'):
-					email_content_lines.append(f'Balance: ${user_info["quota"]}')
-					email_content_lines.append(f'Used: ${user_info["used_quota"]}')
-				elif user_info:
-					email_content_lines.append(f'Error: {user_info.get("error", "Unknown error")}')
-
-				email_content = '\n'.join(email_content_lines)
-
-				print(f'[EMAIL] {account_name}: 准备发送邮件')
-				print(f'[EMAIL] {account_name}: 收件人: {account.email}')
-				print(f'[EMAIL] {account_name}: 标题: {email_title}')
-
-				try:
-					notify.send_email_to(account.email, email_title, email_content, msg_type='text')
-					print(f'[EMAIL] {account_name}: [OK] 邮件发送成功')
-				except Exception as e:
-					print(f'[EMAIL] {account_name}: [FAIL] 邮件发送失败')
-					print(f'[EMAIL] {account_name}: 错误类型: {type(e).__name__}')
-					print(f'[EMAIL] {account_name}: 错误详情: {str(e)}')
-					import traceback
-					traceback.print_exc()
-			else:
-				print(f'[EMAIL] {account_name}: 未配置邮箱，跳过邮件通知')
+		if user_info and user_info.get('success'):
+			current_quota = user_info['quota']
+			current_used = user_info['used_quota']
+			current_balances[account_key] = {'quota': current_quota, 'used': current_used}
 
-			if should_notify_this_account:
-				status = '[SUCCESS]' if success else '[FAIL]'
-				account_result = f'{status} {account_name}'
-				if user_info and user_info.get('success'):
-					account_result += f'\n{user_info["display"]}'
-				elif user_info:
-					account_result += f'\n{user_info.get("error", "Unknown error")}'
-				notification_content.append(account_result)
+		if not success:
+			need_notify = True
+			print(f'[NOTIFY] {account_name} failed, will send notification')
 
-		except Exception as e:
-			print(f'[FAILED] {account_name} processing exception: {e}')
-			need_notify = True  # 异常也需要通知
-			notification_content.append(f'[FAIL] {account_name} exception: {str(e)[:50]}...')
-
-			# 异常时也尝试发送邮件通知
-			if account.email:
-				print(f'[EMAIL] {account_name}: 检测到异常，准备发送错误邮件到 {account.email}')
-				try:
-					error_email_title = f'AnyRouter Check-in Error - {account_name}'
-					error_email_content = f'Account: {account_name}\nStatus: [FAIL] Exception\nError: {str(e)}\nTime: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'
-					notify.send_email_to(account.email, error_email_title, error_email_content, msg_type='text')
-					print(f'[EMAIL] {account_name}: [OK] 错误邮件发送成功')
-				except Exception as email_error:
-					print(f'[EMAIL] {account_name}: [FAIL] 错误邮件发送失败: {str(email_error)}')
+			account_result = f'[FAIL] {account_name}'
+			if user_info and user_info.get('success'):
+				account_result += f'\n{user_info["display"]}'
+			elif user_info:
+				account_result += f'\n{user_info.get("error", "Unknown error")}'
+			notification_content.append(account_result)
 
 	# 检查余额变化
 	current_balance_hash = generate_balance_hash(current_balances) if current_balances else None
@@ -499,11 +607,14 @@ async def main():
 		notify_content = '\n\n'.join([time_info, '\n'.join(notification_content), '\n'.join(summary)])
 
 		print(notify_content)
-		notify.push_message('AnyRouter Check-in Alert', notify_content, msg_type='text')
+		await notify.apush_message('AnyRouter Check-in Alert', notify_content, msg_type='text')
 		print('[NOTIFY] Notification sent due to failures or balance changes')
 	else:
 		print('[INFO] All accounts successful and no balance changes detected, notification skipped')
 
+	smtp_pool.close()
+	await push_http_pool.aclose()
+
 	# 设置退出码
 	sys.exit(0 if success_count > 0 else 1)
 
@@ -2,6 +2,11 @@
 
 echo "🚀 启动 AnyRouter 签到管理系统..."
 
+# Web 服务和调度器共享 Prometheus 指标目录，/metrics 汇总两个进程的指标
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/anyrouter-metrics}"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+rm -f "$PROMETHEUS_MULTIPROC_DIR"/*.db
+
 # 启动定时任务调度器（后台运行）
 echo "📅 启动定时任务调度器..."
 python3 web/scheduler.py &
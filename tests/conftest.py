@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# 整个测试会话共用一个临时数据库，避免导入 web.* 时在项目目录下创建数据库
+_data_dir = tempfile.mkdtemp()
+os.environ['DATABASE_PATH'] = os.path.join(_data_dir, 'checkin.db')
+os.environ['DATABASE_KEY_PATH'] = os.path.join(_data_dir, 'secret.key')
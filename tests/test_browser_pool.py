@@ -0,0 +1,236 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加项目根目录到 PATH
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import utils.browser_pool as browser_pool_module
+from utils.browser_pool import BrowserPool
+from utils.config import BrowserPoolConfig
+
+
+class FakeContext:
+	def __init__(self, browser):
+		self.browser = browser
+		self.closed = False
+
+	async def close(self):
+		self.closed = True
+
+
+class FakeCdpSession:
+	def __init__(self, browser):
+		self.browser = browser
+
+	async def send(self, method):
+		return {
+			'processInfo': [
+				{'id': self.browser.pid, 'type': 'browser'},
+				{'id': self.browser.pid + 1, 'type': 'renderer'},
+			]
+		}
+
+	async def detach(self):
+		pass
+
+
+class FakeBrowser:
+	next_pid = 10000
+
+	def __init__(self, headless):
+		self.headless = headless
+		self.pid = FakeBrowser.next_pid
+		FakeBrowser.next_pid += 10
+		self.contexts: list[FakeContext] = []
+		self.closed = False
+
+	def is_connected(self):
+		return not self.closed
+
+	async def new_context(self, **options):
+		context = FakeContext(self)
+		self.contexts.append(context)
+		return context
+
+	async def new_browser_cdp_session(self):
+		return FakeCdpSession(self)
+
+	async def close(self):
+		self.closed = True
+
+
+class FakePlaywright:
+	"""模拟 async_playwright()，记录启动的浏览器"""
+
+	def __init__(self):
+		self.browsers: list[FakeBrowser] = []
+		self.stopped = False
+		self.chromium = self
+
+	async def start(self):
+		return self
+
+	async def launch(self, headless, args):
+		browser = FakeBrowser(headless)
+		self.browsers.append(browser)
+		return browser
+
+	async def stop(self):
+		self.stopped = True
+
+
+@pytest.fixture
+def playwright(monkeypatch):
+	playwright = FakePlaywright()
+	monkeypatch.setattr(browser_pool_module, 'async_playwright', lambda: playwright)
+	return playwright
+
+
+def test_new_context_loads_config_from_env(playwright, monkeypatch):
+	monkeypatch.setenv('BROWSER_HEADLESS', 'true')
+	pool = BrowserPool()
+
+	async def run():
+		async with pool.new_context() as context:
+			assert not context.closed
+		await pool.close()
+		return context
+
+	context = asyncio.run(run())
+
+	assert context.closed
+	assert [browser.headless for browser in playwright.browsers] == [True]
+
+
+def make_pool(**kwargs) -> BrowserPool:
+	return BrowserPool(BrowserPoolConfig(**{'max_memory_mb': 0, 'headless': True, **kwargs}))
+
+
+async def use_context(pool: BrowserPool) -> FakeBrowser:
+	async with pool.new_context() as context:
+		return context.browser
+
+
+def test_browser_is_reused_across_contexts(playwright):
+	pool = make_pool(max_uses=0)
+
+	async def run():
+		return [await use_context(pool) for _ in range(3)]
+
+	browsers = asyncio.run(run())
+
+	assert len(playwright.browsers) == 1
+	assert browsers == [playwright.browsers[0]] * 3
+	# 每次请求都是新的上下文，用完即关闭
+	assert len(playwright.browsers[0].contexts) == 3
+	assert all(context.closed for context in playwright.browsers[0].contexts)
+	assert not playwright.browsers[0].closed
+
+
+def test_browser_recycled_after_max_uses(playwright):
+	pool = make_pool(max_uses=2)
+
+	async def run():
+		return [await use_context(pool) for _ in range(3)]
+
+	browsers = asyncio.run(run())
+
+	first, second = playwright.browsers
+	assert browsers == [first, first, second]
+	assert first.closed
+	assert not second.closed
+
+
+def test_browser_recycled_over_memory_threshold(playwright, monkeypatch):
+	pool = make_pool(max_uses=0, max_memory_mb=100, memory_check_interval=0)
+	memory = iter([50.0, 200.0, 50.0])
+
+	async def memory_mb(pooled):
+		return next(memory)
+
+	monkeypatch.setattr(pool, '_memory_mb', memory_mb)
+
+	async def run():
+		return [await use_context(pool) for _ in range(3)]
+
+	browsers = asyncio.run(run())
+
+	first, second = playwright.browsers
+	assert browsers == [first, first, second]
+	assert first.closed
+
+
+def test_contexts_per_browser_are_capped(playwright):
+	pool = make_pool(size=1, max_contexts_per_browser=2, max_uses=0)
+	active = 0
+	peak = 0
+
+	async def worker():
+		nonlocal active, peak
+		async with pool.new_context():
+			active += 1
+			peak = max(peak, active)
+			await asyncio.sleep(0.01)
+			active -= 1
+
+	async def run():
+		await asyncio.gather(*(worker() for _ in range(5)))
+
+	asyncio.run(run())
+
+	assert peak == 2
+	assert len(playwright.browsers) == 1
+	assert len(playwright.browsers[0].contexts) == 5
+
+
+def test_close_stops_browsers_and_playwright(playwright):
+	pool = make_pool(size=2, max_contexts_per_browser=1, max_uses=0)
+
+	async def run():
+		async with pool.new_context(), pool.new_context():
+			pass
+		await pool.close()
+
+	asyncio.run(run())
+
+	assert len(playwright.browsers) == 2
+	assert all(browser.closed for browser in playwright.browsers)
+	assert playwright.stopped
+
+
+def test_browsers_left_on_previous_event_loop_are_killed(playwright, monkeypatch):
+	killed = []
+	monkeypatch.setattr(browser_pool_module, '_kill', killed.append)
+	pool = make_pool(max_uses=0)
+
+	# 每次 asyncio.run 都是新的事件循环，上一次启动的 Chromium 无法再通过 Playwright 关闭
+	asyncio.run(use_context(pool))
+	asyncio.run(use_context(pool))
+
+	first, second = playwright.browsers
+	assert killed == [first.pid]
+	assert not second.closed
+
+
+def test_memory_checked_at_most_once_per_interval(playwright, monkeypatch):
+	pool = make_pool(max_uses=0, max_memory_mb=100, memory_check_interval=3600)
+	checks = []
+
+	async def memory_mb(pooled):
+		checks.append(pooled)
+		return 50.0
+
+	monkeypatch.setattr(pool, '_memory_mb', memory_mb)
+
+	async def run():
+		for _ in range(5):
+			await use_context(pool)
+
+	asyncio.run(run())
+
+	# 刚启动的浏览器要等一个间隔后才检查
+	assert checks == []
@@ -0,0 +1,101 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加项目根目录到 PATH
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.concurrency import run_bounded
+
+
+class Tracker:
+	"""记录同时执行的 worker 数量（总数和按 key 分组）"""
+
+	def __init__(self):
+		self.active: dict[str, int] = {}
+		self.peak: dict[str, int] = {}
+
+	def enter(self, *groups: str):
+		for group in groups:
+			self.active[group] = self.active.get(group, 0) + 1
+			self.peak[group] = max(self.peak.get(group, 0), self.active[group])
+
+	def exit(self, *groups: str):
+		for group in groups:
+			self.active[group] -= 1
+
+
+def test_results_keep_input_order():
+	async def worker(item, index):
+		# 越靠前的任务越晚完成
+		await asyncio.sleep(0.001 * (5 - index))
+		return item * 10, index
+
+	results = asyncio.run(run_bounded(range(5), worker, max_concurrency=5))
+
+	assert results == [(0, 0), (10, 1), (20, 2), (30, 3), (40, 4)]
+
+
+def test_concurrency_is_capped():
+	tracker = Tracker()
+	items = [('a', i) for i in range(6)] + [('b', i) for i in range(6)]
+
+	async def worker(item, index):
+		tracker.enter('all', item[0])
+		await asyncio.sleep(0.005)
+		tracker.exit('all', item[0])
+
+	asyncio.run(run_bounded(items, worker, max_concurrency=3, per_key_limit=2, key=lambda item: item[0]))
+
+	assert tracker.peak['all'] == 3
+	assert tracker.peak['a'] == 2
+	assert tracker.peak['b'] == 2
+
+
+def test_sequential_when_concurrency_is_one():
+	tracker = Tracker()
+
+	async def worker(item, index):
+		tracker.enter('all')
+		await asyncio.sleep(0)
+		tracker.exit('all')
+		return item
+
+	assert asyncio.run(run_bounded([3, 1, 2], worker)) == [3, 1, 2]
+	assert tracker.peak['all'] == 1
+
+
+@pytest.mark.parametrize('max_concurrency', [1, 4])
+def test_worker_exception_propagates(max_concurrency):
+	async def worker(item, index):
+		if item == 2:
+			raise ValueError('account 2 failed')
+		return item
+
+	with pytest.raises(ValueError, match='account 2 failed'):
+		asyncio.run(run_bounded(range(4), worker, max_concurrency=max_concurrency))
+
+
+def test_wait_does_not_hold_a_slot():
+	tracker = Tracker()
+	waiting = []
+	all_waiting = asyncio.Event()
+
+	async def wait(item, index):
+		waiting.append(item)
+		if len(waiting) == 4:
+			all_waiting.set()
+		# 等待期间占着名额的话，只有 2 个任务能进入等待，这里会超时
+		await asyncio.wait_for(all_waiting.wait(), 1)
+
+	async def worker(item, index):
+		tracker.enter('all')
+		await asyncio.sleep(0.001)
+		tracker.exit('all')
+		return item
+
+	assert asyncio.run(run_bounded(range(4), worker, max_concurrency=2, wait=wait)) == [0, 1, 2, 3]
+	assert tracker.peak['all'] == 2
@@ -0,0 +1,405 @@
+import asyncio
+import gc
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from cryptography.fernet import Fernet
+
+# 添加项目根目录到 PATH
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import web.database as database_module
+from web.database import MIGRATIONS, AsyncDatabase, Database, LazyDatabase, WriteBehindWriter
+
+
+@pytest.fixture
+def database(tmp_path):
+	database = Database(str(tmp_path / 'checkin.db'), str(tmp_path / 'secret.key'), pool_size=4)
+	yield database
+	database.close()
+
+
+@pytest.fixture
+def account_id(database):
+	user_id = database.add_user('tester', 'secret', 'Tester')
+	return database.add_account(user_id, 'Account 1', cookies='{"session": "abc"}', api_user='1')
+
+
+def test_connection_pragmas(database):
+	with database.get_connection() as conn:
+		assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+		assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+		assert conn.execute('PRAGMA busy_timeout').fetchone()[0] == database.busy_timeout
+
+
+def test_connections_are_reused(database):
+	with database.get_connection() as first:
+		pass
+	with database.get_connection() as second:
+		pass
+
+	assert first is second
+
+
+def test_concurrent_writes_from_threads(database, account_id):
+	def write(i):
+		database.add_checkin_log(account_id, i % 2 == 0, f'log {i}')
+
+	with ThreadPoolExecutor(max_workers=8) as executor:
+		list(executor.map(write, range(200)))
+
+	assert len(database.get_checkin_logs(account_id=account_id, limit=1000)) == 200
+
+
+def test_accounts_with_balance_single_query(database, account_id):
+	user_id = database.get_account(account_id)['user_id']
+	other_id = database.add_account(user_id, 'Account 2', cookies='{"session": "def"}', api_user='2')
+	database.add_balance_record(account_id, 10.0, 1.0)
+	database.add_balance_record(account_id, 12.5, 2.0)
+
+	statements = []
+	with database.get_connection() as conn:
+		conn.set_trace_callback(statements.append)
+	try:
+		accounts = database.get_accounts_with_balance(user_id=user_id)
+	finally:
+		with database.get_connection() as conn:
+			conn.set_trace_callback(None)
+
+	assert len([sql for sql in statements if sql.lstrip().upper().startswith('SELECT')]) == 1
+	by_id = {account['id']: account for account in accounts}
+	assert by_id[account_id]['balance']['quota'] == 12.5
+	assert by_id[account_id]['balance']['used_quota'] == 2.0
+	assert by_id[other_id]['balance'] is None
+	assert 'password' not in by_id[account_id] and 'cookies' not in by_id[account_id]
+
+
+def test_latest_balance_maintained_on_insert(database, account_id):
+	database.add_balance_record(account_id, 10.0, 1.0)
+	database.add_balance_record(account_id, 8.0, 3.0)
+
+	latest = database.get_latest_balance(account_id)
+	assert (latest['quota'], latest['used_quota']) == (8.0, 3.0)
+
+	stats = database.get_statistics()
+	assert (stats['total_quota'], stats['total_used']) == (8.0, 3.0)
+
+	database.delete_account(account_id)
+	assert database.get_latest_balance(account_id) is None
+
+
+def test_latest_balance_backfilled_for_existing_database(tmp_path):
+	db_path, key_path = str(tmp_path / 'checkin.db'), str(tmp_path / 'secret.key')
+	database = Database(db_path, key_path, pool_size=0)
+	user_id = database.add_user('tester', 'secret', 'Tester')
+	account_id = database.add_account(user_id, 'Account 1', cookies='{"session": "abc"}', api_user='1')
+	database.add_balance_record(account_id, 10.0, 1.0)
+	database.add_balance_record(account_id, 12.0, 2.0)
+	with database.get_connection() as conn:
+		conn.execute('DROP TABLE account_latest_balance')
+		# 引入迁移版本号之前创建的数据库
+		conn.execute('PRAGMA user_version = 0')
+
+	upgraded = Database(db_path, key_path, pool_size=0)
+
+	assert upgraded.get_latest_balance(account_id)['quota'] == 12.0
+
+
+def test_migrations_applied_once(tmp_path, capsys):
+	db_path, key_path = str(tmp_path / 'checkin.db'), str(tmp_path / 'secret.key')
+	Database(db_path, key_path, pool_size=0)
+	assert 'Applying migration' in capsys.readouterr().out
+
+	database = Database(db_path, key_path, pool_size=0)
+
+	assert 'Applying migration' not in capsys.readouterr().out
+	with database.get_connection() as conn:
+		assert conn.execute('PRAGMA user_version').fetchone()[0] == len(MIGRATIONS)
+
+
+def test_legacy_accounts_table_is_upgraded(tmp_path):
+	db_path, key_path = str(tmp_path / 'checkin.db'), str(tmp_path / 'secret.key')
+	conn = sqlite3.connect(db_path)
+	conn.execute(
+		"""
+		CREATE TABLE accounts (
+			id INTEGER PRIMARY KEY AUTOINCREMENT,
+			name TEXT NOT NULL,
+			username TEXT NOT NULL,
+			password TEXT,
+			provider TEXT DEFAULT 'anyrouter',
+			enabled INTEGER DEFAULT 1,
+			created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+			updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+		)
+		"""
+	)
+	conn.execute("INSERT INTO accounts (name, username, password) VALUES ('Legacy', 'legacy', 'x')")
+	conn.commit()
+	conn.close()
+
+	database = Database(db_path, key_path, pool_size=0)
+
+	admin = database.get_user_by_username('admin')
+	(account,) = database.get_all_accounts(user_id=admin['id'])
+	assert account['name'] == 'Legacy'
+	assert account['auth_type'] == 'password'
+	with database.get_connection() as conn:
+		columns = {col[1]: col[3] for col in conn.execute('PRAGMA table_info(accounts)')}
+	assert {'cookies', 'api_user', 'user_id', 'email'} <= set(columns)
+	assert columns['username'] == 0
+
+
+def test_concurrent_startup_migrates_once(tmp_path):
+	db_path, key_path = str(tmp_path / 'checkin.db'), str(tmp_path / 'secret.key')
+	(tmp_path / 'secret.key').write_bytes(Fernet.generate_key())
+
+	with ThreadPoolExecutor(max_workers=4) as executor:
+		databases = list(executor.map(lambda _: Database(db_path, key_path, pool_size=0), range(4)))
+
+	assert [user['username'] for user in databases[0].get_all_users()] == ['admin']
+
+
+def test_log_and_history_queries_use_indexes(database, account_id):
+	user_id = database.get_account(account_id)['user_id']
+	database.add_checkin_log(account_id, True, 'ok')
+	database.add_balance_record(account_id, 10.0, 1.0)
+
+	statements = []
+	with database.get_connection() as conn:
+		conn.set_trace_callback(statements.append)
+	try:
+		database.get_checkin_logs(account_id=account_id)
+		database.get_checkin_logs(user_id=user_id)
+		database.get_checkin_logs()
+		database.get_balance_history(account_id)
+		database.get_statistics(user_id=user_id)
+		database.get_statistics()
+	finally:
+		with database.get_connection() as conn:
+			conn.set_trace_callback(None)
+
+	queries = [
+		sql
+		for sql in statements
+		if sql.lstrip().upper().startswith('SELECT') and ('checkin_logs' in sql or 'balance_history' in sql)
+	]
+	assert queries
+	with database.get_connection() as conn:
+		for sql in queries:
+			plan = [row['detail'] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}')]
+			full_scans = [step for step in plan if step.startswith('SCAN') and 'INDEX' not in step]
+			assert not full_scans, (sql, plan)
+			if "DATE('now')" in sql:
+				# 今日统计必须是索引范围查找，而不是遍历整个索引
+				assert not [step for step in plan if step.startswith('SCAN')], (sql, plan)
+
+
+class CountingCipher:
+	def __init__(self, cipher):
+		self.cipher = cipher
+		self.decrypts = 0
+
+	def encrypt(self, data):
+		return self.cipher.encrypt(data)
+
+	def decrypt(self, data):
+		self.decrypts += 1
+		return self.cipher.decrypt(data)
+
+
+def test_account_secrets_decrypt_lazily_and_once(database, account_id):
+	cipher = database.cipher = CountingCipher(database.cipher)
+
+	accounts = database.get_all_accounts()
+	assert cipher.decrypts == 0
+	assert 'cookies' in accounts[0] and accounts[0]['name'] == 'Account 1'
+	assert cipher.decrypts == 0
+
+	assert accounts[0]['cookies'] == '{"session": "abc"}'
+	assert accounts[0].get('cookies') == '{"session": "abc"}'
+	assert cipher.decrypts == 1
+
+	# 相同密文命中缓存
+	assert database.get_account(account_id)['cookies'] == '{"session": "abc"}'
+	assert cipher.decrypts == 1
+
+	account = database.get_account(account_id)
+	del account['cookies']
+	assert 'cookies' not in account and json.loads(json.dumps(account))['name'] == 'Account 1'
+
+
+def test_account_projection_skips_secret_columns(database, account_id):
+	database.cipher = CountingCipher(database.cipher)
+
+	accounts = database.get_all_accounts(include_secrets=False)
+
+	assert set(accounts[0]) == set(Database.PUBLIC_ACCOUNT_COLUMNS)
+	assert database.cipher.decrypts == 0
+
+
+def test_async_database_runs_off_event_loop(database, account_id):
+	adb = AsyncDatabase(database, max_workers=2)
+	threads = []
+	get_account = database.get_account
+
+	def slow_get_account(*args, **kwargs):
+		threads.append(threading.current_thread().name)
+		threading.Event().wait(0.1)
+		return get_account(*args, **kwargs)
+
+	database.get_account = slow_get_account
+
+	async def run():
+		ticks = 0
+
+		async def ticker():
+			nonlocal ticks
+			while True:
+				await asyncio.sleep(0.01)
+				ticks += 1
+
+		task = asyncio.create_task(ticker())
+		account = await adb.get_account(account_id)
+		task.cancel()
+		return account, ticks
+
+	try:
+		account, ticks = asyncio.run(run())
+	finally:
+		adb.shutdown()
+
+	assert account['name'] == 'Account 1'
+	assert threads[0].startswith('database')
+	# 查询期间事件循环仍在运行
+	assert ticks >= 5
+	assert adb.SECRET_ACCOUNT_FIELDS == Database.SECRET_ACCOUNT_FIELDS
+
+
+def test_write_behind_batches_checkin_results(tmp_path):
+	database = Database(str(tmp_path / 'checkin.db'), str(tmp_path / 'secret.key'), pool_size=1)
+	database.writer = WriteBehindWriter(database, max_items=100, flush_interval_ms=60000)
+	user_id = database.add_user('tester', 'secret', 'Tester')
+	account_ids = [database.add_account(user_id, f'Account {i}', cookies='{}', api_user=str(i)) for i in range(500)]
+
+	# 每次借出连接对应一次提交
+	transactions = 0
+	get_connection = database.get_connection
+
+	def counting_get_connection():
+		nonlocal transactions
+		transactions += 1
+		return get_connection()
+
+	database.get_connection = counting_get_connection
+	for i, account_id in enumerate(account_ids):
+		database.writer.add_checkin_log(account_id, True, '签到成功')
+		database.writer.add_balance_record(account_id, 100.0 + i, 1.0)
+		if i % 50 == 0:
+			database.writer.update_account(account_id, api_user=f'new-{i}')
+	database.flush_writes()
+	database.get_connection = get_connection
+
+	assert 0 < transactions <= 12
+	assert database.writer.pending == 0
+	assert len(database.get_checkin_logs(limit=1000)) == 500
+	assert database.get_latest_balance(account_ids[-1])['quota'] == 599.0
+	assert database.get_account(account_ids[50])['api_user'] == 'new-50'
+	database.close()
+
+
+def test_write_behind_flushes_on_timer_and_close(tmp_path):
+	database = Database(str(tmp_path / 'checkin.db'), str(tmp_path / 'secret.key'), pool_size=1)
+	database.writer = WriteBehindWriter(database, max_items=100, flush_interval_ms=50)
+	user_id = database.add_user('tester', 'secret', 'Tester')
+	account_id = database.add_account(user_id, 'Account 1', cookies='{}', api_user='1')
+
+	database.writer.add_checkin_log(account_id, True, 'timer')
+	threading.Event().wait(0.3)
+	assert len(database.get_checkin_logs(account_id=account_id)) == 1
+
+	database.writer = WriteBehindWriter(database, max_items=100, flush_interval_ms=60000)
+	database.writer.add_balance_record(account_id, 5.0, 1.0)
+	database.close()
+
+	reopened = Database(str(tmp_path / 'checkin.db'), str(tmp_path / 'secret.key'), pool_size=0)
+	assert reopened.get_latest_balance(account_id)['quota'] == 5.0
+
+
+def test_async_database_initializes_lazy_database_in_executor(tmp_path):
+	threads = []
+
+	def factory():
+		threads.append(threading.current_thread().name)
+		return Database(str(tmp_path / 'checkin.db'), str(tmp_path / 'secret.key'), pool_size=0)
+
+	lazy = LazyDatabase(factory)
+	adb = AsyncDatabase(lazy)
+	# 创建线程池不需要先创建数据库
+	assert adb.executor is not None
+	assert not lazy.initialized
+
+	asyncio.run(adb.initialize())
+	assert threads and threads[0].startswith('database')
+	lazy.close()
+	adb.shutdown()
+
+
+def test_writers_are_released_after_close(tmp_path):
+	database = Database(str(tmp_path / 'checkin.db'), str(tmp_path / 'secret.key'), pool_size=0)
+	writer = weakref.ref(database.writer)
+	assert writer() in database_module._open_writers
+
+	database.close()
+	assert writer() not in database_module._open_writers
+
+	# 退出时写入用的是弱引用，不会让已经不用的写缓冲一直留在内存中
+	del database
+	gc.collect()
+	assert writer() is None
+
+
+def test_email_preferences_are_normalized_and_resettable(database):
+	database.set_email_preference(' Owner@Example.com ', 'digest')
+	database.set_email_preference('other@example.com', 'failures_only')
+	database.set_email_preference('owner@example.com', 'failures_only')
+
+	assert database.get_email_preferences(['OWNER@example.com', 'missing@example.com']) == {
+		'owner@example.com': 'failures_only'
+	}
+	assert len(database.get_email_preferences()) == 2
+
+	database.set_email_preference('owner@example.com', None)
+	assert database.get_email_preferences() == {'other@example.com': 'failures_only'}
+	with pytest.raises(ValueError):
+		database.set_email_preference('owner@example.com', 'hourly')
+
+
+def test_import_does_not_create_database(tmp_path):
+	code = (
+		'import checkin, web.database\n'
+		'from utils.notify import notify\n'
+		'print(notify.email_user, web.database.db.initialized)'
+	)
+	env = {
+		**os.environ,
+		'DATABASE_PATH': str(tmp_path / 'checkin.db'),
+		'DATABASE_KEY_PATH': str(tmp_path / 'secret.key'),
+		'EMAIL_USER': 'bot@example.com',
+	}
+
+	output = subprocess.run(
+		[sys.executable, '-c', code], cwd=project_root, env=env, capture_output=True, text=True, check=True
+	).stdout
+
+	assert output.splitlines()[-1] == 'bot@example.com False'
+	assert not (tmp_path / 'checkin.db').exists()
@@ -0,0 +1,82 @@
+import asyncio
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 PATH
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.email_digest import DigestEntry, EmailDigest, get_email_notify_mode
+
+
+class FakeNotify:
+	def __init__(self):
+		self.batches = []
+
+	async def asend_emails_to(self, emails, msg_type='text'):
+		self.batches.append((emails, msg_type))
+		return [ValueError('mailbox full') if to == 'full@example.com' else None for to, _, _ in emails]
+
+
+def test_results_are_grouped_by_recipient():
+	digest = EmailDigest('en', mode='digest')
+	for i in range(3):
+		digest.add(
+			'Owner@Example.com', DigestEntry(f'account-{i}', 'anyrouter', i != 1, quota=10.0 + i, used_quota=1.0)
+		)
+	digest.add('other@example.com', DigestEntry('solo', 'agentrouter', False, error='WAF blocked'))
+
+	assert digest.recipients == ['owner@example.com', 'other@example.com']
+	title, content = digest.render('owner@example.com')
+	assert title == 'AnyRouter Check-in Digest - 2/3 succeeded'
+	assert [line for line in content.splitlines() if line.startswith('Account:')] == [
+		'Account: account-0',
+		'Account: account-1',
+		'Account: account-2',
+	]
+	assert 'Balance: $12.0' in content
+	assert 'Error: WAF blocked' in digest.render('other@example.com')[1]
+
+
+def test_failures_only_preference_skips_successes():
+	digest = EmailDigest('zh', mode='digest', preferences={'quiet@example.com': 'failures_only'})
+	assert not digest.add('quiet@example.com', DigestEntry('ok', 'anyrouter', True))
+	assert digest.add('QUIET@example.com', DigestEntry('bad', 'anyrouter', False, error='签到失败'))
+	assert digest.add('loud@example.com', DigestEntry('ok', 'anyrouter', True))
+
+	assert digest.mode_for('Quiet@Example.com') == 'failures_only'
+	assert digest.mode_for('loud@example.com') == 'digest'
+	title, content = digest.render('quiet@example.com')
+	assert title == 'AnyRouter 签到汇总 - 0/1 成功'
+	assert '账号: bad' in content and '账号: ok' not in content
+
+
+def test_html_digest_escapes_values():
+	digest = EmailDigest('en', mode='digest')
+	digest.add('owner@example.com', DigestEntry('<script>', 'anyrouter', False, error='a & b'))
+
+	_, content = digest.render('owner@example.com', msg_type='html')
+
+	assert '&lt;script&gt;' in content and 'a &amp; b' in content
+	assert '<script>' not in content
+
+
+def test_digests_are_sent_as_one_batch():
+	digest = EmailDigest('en', mode='digest')
+	digest.add('owner@example.com', DigestEntry('a', 'anyrouter', True))
+	digest.add('full@example.com', DigestEntry('b', 'anyrouter', True))
+	notify = FakeNotify()
+
+	results = asyncio.run(digest.asend(notify))
+
+	assert results == {'owner@example.com': True, 'full@example.com': False}
+	assert len(notify.batches) == 1
+	assert [to for to, _, _ in notify.batches[0][0]] == ['owner@example.com', 'full@example.com']
+
+
+def test_invalid_mode_falls_back_to_immediate(monkeypatch):
+	monkeypatch.setenv('EMAIL_NOTIFY_MODE', 'Digest')
+	assert get_email_notify_mode() == 'digest'
+
+	monkeypatch.setenv('EMAIL_NOTIFY_MODE', 'hourly')
+	assert get_email_notify_mode() == 'immediate'
@@ -0,0 +1,43 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+# 添加项目根目录和 benchmarks 目录到 PATH
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(project_root / 'benchmarks'))
+
+from fake_provider import FakeProvider, FakeProviderServer
+
+import checkin
+from utils.config import AccountConfig, AppConfig
+from utils.http_pool import http_pool
+from utils.waf_cache import WafCookieCache
+
+
+def test_check_in_against_fake_provider(tmp_path, monkeypatch):
+	provider = FakeProvider(latency_ms=5)
+
+	with FakeProviderServer(provider) as server:
+		monkeypatch.setenv('PROVIDERS', json.dumps({'fake': {'domain': server.url, 'bypass_method': 'waf_cookies'}}))
+		monkeypatch.setattr(checkin, 'WAF_BYPASS_MODE', 'http')
+		monkeypatch.setattr(checkin, 'waf_cookie_cache', WafCookieCache(str(tmp_path / 'waf.json')))
+		app_config = AppConfig.load_from_env()
+		accounts = [AccountConfig(cookies={'session': f's{i}'}, api_user=str(i), provider='fake') for i in range(5)]
+
+		async def run():
+			try:
+				return await asyncio.gather(
+					*(checkin.check_in_account(a, i, app_config) for i, a in enumerate(accounts))
+				)
+			finally:
+				await http_pool.aclose()
+
+		results = asyncio.run(run())
+
+	assert all(success for success, _ in results)
+	assert [user_info['quota'] for _, user_info in results] == [100.0 + i for i in range(5)]
+	# 并发的账号只解一次 WAF 挑战：挑战页面 + 带 acw_sc__v2 的验证请求
+	assert provider.requests['/login'] == 2
+	assert provider.requests['/api/user/sign_in'] == 5
@@ -0,0 +1,92 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import httpx
+
+# 添加项目根目录到 PATH
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.config import HttpPoolConfig
+from utils.http_pool import HttpClientPool, build_cookie_header
+
+
+def make_pool() -> HttpClientPool:
+	return HttpClientPool(HttpPoolConfig(http2=False))
+
+
+def test_client_shared_per_domain():
+	pool = make_pool()
+
+	async def run():
+		first = pool.get_client('anyrouter.top')
+		again = pool.get_client('anyrouter.top')
+		other = pool.get_client('agentrouter.org')
+		await pool.aclose()
+		return first, again, other
+
+	first, again, other = asyncio.run(run())
+
+	assert first is again
+	assert first is not other
+
+
+def test_client_recreated_for_new_event_loop():
+	pool = make_pool()
+
+	async def get():
+		return pool.get_client('anyrouter.top')
+
+	first = asyncio.run(get())
+	second = asyncio.run(get())
+
+	assert first is not second
+
+
+def test_closed_client_is_replaced():
+	pool = make_pool()
+
+	async def run():
+		client = pool.get_client('anyrouter.top')
+		await client.aclose()
+		return client, pool.get_client('anyrouter.top')
+
+	closed, replacement = asyncio.run(run())
+
+	assert closed is not replacement
+	assert not replacement.is_closed
+
+
+def test_shared_client_does_not_store_cookies():
+	pool = make_pool()
+
+	async def run():
+		client = pool.get_client('anyrouter.top')
+		request = httpx.Request('GET', 'https://anyrouter.top/api/user/self')
+		response = httpx.Response(200, headers={'Set-Cookie': 'session=account-1; Path=/'}, request=request)
+		client.cookies.extract_cookies(response)
+		cookies = list(client.cookies.jar)
+		await pool.aclose()
+		return cookies
+
+	# 账号 A 的响应设置的 session 不能被之后使用同一个客户端的账号 B 带上
+	assert asyncio.run(run()) == []
+
+
+def test_build_cookie_header_skips_empty_values():
+	assert build_cookie_header({'session': 'abc', 'acw_tc': None, 'cdn_sec_tc': 'x'}) == 'session=abc; cdn_sec_tc=x'
+
+
+def test_aclose_closes_all_clients():
+	pool = make_pool()
+
+	async def run():
+		clients = [pool.get_client('anyrouter.top'), pool.get_client('agentrouter.org')]
+		await pool.aclose()
+		return clients, pool.get_client('anyrouter.top')
+
+	clients, new_client = asyncio.run(run())
+
+	assert all(client.is_closed for client in clients)
+	assert new_client not in clients
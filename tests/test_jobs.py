@@ -0,0 +1,93 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+# 添加项目根目录到 PATH
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import web.api as api
+from web.auth import create_access_token
+from web.database import db
+
+
+@pytest.fixture
+def admin_headers():
+	user = db.get_user_by_username('admin')
+	token = create_access_token({'user_id': user['id'], 'username': 'admin', 'role': 'admin'})
+	return {'Authorization': f'Bearer {token}'}
+
+
+@pytest.fixture
+def account_ids():
+	user_id = db.get_user_by_username('admin')['id']
+	ids = [db.add_account(user_id, f'Job Account {i}', cookies='{"session": "x"}', api_user=str(i)) for i in range(6)]
+	yield ids
+	for account_id in ids:
+		db.delete_account(account_id)
+
+
+def test_checkin_all_runs_as_concurrent_background_job(admin_headers, account_ids, monkeypatch):
+	monkeypatch.setenv('CHECKIN_ALL_CONCURRENCY', '3')
+	running = 0
+	peak = 0
+
+	async def fake_perform_checkin(account_id, current_user, run_id=None):
+		nonlocal running, peak
+		running += 1
+		peak = max(peak, running)
+		await asyncio.sleep(0.05)
+		running -= 1
+		if account_id == account_ids[0]:
+			raise HTTPException(status_code=400, detail='签到失败')
+		return {'success': True}
+
+	monkeypatch.setattr(api, 'perform_checkin', fake_perform_checkin)
+
+	async def run():
+		transport = httpx.ASGITransport(app=api.app)
+		async with httpx.AsyncClient(transport=transport, base_url='http://test', headers=admin_headers) as client:
+			response = await client.post('/api/checkin-all')
+			job = response.json()['data']
+
+			events = []
+			async with client.stream('GET', f'/api/jobs/{job["job_id"]}/events') as stream:
+				event = None
+				async for line in stream.aiter_lines():
+					if line.startswith('event: '):
+						event = line[len('event: ') :]
+					elif line.startswith('data: '):
+						events.append((event, json.loads(line[len('data: ') :])))
+
+			status = (await client.get(f'/api/jobs/{job["job_id"]}')).json()['data']
+			return job, events, status
+
+	job, events, status = asyncio.run(run())
+
+	assert job['status'] == 'running' and job['total_count'] >= len(account_ids)
+	results = [data for event, data in events if event == 'result']
+	assert {r['account_id'] for r in results} >= set(account_ids)
+	assert [r['error'] for r in results if not r['success']] == ['签到失败']
+	assert events[-1][0] == 'done' and events[-1][1]['status'] == 'completed'
+	assert status['completed_count'] == status['total_count'] == len(results)
+	assert 1 < peak <= 3
+
+
+def test_job_requires_owner(admin_headers):
+	job = api.jobs.create(user_id=-1, total=0)
+	token = create_access_token({'user_id': 12345, 'username': 'someone', 'role': 'user'})
+
+	async def run():
+		transport = httpx.ASGITransport(app=api.app)
+		async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+			other = await client.get(f'/api/jobs/{job.id}', headers={'Authorization': f'Bearer {token}'})
+			admin = await client.get(f'/api/jobs/{job.id}', headers=admin_headers)
+			missing = await client.get('/api/jobs/unknown', headers=admin_headers)
+			return other.status_code, admin.status_code, missing.status_code
+
+	assert asyncio.run(run()) == (403, 200, 404)
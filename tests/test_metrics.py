@@ -0,0 +1,75 @@
+import asyncio
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import httpx
+from prometheus_client import REGISTRY
+
+# 添加项目根目录到 PATH
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import web.api as api
+from utils.metrics import HTTPX_EVENT_HOOKS, record_checkin
+
+
+def test_metrics_endpoint_exposes_series():
+	record_checkin('anyrouter', True)
+	record_checkin('anyrouter', False)
+
+	async def run():
+		# 先调用一次数据库方法，产生数据库延迟指标
+		await api.adb.get_all_configs()
+		transport = httpx.ASGITransport(app=api.app)
+		async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+			return await client.get('/metrics')
+
+	response = asyncio.run(run())
+
+	assert response.status_code == 200
+	assert response.headers['content-type'].startswith('text/plain')
+	assert 'anyrouter_checkins_total{provider="anyrouter",result="success"}' in response.text
+	assert 'anyrouter_checkins_total{provider="anyrouter",result="failure"}' in response.text
+	assert 'anyrouter_db_query_seconds_count{method="get_all_configs"}' in response.text
+	for name in ('anyrouter_waf_blocks_total', 'anyrouter_browser_launch_seconds', 'anyrouter_scheduler_run_seconds'):
+		assert f'# TYPE {name}' in response.text
+
+
+def test_provider_request_latency_recorded():
+	def handler(request):
+		return httpx.Response(200, json={'success': True})
+
+	async def run():
+		async with httpx.AsyncClient(transport=httpx.MockTransport(handler), event_hooks=HTTPX_EVENT_HOOKS) as client:
+			await client.get('https://provider.example/api/user/self')
+
+	labels = {'provider': 'provider.example', 'endpoint': '/api/user/self', 'status': '200'}
+	before = REGISTRY.get_sample_value('anyrouter_provider_request_seconds_count', labels) or 0
+
+	asyncio.run(run())
+
+	assert REGISTRY.get_sample_value('anyrouter_provider_request_seconds_count', labels) == before + 1
+
+
+def test_metrics_shared_across_processes(tmp_path):
+	env = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': str(tmp_path), 'PYTHONPATH': str(project_root)}
+	# 模拟定时任务进程记录一次运行耗时
+	subprocess.run(
+		[sys.executable, '-c', 'from utils.metrics import SCHEDULER_RUN_SECONDS; SCHEDULER_RUN_SECONDS.observe(42)'],
+		env=env,
+		check=True,
+	)
+
+	# Web 服务进程输出的指标包含其他进程记录的数据
+	output = subprocess.run(
+		[sys.executable, '-c', 'from utils.metrics import render_metrics; print(render_metrics()[0].decode())'],
+		env=env,
+		check=True,
+		capture_output=True,
+		text=True,
+	).stdout
+
+	assert 'anyrouter_scheduler_run_seconds_count 1.0' in output
+	assert 'anyrouter_scheduler_run_seconds_sum 42.0' in output
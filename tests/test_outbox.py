@@ -0,0 +1,174 @@
+import asyncio
+import smtplib
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加项目根目录到 PATH
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import web.outbox as outbox_module
+from utils.config import OutboxConfig
+from web.database import AsyncDatabase, Database
+from web.outbox import NotificationOutbox
+
+
+class FakeNotify:
+	"""模拟 NotificationKit：failures 为 {收件人或渠道: 剩余失败次数}，permanent 中的收件人总是被拒绝"""
+
+	channels = ['Email', 'DingTalk', 'Telegram']
+	failures: dict[str, int] = {}
+	permanent: set[str] = set()
+	sent: list[tuple[str, str]] = []
+
+	@classmethod
+	async def acreate(cls):
+		return cls()
+
+	def configured_channels(self):
+		return list(self.channels)
+
+	def _fail(self, target: str) -> bool:
+		if self.failures.get(target, 0) > 0:
+			self.failures[target] -= 1
+			return True
+		return False
+
+	async def asend_email_to(self, to_email, title, content, msg_type='text'):
+		if to_email in self.permanent:
+			raise smtplib.SMTPRecipientsRefused({to_email: (550, b'No such user')})
+		if self._fail(to_email):
+			raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+		self.sent.append((to_email, title))
+
+	async def apush_message(self, title, content, msg_type='text', channels=None):
+		(channel,) = channels
+		if self._fail(channel):
+			return {channel: False}
+		self.sent.append((channel, title))
+		return {channel: True}
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+	database = Database(str(tmp_path / 'checkin.db'), str(tmp_path / 'secret.key'), pool_size=2)
+	adb = AsyncDatabase(database, max_workers=2)
+	monkeypatch.setattr(outbox_module, 'adb', adb)
+	monkeypatch.setattr(outbox_module, 'NotificationKit', FakeNotify)
+	FakeNotify.failures = {}
+	FakeNotify.permanent = set()
+	FakeNotify.sent = []
+	yield database
+	adb.shutdown()
+	database.close()
+
+
+def make_outbox(**kwargs) -> NotificationOutbox:
+	return NotificationOutbox(OutboxConfig(**{'backoff': 0, 'poll_interval': 1, **kwargs}))
+
+
+def test_enqueue_is_idempotent(database):
+	outbox = make_outbox()
+
+	async def run():
+		first = await outbox.enqueue_email('run-1:account:1', 'a@example.com', 'title', 'content')
+		second = await outbox.enqueue_email('run-1:account:1', 'a@example.com', 'title', 'content')
+		await outbox.stop()
+		return first, second
+
+	assert asyncio.run(run()) == (True, False)
+	assert sum(database.get_outbox_stats().values()) == 1
+
+
+def test_claimed_notifications_are_leased(database):
+	database.enqueue_notification('k1', 'email', 'a@example.com', 'title', 'content')
+
+	(claimed,) = database.claim_notifications(10, lease_seconds=60)
+
+	assert claimed['attempts'] == 1
+	# 租约内其他 worker 领取不到
+	assert database.claim_notifications(10, lease_seconds=60) == []
+	# 租约到期（进程在发送过程中退出）后可以重新领取
+	database.fail_notification(claimed['id'], 'crashed', retry_at=0)
+	assert [item['id'] for item in database.claim_notifications(10, lease_seconds=0)] == [claimed['id']]
+
+
+def test_failed_email_is_retried_until_sent(database):
+	outbox = make_outbox()
+	FakeNotify.failures = {'a@example.com': 2}
+	database.enqueue_notification('k1', 'email', 'a@example.com', 'title', 'content')
+
+	assert asyncio.run(outbox.drain()) == 1
+	assert FakeNotify.sent == [('a@example.com', 'title')]
+	assert database.get_outbox_stats()['sent'] == 1
+
+
+def test_exhausted_and_permanent_failures_are_dead_lettered(database):
+	outbox = make_outbox(max_attempts=3)
+	FakeNotify.failures = {'flaky@example.com': 10}
+	FakeNotify.permanent = {'gone@example.com'}
+	database.enqueue_notification('k1', 'email', 'flaky@example.com', 'title', 'content')
+	database.enqueue_notification('k2', 'email', 'gone@example.com', 'title', 'content')
+
+	assert asyncio.run(outbox.drain()) == 0
+
+	dead = {item['recipient']: item for item in database.get_dead_notifications()}
+	assert dead['flaky@example.com']['attempts'] == 3
+	assert dead['gone@example.com']['attempts'] == 1
+	assert 'No such user' in dead['gone@example.com']['last_error']
+
+	# 死信重新入队后再次发送
+	FakeNotify.failures = {}
+	assert database.retry_dead_notification(dead['flaky@example.com']['id'])
+	assert asyncio.run(outbox.drain()) == 1
+
+
+def test_missing_email_config_is_retried(database, monkeypatch):
+	outbox = make_outbox()
+	attempts = []
+
+	async def asend_email_to(self, to_email, title, content, msg_type='text'):
+		attempts.append(to_email)
+		if len(attempts) < 3:
+			raise ValueError('Email configuration (EMAIL_USER and EMAIL_PASS) not set')
+		self.sent.append((to_email, title))
+
+	monkeypatch.setattr(FakeNotify, 'asend_email_to', asend_email_to)
+	database.enqueue_notification('k1', 'email', 'a@example.com', 'title', 'content')
+
+	# 管理员补上邮件配置后继续发送，而不是第一次失败就进入死信
+	assert asyncio.run(outbox.drain()) == 1
+	assert len(attempts) == 3
+	assert database.get_dead_notifications() == []
+
+
+def test_backoff_delays_next_attempt(database):
+	outbox = make_outbox(backoff=60)
+	FakeNotify.failures = {'a@example.com': 1}
+	database.enqueue_notification('k1', 'email', 'a@example.com', 'title', 'content')
+
+	assert asyncio.run(outbox.drain()) == 0
+	# 下次发送时间还没到
+	assert database.claim_notifications(10, lease_seconds=60) == []
+	assert database.get_outbox_stats()['pending'] == 1
+
+
+def test_push_is_retried_per_channel(database):
+	outbox = make_outbox()
+	FakeNotify.failures = {'Telegram': 1}
+
+	async def run():
+		queued = await outbox.enqueue_push('run-1:summary', 'alert', 'content')
+		# 入队后 worker 在后台发送
+		for _ in range(100):
+			if database.get_outbox_stats()['sent'] == queued:
+				break
+			await asyncio.sleep(0.01)
+		await outbox.stop()
+		return queued
+
+	assert asyncio.run(run()) == 3
+	# 失败的渠道单独重试，成功的渠道只推送一次
+	assert sorted(FakeNotify.sent) == [('DingTalk', 'alert'), ('Email', 'alert'), ('Telegram', 'alert')]
@@ -0,0 +1,203 @@
+import asyncio
+import functools
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+# 添加项目根目录到 PATH
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import utils.notify as notify_module
+from utils.notify import NotificationKit, push_http_pool
+
+CHANNEL_ATTRS = (
+	'email_user', 'email_pass', 'email_to', 'pushplus_token', 'server_push_key', 'dingding_webhook',
+	'feishu_webhook', 'weixin_webhook', 'telegram_bot_token', 'telegram_chat_id',
+)  # fmt: skip
+
+
+@pytest.fixture
+def kit():
+	kit = NotificationKit()
+	for attr in CHANNEL_ATTRS:
+		setattr(kit, attr, None)
+	return kit
+
+
+@pytest.fixture
+def requests(monkeypatch):
+	"""让 push_http_pool 创建的 AsyncClient 使用模拟传输层，handlers 按 host 返回响应"""
+	handlers = {}
+	seen = []
+
+	async def handle(request: httpx.Request):
+		seen.append(request.url.host)
+		return await handlers[request.url.host](request)
+
+	monkeypatch.setattr(
+		notify_module.httpx,
+		'AsyncClient',
+		functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(handle)),
+	)
+	monkeypatch.setenv('NOTIFY_RETRY_BACKOFF_MS', '10')
+	return handlers, seen
+
+
+def test_channels_are_sent_concurrently(kit, requests):
+	handlers, seen = requests
+	kit.dingding_webhook = 'https://ding.example/robot'
+	kit.feishu_webhook = 'https://feishu.example/hook'
+	kit.weixin_webhook = 'https://wecom.example/hook'
+
+	async def slow(request):
+		await asyncio.sleep(0.2)
+		return httpx.Response(200)
+
+	handlers.update({'ding.example': slow, 'feishu.example': slow, 'wecom.example': slow})
+
+	start = time.perf_counter()
+	results = asyncio.run(kit.apush_message('title', 'content'))
+
+	assert results == {'DingTalk': True, 'Feishu': True, 'WeChat Work': True}
+	assert time.perf_counter() - start < 0.4
+	assert sorted(seen) == ['ding.example', 'feishu.example', 'wecom.example']
+
+
+def test_failed_channel_is_retried_with_backoff(kit, requests):
+	handlers, seen = requests
+	kit.pushplus_token = 'token'
+	kit.telegram_bot_token, kit.telegram_chat_id = 'bot', 'chat'
+	attempts = 0
+
+	async def flaky(request):
+		nonlocal attempts
+		attempts += 1
+		return httpx.Response(502 if attempts < 3 else 200)
+
+	async def rejected(request):
+		return httpx.Response(401)
+
+	handlers.update({'www.pushplus.plus': flaky, 'api.telegram.org': rejected})
+
+	results = asyncio.run(kit.apush_message('title', 'content'))
+
+	assert results == {'PushPlus': True, 'Telegram': False}
+	assert attempts == 3
+	# 4xx 响应不重试
+	assert seen.count('api.telegram.org') == 1
+
+
+def test_slow_channel_times_out(kit, requests, monkeypatch):
+	handlers, _ = requests
+	monkeypatch.setenv('NOTIFY_TIMEOUT', '1')
+	monkeypatch.setenv('NOTIFY_RETRIES', '0')
+	kit.dingding_webhook = 'https://ding.example/robot'
+	kit.weixin_webhook = 'https://wecom.example/hook'
+
+	async def hang(request):
+		await asyncio.sleep(10)
+		return httpx.Response(200)
+
+	async def ok(request):
+		return httpx.Response(200)
+
+	handlers.update({'ding.example': hang, 'wecom.example': ok})
+
+	start = time.perf_counter()
+	results = asyncio.run(kit.apush_message('title', 'content'))
+
+	assert results == {'DingTalk': False, 'WeChat Work': True}
+	assert time.perf_counter() - start < 2
+
+
+def test_slow_email_is_not_resent(kit, requests, monkeypatch):
+	monkeypatch.setenv('NOTIFY_TIMEOUT', '1')
+	kit.email_user, kit.email_pass, kit.email_to = 'bot@example.com', 'secret', 'me@example.com'
+	sent = []
+
+	def send_email(title, content, msg_type='text'):
+		# 比 NOTIFY_TIMEOUT 慢但最终发送成功，不能因为超时再发一封
+		time.sleep(1.2)
+		sent.append(title)
+
+	monkeypatch.setattr(kit, 'send_email', send_email)
+
+	assert asyncio.run(kit.apush_message('title', 'content')) == {'Email': True}
+	assert sent == ['title']
+
+
+def test_http_client_is_shared_between_pushes(kit, requests):
+	handlers, seen = requests
+	kit.dingding_webhook = 'https://ding.example/robot'
+
+	async def ok(request):
+		return httpx.Response(200)
+
+	handlers['ding.example'] = ok
+
+	async def run():
+		clients = []
+		for _ in range(2):
+			assert await kit.apush_message('title', 'content') == {'DingTalk': True}
+			clients.append(push_http_pool.get_client('push'))
+		await push_http_pool.aclose()
+		return clients
+
+	first, second = asyncio.run(run())
+
+	assert first is second
+	assert first.is_closed
+	assert seen == ['ding.example', 'ding.example']
+
+
+def test_unconfigured_channels_are_skipped(kit, requests):
+	_, seen = requests
+
+	assert asyncio.run(kit.apush_message('title', 'content')) == {}
+	assert seen == []
+
+
+def test_push_to_selected_channels(kit, requests):
+	handlers, seen = requests
+	kit.dingding_webhook = 'https://ding.example/robot'
+	kit.feishu_webhook = 'https://feishu.example/hook'
+
+	async def ok(request):
+		return httpx.Response(200)
+
+	handlers.update({'ding.example': ok, 'feishu.example': ok})
+
+	assert kit.configured_channels() == ['DingTalk', 'Feishu']
+	assert asyncio.run(kit.apush_message('title', 'content', channels=['Feishu'])) == {'Feishu': True}
+	assert seen == ['feishu.example']
+
+
+def test_config_is_loaded_lazily_and_cached(monkeypatch):
+	configs = {'email_user': 'db@example.com'}
+	loads = []
+
+	def get_db_configs():
+		loads.append(dict(configs))
+		return dict(configs)
+
+	monkeypatch.setattr(NotificationKit, '_get_db_configs', staticmethod(get_db_configs))
+	monkeypatch.setenv('EMAIL_USER', 'env@example.com')
+	monkeypatch.setenv('DINGDING_WEBHOOK', 'https://ding.example/robot')
+
+	kit = NotificationKit()
+	assert loads == []
+
+	assert kit.email_user == 'db@example.com'
+	assert kit.dingding_webhook == 'https://ding.example/robot'
+	assert len(loads) == 1
+
+	# 系统设置修改后失效，下次使用时重新读取
+	configs.clear()
+	assert kit.email_user == 'db@example.com'
+	kit.invalidate()
+	assert kit.email_user == 'env@example.com'
+	assert len(loads) == 2
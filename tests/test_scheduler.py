@@ -0,0 +1,163 @@
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+# 添加项目根目录到 PATH
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import web.scheduler as scheduler
+from utils.config import SchedulerConfig
+from utils.rate_limit import TokenBucket
+from web.database import db
+
+
+@pytest.fixture
+def account_ids():
+	user_id = db.get_user_by_username('admin')['id']
+	ids = [
+		db.add_account(user_id, f'Scheduled Account {i}', cookies='{"session": "x"}', api_user=str(i)) for i in range(8)
+	]
+	yield ids
+	for account_id in ids:
+		db.delete_account(account_id)
+
+
+def test_filter_shard_partitions_accounts():
+	accounts = [{'id': i} for i in range(1, 11)]
+
+	shards = [scheduler.filter_shard(accounts, index, 3) for index in range(3)]
+
+	assert sorted(a['id'] for shard in shards for a in shard) == list(range(1, 11))
+	assert all(a['id'] % 3 == index for index, shard in enumerate(shards) for a in shard)
+	assert scheduler.filter_shard(accounts, 0, 1) == accounts
+
+
+def test_shard_index_out_of_range_wraps(monkeypatch):
+	monkeypatch.setenv('SHARD_COUNT', '2')
+	monkeypatch.setenv('SHARD_INDEX', '3')
+
+	config = SchedulerConfig.load_from_env()
+
+	assert (config.shard_index, config.shard_count) == (1, 2)
+
+
+def test_auto_checkin_task_runs_shard_concurrently(account_ids, monkeypatch):
+	monkeypatch.setenv('SCHEDULER_CONCURRENCY', '3')
+	monkeypatch.setenv('SCHEDULER_SPREAD_WINDOW', '0')
+	monkeypatch.setenv('SHARD_COUNT', '2')
+	monkeypatch.setenv('SHARD_INDEX', '1')
+	processed = []
+	running = 0
+	peak = 0
+
+	async def fake_checkin(account, app_config, digest=None, run_id=None):
+		nonlocal running, peak
+		running += 1
+		peak = max(peak, running)
+		await asyncio.sleep(0.02)
+		running -= 1
+		processed.append(account['id'])
+		return {'name': account['name'], 'success': True, 'error': None}
+
+	monkeypatch.setattr(scheduler, 'checkin_scheduled_account', fake_checkin)
+
+	asyncio.run(scheduler.auto_checkin_task())
+
+	mine = [account_id for account_id in account_ids if account_id % 2 == 1]
+	assert set(mine) <= set(processed)
+	assert all(account_id % 2 == 1 for account_id in processed)
+	assert 1 < peak <= 3
+
+
+def test_spread_is_opt_in(monkeypatch):
+	monkeypatch.delenv('SCHEDULER_SPREAD_WINDOW', raising=False)
+	config = SchedulerConfig.load_from_env()
+	accounts = [{'id': i, 'name': f'account-{i}', 'provider': 'anyrouter'} for i in range(1, 4)]
+
+	assert config.spread_window == 0
+	assert {entry['offset_seconds'] for entry in scheduler.get_schedule(accounts, config)} == {0}
+
+
+def test_account_offsets_are_stable_and_spread():
+	offsets = [scheduler.account_offset(account_id, 21600) for account_id in range(1, 1001)]
+
+	assert offsets == [scheduler.account_offset(account_id, 21600) for account_id in range(1, 1001)]
+	assert all(0 <= offset < 21600 for offset in offsets)
+	# 每小时的账号数大致均匀
+	per_hour = [sum(1 for offset in offsets if hour * 3600 <= offset < (hour + 1) * 3600) for hour in range(6)]
+	assert min(per_hour) > 120
+	assert scheduler.account_offset(1, 0) == 0
+
+
+def test_schedule_next_run_within_interval():
+	config = SchedulerConfig(spread_window=18000)
+	now = datetime.now(scheduler.checkin_trigger().timezone)
+	accounts = [{'id': i, 'name': f'Account {i}', 'provider': 'anyrouter'} for i in range(1, 21)]
+
+	schedule = scheduler.get_schedule(accounts, config, now=now)
+
+	for entry in schedule:
+		next_run = datetime.fromisoformat(entry['next_run_at'])
+		assert now < next_run <= now + timedelta(hours=scheduler.CHECKIN_INTERVAL_HOURS, seconds=18000)
+		# 减去偏移后正好是一个触发时间点
+		fire_time = next_run - timedelta(seconds=entry['offset_seconds'])
+		assert (fire_time.hour % scheduler.CHECKIN_INTERVAL_HOURS, fire_time.minute, fire_time.second) == (0, 0, 0)
+
+
+class FakeClock:
+	"""模拟时钟：sleep 不真正等待，只记录每次等待的时长，advance 为 True 时把时间推进到唤醒时刻"""
+
+	def __init__(self, advance: bool = True):
+		self.now = 0.0
+		self.advance = advance
+		self.sleeps: list[float] = []
+
+	def monotonic(self) -> float:
+		return self.now
+
+	async def sleep(self, delay: float):
+		self.sleeps.append(delay)
+		if self.advance:
+			self.now += delay
+		await asyncio.sleep(0)
+
+
+def test_token_bucket_limits_rate():
+	clock = FakeClock()
+	bucket = TokenBucket(rate=20, capacity=2, clock=clock.monotonic, sleep=clock.sleep)
+
+	async def run():
+		for _ in range(6):
+			await bucket.acquire()
+
+	asyncio.run(run())
+
+	# 2 个突发令牌 + 4 个按 20/s 补充，每个等待 1/20 秒
+	assert clock.sleeps == pytest.approx([0.05] * 4)
+	assert clock.now == pytest.approx(0.2)
+
+
+def test_auto_checkin_task_spreads_accounts(account_ids, monkeypatch):
+	monkeypatch.setenv('SCHEDULER_CONCURRENCY', '8')
+	monkeypatch.setenv('SCHEDULER_SPREAD_WINDOW', '600')
+	monkeypatch.setenv('SCHEDULER_PROVIDER_RATE', '0')
+	# 并发的 worker 共用一个时钟，时间不推进，每个 worker 计算出的等待时长就是它的偏移
+	clock = FakeClock(advance=False)
+
+	async def fake_checkin(account, app_config, digest=None, run_id=None):
+		return {'name': account['name'], 'success': True, 'error': None}
+
+	monkeypatch.setattr(scheduler, 'checkin_scheduled_account', fake_checkin)
+
+	asyncio.run(scheduler.auto_checkin_task(clock=clock.monotonic, sleep=clock.sleep))
+
+	offsets = [scheduler.account_offset(account_id, 600) for account_id in account_ids]
+	assert all(0 <= offset < 600 for offset in offsets)
+	# 每个账号等到自己的偏移时刻才开始签到
+	for offset in offsets:
+		if offset > 0:
+			assert offset in clock.sleeps
@@ -0,0 +1,126 @@
+import smtplib
+import sys
+from email.mime.text import MIMEText
+from pathlib import Path
+
+import pytest
+
+# 添加项目根目录到 PATH
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import utils.smtp_pool as smtp_pool_module
+from utils.config import SmtpPoolConfig
+from utils.smtp_pool import PooledSmtpSender
+
+
+class FakeSmtp:
+	"""模拟 SMTP 连接，记录登录和发送的邮件"""
+
+	instances: list['FakeSmtp'] = []
+	refuse_ports: set[int] = set()
+
+	def __init__(self, host, port, timeout=None, context=None):
+		if port in self.refuse_ports:
+			raise ConnectionRefusedError(f'port {port} closed')
+		self.port = port
+		self.logins = 0
+		self.sent = []
+		self.disconnect_next = False
+		self.closed = False
+		FakeSmtp.instances.append(self)
+
+	def starttls(self, context=None):
+		pass
+
+	def login(self, user, password):
+		self.logins += 1
+
+	def send_message(self, msg):
+		if self.disconnect_next:
+			self.disconnect_next = False
+			raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+		if msg['To'] == 'refused@example.com':
+			raise smtplib.SMTPRecipientsRefused({msg['To']: (550, b'No such user')})
+		self.sent.append(msg['To'])
+
+	def quit(self):
+		self.closed = True
+
+	def close(self):
+		self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def fake_smtp(monkeypatch):
+	FakeSmtp.instances = []
+	FakeSmtp.refuse_ports = set()
+	monkeypatch.setattr(smtplib, 'SMTP_SSL', FakeSmtp)
+	monkeypatch.setattr(smtplib, 'SMTP', FakeSmtp)
+	monkeypatch.setattr(smtp_pool_module, '_transports', {})
+
+
+def make_sender(**kwargs) -> PooledSmtpSender:
+	return PooledSmtpSender('smtp.example.com', 'bot@example.com', 'secret', SmtpPoolConfig(**kwargs))
+
+
+def message(to: str) -> MIMEText:
+	msg = MIMEText('content', 'plain', 'utf-8')
+	msg['To'] = to
+	return msg
+
+
+def test_connection_is_reused_across_sends():
+	sender = make_sender()
+
+	for i in range(5):
+		sender.send(message(f'user{i}@example.com'))
+
+	assert sender.connections_opened == 1
+	(conn,) = FakeSmtp.instances
+	assert conn.logins == 1
+	assert conn.sent == [f'user{i}@example.com' for i in range(5)]
+
+
+def test_falls_back_to_starttls_and_remembers_it():
+	FakeSmtp.refuse_ports = {465}
+
+	make_sender().send(message('a@example.com'))
+	make_sender().send(message('b@example.com'))
+
+	assert smtp_pool_module._transports == {'smtp.example.com': 'starttls'}
+	# 第二个连接池直接使用 587，不再尝试 465
+	assert [conn.port for conn in FakeSmtp.instances] == [587, 587]
+
+
+def test_reconnects_when_server_disconnects():
+	sender = make_sender()
+	sender.send(message('a@example.com'))
+	FakeSmtp.instances[0].disconnect_next = True
+
+	sender.send(message('b@example.com'))
+
+	assert sender.connections_opened == 2
+	assert FakeSmtp.instances[0].closed
+	assert FakeSmtp.instances[1].sent == ['b@example.com']
+
+
+def test_idle_connection_is_not_reused_after_timeout():
+	sender = make_sender(idle_timeout=0)
+
+	sender.send(message('a@example.com'))
+	sender.send(message('b@example.com'))
+
+	assert sender.connections_opened == 2
+	assert FakeSmtp.instances[0].closed
+
+
+def test_batch_reports_per_message_errors():
+	sender = make_sender()
+
+	errors = sender.send_many([message('a@example.com'), message('refused@example.com'), message('c@example.com')])
+
+	assert errors[0] is None and errors[2] is None
+	assert isinstance(errors[1], smtplib.SMTPRecipientsRefused)
+	(conn,) = FakeSmtp.instances
+	assert conn.sent == ['a@example.com', 'c@example.com']
@@ -0,0 +1,104 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+# 添加项目根目录到 PATH
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import checkin
+import web.api as api
+from utils.timing import percentile, record_timings, span, summarize_spans, timed
+from web.auth import create_access_token
+from web.database import db
+
+
+def test_timed_records_sync_async_and_thread_calls():
+	@timed('sync_stage')
+	def sync_call():
+		time.sleep(0.01)
+
+	@timed('async_stage', success=bool)
+	async def async_call(result):
+		await asyncio.sleep(0.01)
+		return result
+
+	@timed('failing_stage')
+	async def failing_call():
+		raise RuntimeError('boom')
+
+	async def run():
+		with record_timings() as recorder:
+			await async_call(True)
+			await async_call(None)
+			# asyncio.to_thread 会复制上下文，线程中的调用也会被记录
+			await asyncio.to_thread(sync_call)
+			with pytest.raises(RuntimeError):
+				await failing_call()
+			with span('block'):
+				pass
+		return recorder.spans
+
+	spans = asyncio.run(run())
+
+	assert [(s['stage'], s['success']) for s in spans] == [
+		('async_stage', True),
+		('async_stage', False),
+		('sync_stage', True),
+		('failing_stage', False),
+		('block', True),
+	]
+	assert all(s['duration_ms'] >= 10 for s in spans[:3])
+	# 没有 recorder 时不记录
+	sync_call()
+
+
+def test_summarize_spans_percentiles():
+	spans = [{'stage': 'get_user_info', 'duration_ms': float(ms), 'success': ms != 100} for ms in range(1, 101)]
+
+	stats = summarize_spans(spans)['get_user_info']
+
+	assert stats['count'] == 100 and stats['failures'] == 1
+	assert stats['p50_ms'] == pytest.approx(50.5)
+	assert stats['p95_ms'] == pytest.approx(95.05)
+	assert stats['max_ms'] == 100
+	assert percentile([], 0.5) == 0
+
+
+def test_manual_checkin_timings_endpoint(monkeypatch):
+	user_id = db.get_user_by_username('admin')['id']
+	account_id = db.add_account(user_id, 'Timed Account', cookies='{"session": "x"}', api_user='1')
+
+	async def fake_check_in_account(account, account_index, app_config):
+		with span('get_user_info'):
+			await asyncio.sleep(0.01)
+		return True, {'success': True, 'quota': 1.0, 'used_quota': 0.0}
+
+	monkeypatch.setattr(checkin, 'check_in_account', fake_check_in_account)
+	admin = create_access_token({'user_id': user_id, 'username': 'admin', 'role': 'admin'})
+	other = create_access_token({'user_id': 12345, 'username': 'someone', 'role': 'user'})
+
+	async def run():
+		transport = httpx.ASGITransport(app=api.app)
+		async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+			headers = {'Authorization': f'Bearer {admin}'}
+			run_id = (await client.post(f'/api/checkin/{account_id}', headers=headers)).json()['run_id']
+			timings = await client.get(f'/api/runs/{run_id}/timings', headers=headers)
+			hidden = await client.get(f'/api/runs/{run_id}/timings', headers={'Authorization': f'Bearer {other}'})
+			return timings.json()['data'], hidden.status_code
+
+	try:
+		data, hidden_status = asyncio.run(run())
+	finally:
+		db.delete_account(account_id)
+
+	assert set(data['stages']) == {'get_user_info', 'total'}
+	assert data['stages']['get_user_info']['p50_ms'] >= 10
+	assert data['stages']['total']['p95_ms'] >= data['stages']['get_user_info']['p95_ms']
+	assert [a['account_id'] for a in data['accounts']] == [account_id]
+	assert [s['stage'] for s in data['accounts'][0]['spans']] == ['get_user_info', 'total']
+	assert hidden_status == 404
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+# 添加项目根目录到 PATH
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import checkin
+from utils.config import AppConfig
+from utils.singleflight import SingleFlight
+from utils.waf_cache import WafCookieCache
+from utils.waf_solver import compute_acw_sc_v2, solve_waf_challenge
+
+
+@pytest.fixture
+def provider_config():
+	return AppConfig.load_from_env().get_provider('anyrouter')
+
+
+@pytest.fixture
+def waf_cache(tmp_path, monkeypatch):
+	cache = WafCookieCache(str(tmp_path / 'waf_cookies_cache.json'))
+	monkeypatch.setattr(checkin, 'waf_cookie_cache', cache)
+	monkeypatch.setattr(checkin, '_waf_refresh', SingleFlight())
+	monkeypatch.setattr(checkin, 'WAF_BYPASS_MODE', 'browser')
+	return cache
+
+
+def test_single_flight_shares_result():
+	calls = 0
+
+	async def fetch():
+		nonlocal calls
+		calls += 1
+		await asyncio.sleep(0.05)
+		return calls
+
+	async def run():
+		flight = SingleFlight()
+		return await asyncio.gather(*(flight.do('key', fetch) for _ in range(10)))
+
+	assert asyncio.run(run()) == [1] * 10
+	assert calls == 1
+
+
+def test_concurrent_refresh_launches_one_browser(provider_config, waf_cache, monkeypatch):
+	launches = 0
+
+	async def fake_get_waf_cookies(account_name, login_url):
+		nonlocal launches
+		launches += 1
+		await asyncio.sleep(0.05)
+		return {'acw_tc': f'tc{launches}', 'cdn_sec_tc': 'sec', 'acw_sc__v2': 'v2'}, None
+
+	monkeypatch.setattr(checkin, 'get_waf_cookies_with_playwright', fake_get_waf_cookies)
+
+	async def run():
+		return await asyncio.gather(
+			*(
+				checkin.prepare_cookies(f'Account {i}', provider_config, {'session': str(i)}, force_refresh=True)
+				for i in range(20)
+			)
+		)
+
+	results = asyncio.run(run())
+
+	assert launches == 1
+	assert all(r['acw_tc'] == 'tc1' for r in results)
+	assert [r['session'] for r in results] == [str(i) for i in range(20)]
+
+
+def test_stale_refresh_reuses_newer_cache(provider_config, waf_cache, monkeypatch):
+	launches = 0
+
+	async def fake_get_waf_cookies(account_name, login_url):
+		nonlocal launches
+		launches += 1
+		return {'acw_tc': f'tc{launches}', 'cdn_sec_tc': 'sec', 'acw_sc__v2': 'v2'}, None
+
+	monkeypatch.setattr(checkin, 'get_waf_cookies_with_playwright', fake_get_waf_cookies)
+
+	async def run():
+		first = await checkin.prepare_cookies('A', provider_config, {'session': 'a'}, force_refresh=True)
+		# 另一个账号拿着刷新前的旧 cookies 被拦截，缓存已更新时不应再次启动浏览器
+		stale = {**first, 'acw_tc': 'old'}
+		return await checkin.prepare_cookies('B', provider_config, {'session': 'b'}, force_refresh=True, stale_cookies=stale)
+
+	result = asyncio.run(run())
+
+	assert launches == 1
+	assert result['acw_tc'] == 'tc1'
+
+
+def test_cache_expires_before_cookie_expiry(tmp_path):
+	path = str(tmp_path / 'waf_cookies_cache.json')
+	cache = WafCookieCache(path, refresh_margin=60)
+
+	cache.set('https://a.example', {'acw_tc': 'fresh'}, expires_at=time.time() + 3600)
+	cache.set('https://b.example', {'acw_tc': 'stale'}, expires_at=time.time() + 30)
+
+	assert cache.lookup('https://a.example') == ({'acw_tc': 'fresh'}, 'hit')
+	assert cache.lookup('https://b.example') == (None, 'expired')
+	assert cache.lookup('https://c.example') == (None, 'miss')
+
+	# 另一个进程（新实例）能读到持久化的条目
+	assert WafCookieCache(path).get('https://a.example') == {'acw_tc': 'fresh'}
+
+
+def test_cache_reads_legacy_format(tmp_path):
+	path = tmp_path / 'waf_cookies_cache.json'
+	path.write_text(json.dumps({'https://anyrouter.top': {'acw_tc': 'x', 'cdn_sec_tc': 'y', 'acw_sc__v2': 'z'}}))
+
+	assert WafCookieCache(str(path)).get('https://anyrouter.top') == {'acw_tc': 'x', 'cdn_sec_tc': 'y', 'acw_sc__v2': 'z'}
+
+
+def test_compute_acw_sc_v2():
+	assert compute_acw_sc_v2('0123456789ABCDEF0123456789ABCDEF01234567') == 'd2c7186598ab1a508a4f6064e4fa746323ab17c6'
+
+
+def test_solve_waf_challenge_without_browser():
+	arg1 = 'D2E0D4A1F4D7E3B2C1A09F8E7D6C5B4A39281706'
+	expected = compute_acw_sc_v2(arg1)
+
+	def handler(request):
+		if f'acw_sc__v2={expected}' in request.headers.get('cookie', ''):
+			return httpx.Response(200, text='<html>login</html>', headers={'set-cookie': 'cdn_sec_tc=sec; Path=/'})
+		return httpx.Response(
+			200,
+			text=f"<html><script>var arg1='{arg1}';</script></html>",
+			headers={'set-cookie': 'acw_tc=tc; Path=/; Max-Age=1800'},
+		)
+
+	async def run():
+		async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+			return await solve_waf_challenge(client, 'Account 1', 'https://waf.example/login')
+
+	cookies, expires_at = asyncio.run(run())
+
+	assert cookies == {'acw_tc': 'tc', 'cdn_sec_tc': 'sec', 'acw_sc__v2': expected}
+	assert time.time() < expires_at <= time.time() + 1800
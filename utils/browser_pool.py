@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+浏览器池 - 复用常驻的 Chromium 进程，每次请求分配一个隔离的无痕上下文
+"""
+
+import asyncio
+import os
+import signal
+import time
+from contextlib import asynccontextmanager
+
+from playwright.async_api import Browser, BrowserContext, Playwright, async_playwright
+
+from utils.config import BrowserPoolConfig
+from utils.metrics import BROWSER_LAUNCH_SECONDS, BROWSER_LAUNCHES
+
+USER_AGENT = (
+	'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36'
+)
+
+LAUNCH_ARGS = [
+	'--disable-blink-features=AutomationControlled',
+	'--disable-dev-shm-usage',
+	'--disable-web-security',
+	'--disable-features=VizDisplayCompositor',
+	'--no-sandbox',
+]
+
+
+class _PooledBrowser:
+	"""池中的单个浏览器进程"""
+
+	def __init__(self, browser: Browser):
+		self.browser = browser
+		self.uses = 0  # 已分配过的上下文数量
+		self.active = 0  # 正在使用的上下文数量
+		self.retiring = False  # 是否等待回收
+		self.launched_at = time.monotonic()
+		self.memory_checked_at = time.monotonic()  # 上次检查内存的时间
+		self.pid: int | None = None  # Chromium 主进程号，事件循环结束后无法再调用 Playwright 时用于结束进程
+
+	def is_available(self) -> bool:
+		return not self.retiring and self.browser.is_connected()
+
+
+def _kill(pid: int):
+	"""强制结束进程（进程已经退出时忽略）"""
+	try:
+		os.kill(pid, getattr(signal, 'SIGKILL', signal.SIGTERM))
+	except OSError:
+		pass
+
+
+def _driver_pid(playwright: Playwright | None) -> int | None:
+	"""Playwright driver 进程号（Playwright 没有公开接口，取不到时返回 None）"""
+	try:
+		return playwright._impl_obj._connection._transport._proc.pid
+	except AttributeError:
+		return None
+
+
+async def _process_info(browser: Browser) -> list[dict]:
+	"""通过 CDP 获取浏览器的所有进程（browser/renderer/gpu 等）"""
+	session = await browser.new_browser_cdp_session()
+	try:
+		info = await session.send('SystemInfo.getProcessInfo')
+	finally:
+		await session.detach()
+	return info.get('processInfo', [])
+
+
+# /proc 只在 Linux 上存在，导入时检查一次
+_HAS_PROC = os.path.exists('/proc')
+
+
+def _read_rss_mb(pid: int) -> float:
+	"""读取进程常驻内存（MB），仅支持 Linux"""
+	try:
+		with open(f'/proc/{pid}/statm', 'r') as f:
+			resident_pages = int(f.read().split()[1])
+		return resident_pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+	except Exception:
+		return 0.0
+
+
+class BrowserPool:
+	"""常驻 Chromium 浏览器池
+
+	- 保持 size 个浏览器进程常驻，避免每次获取 cookies 都冷启动 Chromium
+	- 每次请求通过 new_context() 获取一个全新的无痕上下文，请求之间互不影响
+	- 浏览器分配次数达到 max_uses 或内存超过 max_memory_mb 时，在空闲后自动关闭并重新启动
+	"""
+
+	def __init__(self, config: BrowserPoolConfig | None = None):
+		self._config = config
+		self._playwright: Playwright | None = None
+		self._browsers: list[_PooledBrowser] = []
+		self._condition: asyncio.Condition | None = None
+		self._loop: asyncio.AbstractEventLoop | None = None
+
+	@property
+	def config(self) -> BrowserPoolConfig:
+		"""配置在首次使用时才从环境变量读取，保证 load_dotenv() 已经执行"""
+		if self._config is None:
+			self._config = BrowserPoolConfig.load_from_env()
+		return self._config
+
+	def _bind_loop(self):
+		"""Playwright 对象绑定在创建时的事件循环上，换了事件循环就关闭旧的浏览器并重置状态"""
+		loop = asyncio.get_running_loop()
+		if self._loop is not loop:
+			if self._loop is not None:
+				self._abandon(self._loop, self._browsers, self._playwright)
+			self._playwright = None
+			self._browsers = []
+			self._condition = asyncio.Condition()
+			self._loop = loop
+
+	def _abandon(self, loop: asyncio.AbstractEventLoop, browsers: list[_PooledBrowser], playwright: Playwright | None):
+		"""关闭绑定在旧事件循环上的浏览器，避免 Chromium 进程泄漏"""
+		if not browsers and playwright is None:
+			return
+		if loop.is_running() and not loop.is_closed():
+			# 旧事件循环还在其他线程中运行，在它上面正常关闭
+			asyncio.run_coroutine_threadsafe(self._shutdown(browsers, playwright), loop)
+			return
+
+		# 旧事件循环已经结束，无法再调用 Playwright，直接结束 Chromium 和 driver 进程
+		pids = [pooled.pid for pooled in browsers if pooled.pid] + [_driver_pid(playwright)]
+		pids = [pid for pid in pids if pid]
+		for pid in pids:
+			_kill(pid)
+		print(f'[BROWSER] Killed {len(pids)} process(es) left over from a previous event loop')
+
+	async def _launch(self) -> _PooledBrowser:
+		if self._playwright is None:
+			self._playwright = await async_playwright().start()
+
+		print('[BROWSER] Launching pooled Chromium instance...')
+		start = time.monotonic()
+		browser = await self._playwright.chromium.launch(headless=self.config.headless, args=LAUNCH_ARGS)
+		elapsed = time.monotonic() - start
+		BROWSER_LAUNCHES.inc()
+		BROWSER_LAUNCH_SECONDS.observe(elapsed)
+		print(f'[BROWSER] Chromium launched in {elapsed:.2f}s')
+
+		pooled = _PooledBrowser(browser)
+		try:
+			pooled.pid = next(p['id'] for p in await _process_info(browser) if p.get('type') == 'browser')
+		except Exception:
+			pass
+		self._browsers.append(pooled)
+		return pooled
+
+	async def _acquire(self) -> _PooledBrowser:
+		async with self._condition:
+			while True:
+				# 清理已断开（崩溃）的浏览器
+				self._browsers = [b for b in self._browsers if b.browser.is_connected()]
+
+				available = [b for b in self._browsers if b.is_available()]
+				candidates = [b for b in available if b.active < self.config.max_contexts_per_browser]
+				if candidates:
+					pooled = min(candidates, key=lambda b: b.active)
+				elif len(available) < self.config.size:
+					pooled = await self._launch()
+				else:
+					await self._condition.wait()
+					continue
+
+				pooled.active += 1
+				pooled.uses += 1
+				return pooled
+
+	async def _memory_mb(self, pooled: _PooledBrowser) -> float:
+		"""统计浏览器所有进程（browser/renderer/gpu 等）的内存占用"""
+		if not _HAS_PROC:
+			return 0.0
+		try:
+			pids = [process['id'] for process in await _process_info(pooled.browser)]
+			return await asyncio.to_thread(lambda: sum(_read_rss_mb(pid) for pid in pids))
+		except Exception:
+			return 0.0
+
+	async def _release(self, pooled: _PooledBrowser):
+		# 内存检查需要建立 CDP 会话，每个浏览器按 memory_check_interval 间隔检查，而不是每次归还都检查
+		memory_mb = 0.0
+		now = time.monotonic()
+		if (
+			self.config.max_memory_mb > 0
+			and not pooled.retiring
+			and now - pooled.memory_checked_at >= self.config.memory_check_interval
+		):
+			pooled.memory_checked_at = now
+			memory_mb = await self._memory_mb(pooled)
+
+		should_close = False
+		async with self._condition:
+			pooled.active -= 1
+
+			if not pooled.retiring:
+				if pooled.uses >= self.config.max_uses > 0:
+					print(f'[BROWSER] Recycling Chromium after {pooled.uses} uses')
+					pooled.retiring = True
+				elif memory_mb > self.config.max_memory_mb > 0:
+					print(f'[BROWSER] Recycling Chromium using {memory_mb:.0f} MB memory')
+					pooled.retiring = True
+
+			if (pooled.retiring or not pooled.browser.is_connected()) and pooled.active == 0:
+				if pooled in self._browsers:
+					self._browsers.remove(pooled)
+				should_close = True
+
+			self._condition.notify_all()
+
+		if should_close:
+			try:
+				await pooled.browser.close()
+			except Exception as e:
+				print(f'[WARNING] Failed to close browser: {e}')
+
+	@asynccontextmanager
+	async def new_context(self, **context_options):
+		"""获取一个隔离的无痕浏览器上下文，退出时自动关闭"""
+		self._bind_loop()
+		options = {'user_agent': USER_AGENT, 'viewport': {'width': 1920, 'height': 1080}, **context_options}
+
+		pooled = await self._acquire()
+		context: BrowserContext | None = None
+		try:
+			context = await pooled.browser.new_context(**options)
+			yield context
+		finally:
+			if context is not None:
+				try:
+					await context.close()
+				except Exception:
+					pass
+			await self._release(pooled)
+
+	async def close(self):
+		"""关闭所有浏览器和 Playwright"""
+		if self._loop is not None and self._loop is not asyncio.get_running_loop():
+			self._bind_loop()
+			return
+
+		browsers = self._browsers
+		playwright = self._playwright
+		self._browsers = []
+		self._playwright = None
+		await self._shutdown(browsers, playwright)
+
+	@staticmethod
+	async def _shutdown(browsers: list[_PooledBrowser], playwright: Playwright | None):
+		"""关闭浏览器和 Playwright（需要在它们所属的事件循环中调用）"""
+		for pooled in browsers:
+			try:
+				await pooled.browser.close()
+			except Exception as e:
+				print(f'[WARNING] Failed to close browser: {e}')
+
+		if playwright is not None:
+			try:
+				await playwright.stop()
+			except Exception as e:
+				print(f'[WARNING] Failed to stop Playwright: {e}')
+
+
+browser_pool = BrowserPool()
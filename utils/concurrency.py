@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+并发执行工具 - 有界并发地处理多个账号
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Hashable, Iterable, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+async def run_bounded(
+	items: Iterable[T],
+	worker: Callable[[T, int], Awaitable[R]],
+	max_concurrency: int = 1,
+	per_key_limit: int = 0,
+	key: Callable[[T], Hashable] | None = None,
+	wait: Callable[[T, int], Awaitable] | None = None,
+) -> list[R]:
+	"""以有界并发执行 worker(item, index)，结果按输入顺序返回
+
+	- max_concurrency: 同时执行的最大任务数（<= 1 时退化为顺序执行）
+	- per_key_limit: 同一个 key（例如 provider）下同时执行的最大任务数，0 表示不限制
+	- key: 从 item 中提取分组 key 的函数，仅在 per_key_limit > 0 时使用
+	- wait: 占用并发名额之前先等待 wait(item, index)（例如按偏移延后执行），等待期间不占用名额
+
+	worker 需要自行处理异常，这里不会吞掉异常。
+	"""
+	items = list(items)
+
+	if max_concurrency <= 1:
+		results = []
+		for i, item in enumerate(items):
+			if wait is not None:
+				await wait(item, i)
+			results.append(await worker(item, i))
+		return results
+
+	global_semaphore = asyncio.Semaphore(max_concurrency)
+	key_semaphores: dict[Hashable, asyncio.Semaphore] = {}
+
+	async def run(item: T, index: int) -> R:
+		if wait is not None:
+			await wait(item, index)
+		if per_key_limit > 0 and key is not None:
+			group = key(item)
+			if group not in key_semaphores:
+				key_semaphores[group] = asyncio.Semaphore(per_key_limit)
+			# 先占用分组名额再占用全局名额，避免等待分组时白白占着全局并发
+			async with key_semaphores[group]:
+				async with global_semaphore:
+					return await worker(item, index)
+
+		async with global_semaphore:
+			return await worker(item, index)
+
+	return list(await asyncio.gather(*(run(item, i) for i, item in enumerate(items))))
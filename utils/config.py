@@ -9,6 +9,18 @@ from dataclasses import dataclass
 from typing import Dict, Literal
 
 
+def get_int_env(name: str, default: int) -> int:
+	"""读取整数类型的环境变量，格式错误时使用默认值"""
+	value = os.getenv(name)
+	if value is None or value.strip() == '':
+		return default
+	try:
+		return int(value)
+	except ValueError:
+		print(f'[WARNING] {name} must be an integer, using default value {default}')
+		return default
+
+
 @dataclass
 class ProviderConfig:
 	"""Provider 配置"""
@@ -53,10 +65,15 @@ class AppConfig:
 	"""应用配置"""
 
 	providers: Dict[str, ProviderConfig]
+	max_concurrency: int = 1  # 同时签到的最大账号数，1 表示顺序执行
+	provider_concurrency: int = 0  # 同一 provider 同时签到的最大账号数，0 表示不限制
 
 	@classmethod
 	def load_from_env(cls) -> 'AppConfig':
 		"""从环境变量加载配置"""
+		max_concurrency = max(1, get_int_env('CHECKIN_CONCURRENCY', 1))
+		provider_concurrency = max(0, get_int_env('CHECKIN_PROVIDER_CONCURRENCY', 0))
+
 		providers = {
 			'anyrouter': ProviderConfig(
 				name='anyrouter',
@@ -86,7 +103,11 @@ class AppConfig:
 
 				if not isinstance(providers_data, dict):
 					print('[WARNING] PROVIDERS must be a JSON object, ignoring custom providers')
-					return cls(providers=providers)
+					return cls(
+						providers=providers,
+						max_concurrency=max_concurrency,
+						provider_concurrency=provider_concurrency,
+					)
 
 				# 解析自定义 providers,会覆盖默认配置
 				for name, provider_data in providers_data.items():
@@ -104,13 +125,149 @@ class AppConfig:
 			except Exception as e:
 				print(f'[WARNING] Error loading PROVIDERS: {e}, using default configuration only')
 
-		return cls(providers=providers)
+		return cls(providers=providers, max_concurrency=max_concurrency, provider_concurrency=provider_concurrency)
 
 	def get_provider(self, name: str) -> ProviderConfig | None:
 		"""获取指定 provider 配置"""
 		return self.providers.get(name)
 
 
+@dataclass
+class HttpPoolConfig:
+	"""HTTP 连接池配置"""
+
+	max_connections: int = 20  # 每个 provider 的最大连接数
+	max_keepalive_connections: int = 5  # 每个 provider 保持的空闲连接数
+	keepalive_expiry: float = 60.0  # 空闲连接保持时间（秒）
+	timeout: float = 30.0  # 请求超时时间（秒）
+	http2: bool = True
+
+	@classmethod
+	def load_from_env(cls) -> 'HttpPoolConfig':
+		"""从环境变量加载配置"""
+		return cls(
+			max_connections=max(1, get_int_env('HTTP_POOL_MAX_CONNECTIONS', 20)),
+			max_keepalive_connections=max(0, get_int_env('HTTP_POOL_MAX_KEEPALIVE', 5)),
+			keepalive_expiry=float(max(0, get_int_env('HTTP_POOL_KEEPALIVE_EXPIRY', 60))),
+			timeout=float(max(1, get_int_env('HTTP_TIMEOUT', 30))),
+			http2=os.getenv('HTTP_POOL_HTTP2', 'true').lower() != 'false',
+		)
+
+
+@dataclass
+class BrowserPoolConfig:
+	"""浏览器池配置"""
+
+	size: int = 1  # 常驻的 Chromium 进程数
+	max_contexts_per_browser: int = 4  # 每个浏览器同时打开的上下文数
+	max_uses: int = 50  # 浏览器分配多少次上下文后回收重启，0 表示不限制
+	max_memory_mb: int = 1024  # 浏览器内存超过该值后回收重启（仅 Linux），0 表示不限制
+	memory_check_interval: int = 60  # 每个浏览器最多每隔多少秒检查一次内存
+	headless: bool = False  # WAF 验证在无头模式下容易失败，默认使用有头模式
+
+	@classmethod
+	def load_from_env(cls) -> 'BrowserPoolConfig':
+		"""从环境变量加载配置"""
+		return cls(
+			size=max(1, get_int_env('BROWSER_POOL_SIZE', 1)),
+			max_contexts_per_browser=max(1, get_int_env('BROWSER_MAX_CONTEXTS', 4)),
+			max_uses=max(0, get_int_env('BROWSER_MAX_USES', 50)),
+			max_memory_mb=max(0, get_int_env('BROWSER_MAX_MEMORY_MB', 1024)),
+			memory_check_interval=max(0, get_int_env('BROWSER_MEMORY_CHECK_INTERVAL', 60)),
+			headless=os.getenv('BROWSER_HEADLESS', 'false').lower() == 'true',
+		)
+
+
+@dataclass
+class SchedulerConfig:
+	"""定时签到调度器配置"""
+
+	concurrency: int = 1  # 同时签到的最大账号数，1 表示顺序执行
+	shard_index: int = 0  # 当前调度器实例负责的分片编号（从 0 开始）
+	shard_count: int = 1  # 分片总数，多个调度器实例按账号 ID 取模分摊账号
+	misfire_grace_time: int = 3600  # 错过触发时间后仍允许补跑的秒数
+	spread_window: int = 0  # 每个账号在触发后的该时间窗口内按固定偏移签到（秒），0（默认）表示触发时全部立即签到
+	provider_rate_per_minute: int = 30  # 每个 provider 每分钟最多开始签到的账号数，0 表示不限制
+	provider_rate_burst: int = 5  # 每个 provider 允许的突发签到数
+
+	@classmethod
+	def load_from_env(cls) -> 'SchedulerConfig':
+		"""从环境变量加载配置"""
+		shard_count = max(1, get_int_env('SHARD_COUNT', 1))
+		shard_index = get_int_env('SHARD_INDEX', 0)
+		if not 0 <= shard_index < shard_count:
+			print(f'[WARNING] SHARD_INDEX must be between 0 and {shard_count - 1}, using {shard_index % shard_count}')
+			shard_index %= shard_count
+
+		return cls(
+			concurrency=max(1, get_int_env('SCHEDULER_CONCURRENCY', 1)),
+			shard_index=shard_index,
+			shard_count=shard_count,
+			misfire_grace_time=max(1, get_int_env('SCHEDULER_MISFIRE_GRACE_TIME', 3600)),
+			spread_window=max(0, get_int_env('SCHEDULER_SPREAD_WINDOW', 0)),
+			provider_rate_per_minute=max(0, get_int_env('SCHEDULER_PROVIDER_RATE', 30)),
+			provider_rate_burst=max(1, get_int_env('SCHEDULER_PROVIDER_BURST', 5)),
+		)
+
+
+@dataclass
+class SmtpPoolConfig:
+	"""SMTP 连接池配置"""
+
+	size: int = 2  # 每个 SMTP 服务器和账号最多保持的连接数
+	idle_timeout: float = 60.0  # 连接空闲超过该时间（秒）后不再复用
+	timeout: float = 10.0  # 连接和发送的超时时间（秒）
+
+	@classmethod
+	def load_from_env(cls) -> 'SmtpPoolConfig':
+		"""从环境变量加载配置"""
+		return cls(
+			size=max(1, get_int_env('SMTP_POOL_SIZE', 2)),
+			idle_timeout=float(max(0, get_int_env('SMTP_POOL_IDLE_TIMEOUT', 60))),
+			timeout=float(max(1, get_int_env('SMTP_TIMEOUT', 10))),
+		)
+
+
+@dataclass
+class NotifyConfig:
+	"""消息推送配置"""
+
+	timeout: float = 10.0  # 每个渠道单次发送的超时时间（秒）
+	retries: int = 2  # 发送失败后的重试次数
+	retry_backoff: float = 1.0  # 第一次重试前的等待时间（秒），之后每次翻倍
+
+	@classmethod
+	def load_from_env(cls) -> 'NotifyConfig':
+		"""从环境变量加载配置"""
+		return cls(
+			timeout=float(max(1, get_int_env('NOTIFY_TIMEOUT', 10))),
+			retries=max(0, get_int_env('NOTIFY_RETRIES', 2)),
+			retry_backoff=max(0, get_int_env('NOTIFY_RETRY_BACKOFF_MS', 1000)) / 1000,
+		)
+
+
+@dataclass
+class OutboxConfig:
+	"""通知发件箱配置"""
+
+	concurrency: int = 4  # 同时发送的通知数
+	max_attempts: int = 8  # 最多发送次数，超过后标记为死信
+	backoff: float = 30.0  # 第一次重新发送前的等待时间（秒），之后每次翻倍
+	max_backoff: float = 3600.0  # 重新发送的最长等待时间（秒）
+	poll_interval: float = 10.0  # 没有新通知入队时检查到期重试的间隔（秒）
+
+	@classmethod
+	def load_from_env(cls) -> 'OutboxConfig':
+		"""从环境变量加载配置"""
+		return cls(
+			concurrency=max(1, get_int_env('NOTIFY_OUTBOX_CONCURRENCY', 4)),
+			max_attempts=max(1, get_int_env('NOTIFY_OUTBOX_MAX_ATTEMPTS', 8)),
+			backoff=float(max(0, get_int_env('NOTIFY_OUTBOX_BACKOFF', 30))),
+			max_backoff=float(max(0, get_int_env('NOTIFY_OUTBOX_MAX_BACKOFF', 3600))),
+			poll_interval=float(max(1, get_int_env('NOTIFY_OUTBOX_POLL_INTERVAL', 10))),
+		)
+
+
 @dataclass
 class AccountConfig:
 	"""账号配置"""
@@ -143,11 +300,11 @@ class AccountConfig:
 
 def load_accounts_config() -> list[AccountConfig] | None:
 	"""加载账号配置（优先从数据库加载，fallback 到环境变量）"""
-	# 尝试从数据库加载
+	# 尝试从数据库加载（数据库不存在时不创建，比如在 GitHub Actions 环境）
 	try:
-		from web.database import db
+		from web.database import database_exists, db
 
-		db_accounts = db.get_all_accounts()
+		db_accounts = db.get_all_accounts() if database_exists() else None
 		if db_accounts:
 			print(f'[INFO] Loading {len(db_accounts)} account(s) from database')
 			accounts = []
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+签到邮件汇总 - 按收件人汇总一次签到运行中各账号的结果，每个收件人只发一封邮件
+
+邮件发送方式（EMAIL_NOTIFY_MODE 为默认值，Web 版可以在数据库中为每个收件人单独设置）：
+- immediate（默认）：每个账号签到结束后立即单独发送一封邮件
+- digest：签到运行结束后，把同一收件人的所有账号合并为一封邮件
+- failures_only：同 digest，但只包含签到失败的账号，全部成功时不发送
+"""
+
+import html
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Literal
+
+EMAIL_NOTIFY_MODES = ('immediate', 'digest', 'failures_only')
+
+_LABELS = {
+	'en': {
+		'title': 'AnyRouter Check-in Digest - {success}/{total} succeeded',
+		'account': 'Account',
+		'provider': 'Provider',
+		'status': 'Status',
+		'success': '[OK] Success',
+		'failed': '[FAIL] Failed',
+		'balance': 'Balance',
+		'used': 'Used',
+		'error': 'Error',
+		'time': 'Time',
+	},
+	'zh': {
+		'title': 'AnyRouter 签到汇总 - {success}/{total} 成功',
+		'account': '账号',
+		'provider': '平台',
+		'status': '状态',
+		'success': '✅ 成功',
+		'failed': '❌ 失败',
+		'balance': '余额',
+		'used': '已用',
+		'error': '错误',
+		'time': '时间',
+	},
+}
+
+
+def get_email_notify_mode() -> str:
+	"""读取默认的邮件发送方式（EMAIL_NOTIFY_MODE），无效值时使用 immediate"""
+	mode = os.getenv('EMAIL_NOTIFY_MODE', 'immediate').strip().lower() or 'immediate'
+	if mode not in EMAIL_NOTIFY_MODES:
+		print(f'[WARNING] EMAIL_NOTIFY_MODE must be one of {", ".join(EMAIL_NOTIFY_MODES)}, using immediate')
+		return 'immediate'
+	return mode
+
+
+def normalize_email(email: str) -> str:
+	"""统一收件人地址的格式，同一邮箱的多个账号合并到一封邮件"""
+	return email.strip().lower()
+
+
+@dataclass
+class DigestEntry:
+	"""单个账号的签到结果"""
+
+	account_name: str
+	provider: str
+	success: bool
+	quota: float | None = None
+	used_quota: float | None = None
+	error: str | None = None
+	time: str = field(default_factory=lambda: datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+
+class EmailDigest:
+	"""按收件人收集一次签到运行的结果，运行结束后每个收件人渲染一封邮件"""
+
+	def __init__(
+		self, lang: Literal['en', 'zh'] = 'en', mode: str | None = None, preferences: dict[str, str] | None = None
+	):
+		self.labels = _LABELS[lang]
+		self.mode = mode or get_email_notify_mode()  # 没有单独设置的收件人使用的发送方式
+		self.preferences = preferences or {}  # {收件人: 发送方式}，收件人为 normalize_email 的结果
+		self._entries: dict[str, list[DigestEntry]] = {}
+
+	def mode_for(self, email: str) -> str:
+		"""收件人的邮件发送方式"""
+		return self.preferences.get(normalize_email(email), self.mode)
+
+	def add(self, email: str, entry: DigestEntry) -> bool:
+		"""记录一个账号的结果，failures_only 的收件人忽略成功的账号；返回是否加入了汇总邮件"""
+		if self.mode_for(email) == 'failures_only' and entry.success:
+			return False
+		self._entries.setdefault(normalize_email(email), []).append(entry)
+		return True
+
+	@property
+	def recipients(self) -> list[str]:
+		return list(self._entries)
+
+	def render(self, email: str, msg_type: Literal['text', 'html'] = 'text') -> tuple[str, str]:
+		"""渲染指定收件人的汇总邮件（标题，正文）"""
+		entries = self._entries[email]
+		labels = self.labels
+		success_count = sum(1 for entry in entries if entry.success)
+		title = labels['title'].format(success=success_count, total=len(entries))
+
+		rows = []
+		for entry in entries:
+			row = {
+				labels['account']: entry.account_name,
+				labels['provider']: entry.provider,
+				labels['status']: labels['success'] if entry.success else labels['failed'],
+				labels['time']: entry.time,
+			}
+			if entry.quota is not None:
+				row[labels['balance']] = f'${entry.quota}'
+				row[labels['used']] = f'${entry.used_quota}'
+			if entry.error:
+				row[labels['error']] = entry.error
+			rows.append(row)
+
+		if msg_type == 'html':
+			blocks = []
+			for row in rows:
+				cells = ''.join(
+					f'<tr><th align="left">{html.escape(key)}</th><td>{html.escape(str(value))}</td></tr>'
+					for key, value in row.items()
+				)
+				blocks.append(f'<table>{cells}</table>')
+			return title, f'<h3>{html.escape(title)}</h3>' + '<hr>'.join(blocks)
+
+		blocks = ['\n'.join(f'{key}: {value}' for key, value in row.items()) for row in rows]
+		return title, f'{title}\n\n' + '\n\n'.join(blocks)
+
+	def messages(self, msg_type: Literal['text', 'html'] = 'text') -> list[tuple[str, str, str]]:
+		"""所有收件人的汇总邮件 [(收件人, 标题, 正文)]"""
+		return [(email, *self.render(email, msg_type)) for email in self._entries]
+
+	async def asend(self, notify, msg_type: Literal['text', 'html'] = 'text') -> dict[str, bool]:
+		"""通过同一个 SMTP 连接发送所有汇总邮件，返回每个收件人是否发送成功"""
+		messages = self.messages(msg_type)
+		if not messages:
+			return {}
+		try:
+			errors = await notify.asend_emails_to(messages, msg_type=msg_type)
+		except Exception as e:
+			errors = [e] * len(messages)
+
+		results = {}
+		for (email, _, _), error in zip(messages, errors):
+			results[email] = error is None
+			if error is None:
+				print(f'[EMAIL] Digest sent to {email}')
+			else:
+				print(f'[EMAIL] Failed to send digest to {email}: {error}')
+		return results
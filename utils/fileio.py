@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+文件读写工具 - 原子写入与跨进程文件锁
+"""
+
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+try:
+	import fcntl
+except ImportError:  # Windows（GitHub Actions）上没有 fcntl，只依赖原子重命名
+	fcntl = None
+
+
+def write_json_atomic(path: str, data) -> None:
+	"""先写入同目录下的临时文件再重命名，读者永远不会看到写了一半的文件"""
+	directory = os.path.dirname(os.path.abspath(path))
+	os.makedirs(directory, exist_ok=True)
+	fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+	try:
+		with os.fdopen(fd, 'w', encoding='utf-8') as f:
+			json.dump(data, f, ensure_ascii=False, indent=2)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(temp_path, path)
+	except Exception:
+		try:
+			os.unlink(temp_path)
+		except OSError:
+			pass
+		raise
+
+
+@contextmanager
+def file_lock(path: str):
+	"""基于 <path>.lock 的跨进程互斥锁（仅 POSIX，其他平台为空操作）"""
+	if fcntl is None:
+		yield
+		return
+
+	lock_path = f'{path}.lock'
+	os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+	with open(lock_path, 'a') as lock_file:
+		fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+		try:
+			yield
+		finally:
+			fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
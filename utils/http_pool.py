@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+HTTP 连接池 - 每个 provider 共享一个长连接的 httpx.AsyncClient
+"""
+
+import asyncio
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+
+import httpx
+
+from utils.config import HttpPoolConfig
+from utils.metrics import HTTPX_EVENT_HOOKS
+
+
+def build_cookie_header(cookies: dict) -> str:
+	"""将账号自己的 cookies 序列化为 Cookie 请求头"""
+	return '; '.join(f'{name}={value}' for name, value in cookies.items() if value is not None)
+
+
+class HttpClientPool:
+	"""按 provider 域名复用 httpx.AsyncClient
+
+	同一个 provider 的所有账号共享少量 HTTP/2 连接，cookies 不存放在共享客户端上：
+	客户端的 cookie jar 拒绝保存任何 cookie，每个请求通过 Cookie 请求头携带账号自己的 cookies，
+	避免不同账号之间串 cookie。
+	"""
+
+	def __init__(self, config: HttpPoolConfig | None = None, event_hooks: dict | None = None):
+		self._config = config
+		# 默认记录 provider 请求延迟指标
+		self._event_hooks = HTTPX_EVENT_HOOKS if event_hooks is None else event_hooks
+		self._clients: dict[str, httpx.AsyncClient] = {}
+		self._loop: asyncio.AbstractEventLoop | None = None
+
+	@property
+	def config(self) -> HttpPoolConfig:
+		"""配置在首次使用时才从环境变量读取，保证 load_dotenv() 已经执行"""
+		if self._config is None:
+			self._config = HttpPoolConfig.load_from_env()
+		return self._config
+
+	def _create_client(self) -> httpx.AsyncClient:
+		limits = httpx.Limits(
+			max_connections=self.config.max_connections,
+			max_keepalive_connections=self.config.max_keepalive_connections,
+			keepalive_expiry=self.config.keepalive_expiry,
+		)
+		return httpx.AsyncClient(
+			http2=self.config.http2,
+			limits=limits,
+			timeout=self.config.timeout,
+			cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+			event_hooks={name: list(hooks) for name, hooks in self._event_hooks.items()},
+		)
+
+	def get_client(self, domain: str) -> httpx.AsyncClient:
+		"""获取指定 provider 域名的共享客户端"""
+		loop = asyncio.get_running_loop()
+		if self._loop is not loop:
+			# 客户端的连接绑定在创建时的事件循环上，换了事件循环（例如多次 asyncio.run）就重新创建
+			self._clients = {}
+			self._loop = loop
+
+		client = self._clients.get(domain)
+		if client is None or client.is_closed:
+			client = self._create_client()
+			self._clients[domain] = client
+		return client
+
+	async def aclose(self):
+		"""关闭所有共享客户端"""
+		clients = list(self._clients.values())
+		self._clients = {}
+		self._loop = None
+		for client in clients:
+			try:
+				await client.aclose()
+			except Exception as e:
+				print(f'[WARNING] Failed to close HTTP client: {e}')
+
+
+http_pool = HttpClientPool()
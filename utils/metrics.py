@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Prometheus 指标 - 签到结果、WAF、浏览器、provider 请求延迟、数据库方法延迟、通知发送和定时任务耗时
+
+Web 服务和定时任务调度器是两个进程（见 docker-entrypoint.sh），设置 PROMETHEUS_MULTIPROC_DIR 后
+两个进程都把指标写入该目录，Web 服务的 /metrics 汇总所有进程的指标；未设置时只输出当前进程的指标。
+PROMETHEUS_MULTIPROC_DIR 必须在进程启动前设置，并且每次启动前清空该目录。
+"""
+
+import os
+import time
+
+import httpx
+from prometheus_client import (
+	CONTENT_TYPE_LATEST,
+	REGISTRY,
+	CollectorRegistry,
+	Counter,
+	Histogram,
+	generate_latest,
+	multiprocess,
+)
+
+CHECKINS = Counter('anyrouter_checkins_total', 'Check-in attempts by provider and result', ['provider', 'result'])
+WAF_BLOCKS = Counter('anyrouter_waf_blocks_total', 'Requests blocked by the provider WAF', ['provider'])
+WAF_CACHE_LOOKUPS = Counter('anyrouter_waf_cache_lookups_total', 'WAF cookie cache lookups by result', ['result'])
+BROWSER_LAUNCHES = Counter('anyrouter_browser_launches_total', 'Chromium instances launched by the browser pool')
+BROWSER_LAUNCH_SECONDS = Histogram(
+	'anyrouter_browser_launch_seconds',
+	'Time to launch a pooled Chromium instance',
+	buckets=(0.25, 0.5, 1, 2, 3, 5, 10, 20, 30),
+)
+PROVIDER_REQUEST_SECONDS = Histogram(
+	'anyrouter_provider_request_seconds',
+	'Latency of HTTP requests to providers by host and path',
+	['provider', 'endpoint', 'status'],
+)
+DB_QUERY_SECONDS = Histogram(
+	'anyrouter_db_query_seconds',
+	'Latency of Database methods',
+	['method'],
+	buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+NOTIFICATION_DELIVERIES = Counter(
+	'anyrouter_notification_deliveries_total',
+	'Notification outbox delivery attempts by kind and result (sent, retry, dead)',
+	['kind', 'result'],
+)
+SCHEDULER_RUN_SECONDS = Histogram(
+	'anyrouter_scheduler_run_seconds',
+	'Duration of a scheduled check-in run',
+	buckets=(1, 10, 30, 60, 300, 600, 1800, 3600, 7200, 14400, 21600),
+)
+
+
+def record_checkin(provider: str, success: bool):
+	"""记录一次签到结果"""
+	CHECKINS.labels(provider=provider, result='success' if success else 'failure').inc()
+
+
+async def _start_request_timer(request: httpx.Request):
+	request.extensions['metrics_start'] = time.perf_counter()
+
+
+async def _observe_response(response: httpx.Response):
+	start = response.request.extensions.get('metrics_start')
+	if start is not None:
+		PROVIDER_REQUEST_SECONDS.labels(
+			provider=response.request.url.host, endpoint=response.request.url.path, status=str(response.status_code)
+		).observe(time.perf_counter() - start)
+
+
+# 传给 httpx.AsyncClient(event_hooks=...)，统计每个请求的延迟
+HTTPX_EVENT_HOOKS = {'request': [_start_request_timer], 'response': [_observe_response]}
+
+
+def render_metrics() -> tuple[bytes, str]:
+	"""生成 Prometheus 文本格式的指标，返回 (内容, Content-Type)"""
+	if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+		registry = CollectorRegistry()
+		multiprocess.MultiProcessCollector(registry)
+	else:
+		registry = REGISTRY
+	return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,73 +1,128 @@
+import asyncio
+import functools
 import os
-import smtplib
+import threading
 from email.mime.text import MIMEText
-from typing import Literal
+from typing import Awaitable, Callable, Collection, Literal
 
 import httpx
 
+from utils.config import NotifyConfig
+from utils.http_pool import HttpClientPool
+from utils.smtp_pool import smtp_pool
+from utils.timing import timed
+
+# 推送渠道共用的长连接客户端；webhook 地址中带有 token，不记录 provider 请求指标
+push_http_pool = HttpClientPool(event_hooks={})
+
+
+def _setting(name: str) -> property:
+	"""NotificationKit 的配置项，首次访问时读取全部配置"""
+
+	def get(self: 'NotificationKit'):
+		return self._get_settings()[name]
+
+	def set(self: 'NotificationKit', value):
+		self._get_settings()[name] = value
+
+	return property(get, set)
+
 
 class NotificationKit:
+	"""消息推送
+
+	配置在首次使用时读取并缓存：邮件配置优先从数据库读取（Web 版的系统设置），fallback 到环境变量，
+	其余渠道从环境变量读取。系统设置修改后调用 invalidate()，下次使用时重新读取。
+	"""
+
+	email_user = _setting('email_user')
+	email_pass = _setting('email_pass')
+	email_to = _setting('email_to')
+	smtp_server = _setting('smtp_server')
+	pushplus_token = _setting('pushplus_token')
+	server_push_key = _setting('server_push_key')
+	dingding_webhook = _setting('dingding_webhook')
+	feishu_webhook = _setting('feishu_webhook')
+	weixin_webhook = _setting('weixin_webhook')
+	telegram_bot_token = _setting('telegram_bot_token')
+	telegram_chat_id = _setting('telegram_chat_id')
+
 	def __init__(self):
-		# 优先从数据库读取配置，fallback 到环境变量
-		self.email_user: str = self._get_config('email_user') or os.getenv('EMAIL_USER', '')
-		self.email_pass: str = self._get_config('email_pass') or os.getenv('EMAIL_PASS', '')
-		self.email_to: str = os.getenv('EMAIL_TO', '')
-		self.smtp_server: str = self._get_config('custom_smtp_server') or os.getenv('CUSTOM_SMTP_SERVER', '')
-		self.pushplus_token = os.getenv('PUSHPLUS_TOKEN')
-		self.server_push_key = os.getenv('SERVERPUSHKEY')
-		self.dingding_webhook = os.getenv('DINGDING_WEBHOOK')
-		self.feishu_webhook = os.getenv('FEISHU_WEBHOOK')
-		self.weixin_webhook = os.getenv('WEIXIN_WEBHOOK')
-		self.telegram_bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
-		self.telegram_chat_id = os.getenv('TELEGRAM_CHAT_ID')
-
-	def _get_config(self, key: str) -> str | None:
-		"""从数据库获取配置（如果可用）"""
+		self._settings: dict | None = None
+		self._settings_lock = threading.Lock()
+
+	@classmethod
+	async def acreate(cls) -> 'NotificationKit':
+		"""创建实例并在线程中读取配置（会查询数据库）"""
+		kit = cls()
+		await asyncio.to_thread(kit._get_settings)
+		return kit
+
+	def _get_settings(self) -> dict:
+		if self._settings is None:
+			with self._settings_lock:
+				if self._settings is None:
+					self._settings = self._load_settings()
+		return self._settings
+
+	def _load_settings(self) -> dict:
+		configs = self._get_db_configs()
+		return {
+			'email_user': configs.get('email_user') or os.getenv('EMAIL_USER', ''),
+			'email_pass': configs.get('email_pass') or os.getenv('EMAIL_PASS', ''),
+			'email_to': os.getenv('EMAIL_TO', ''),
+			'smtp_server': configs.get('custom_smtp_server') or os.getenv('CUSTOM_SMTP_SERVER', ''),
+			'pushplus_token': os.getenv('PUSHPLUS_TOKEN'),
+			'server_push_key': os.getenv('SERVERPUSHKEY'),
+			'dingding_webhook': os.getenv('DINGDING_WEBHOOK'),
+			'feishu_webhook': os.getenv('FEISHU_WEBHOOK'),
+			'weixin_webhook': os.getenv('WEIXIN_WEBHOOK'),
+			'telegram_bot_token': os.getenv('TELEGRAM_BOT_TOKEN'),
+			'telegram_chat_id': os.getenv('TELEGRAM_CHAT_ID'),
+		}
+
+	def invalidate(self):
+		"""丢弃缓存的配置（包括直接赋值的配置），下次使用时重新读取"""
+		with self._settings_lock:
+			self._settings = None
+
+	@staticmethod
+	def _get_db_configs() -> dict:
+		"""从数据库获取系统配置（数据库不存在时不创建，比如在 GitHub Actions 环境）"""
 		try:
 			# 动态导入避免循环依赖
-			from web.database import db
-			value = db.get_config(key)
-			return value
+			from web.database import database_exists, db
+
+			if not database_exists():
+				return {}
+			return db.get_all_configs()
 		except Exception as e:
-			# 如果数据库不可用（比如在 GitHub Actions 环境），返回 None
-			print(f'[WARN] Failed to get config "{key}" from database: {e}')
-			return None
+			print(f'[WARN] Failed to get config from database: {e}')
+			return {}
 
-	def send_email(self, title: str, content: str, msg_type: Literal['text', 'html'] = 'text'):
-		if not self.email_user or not self.email_pass or not self.email_to:
-			raise ValueError('Email configuration not set')
+	def _smtp_server(self) -> str:
+		return self.smtp_server if self.smtp_server else f'smtp.{self.email_user.split("@")[1]}'
 
+	def _build_email(self, to_email: str, title: str, content: str, msg_type: Literal['text', 'html']) -> MIMEText:
 		# MIMEText 需要 'plain' 或 'html'，而不是 'text'
 		mime_subtype = 'plain' if msg_type == 'text' else 'html'
 		msg = MIMEText(content, mime_subtype, 'utf-8')
 		msg['From'] = f'AnyRouter Assistant <{self.email_user}>'
-		msg['To'] = self.email_to
+		msg['To'] = to_email
 		msg['Subject'] = title
+		return msg
 
-		smtp_server = self.smtp_server if self.smtp_server else f'smtp.{self.email_user.split("@")[1]}'
+	def _smtp_sender(self):
+		"""当前发件账号的 SMTP 连接池（复用已登录的连接，记住 465 SSL / 587 STARTTLS 中可用的方式）"""
+		return smtp_pool.get_sender(self._smtp_server(), self.email_user, self.email_pass)
 
-		# 尝试 SSL 连接，失败则尝试 STARTTLS
-		import ssl
-		server = None
-		try:
-			context = ssl.create_default_context()
-			server = smtplib.SMTP_SSL(smtp_server, 465, timeout=10, context=context)
-			server.login(self.email_user, self.email_pass)
-			server.send_message(msg)
-			server.quit()
-		except Exception:
-			# 如果 SSL 失败，尝试 STARTTLS (587端口)
-			if server:
-				try:
-					server.quit()
-				except Exception:
-					pass
-			server = smtplib.SMTP(smtp_server, 587, timeout=10)
-			server.starttls()
-			server.login(self.email_user, self.email_pass)
-			server.send_message(msg)
-			server.quit()
+	def send_email(self, title: str, content: str, msg_type: Literal['text', 'html'] = 'text'):
+		if not self.email_user or not self.email_pass or not self.email_to:
+			raise ValueError('Email configuration not set')
+
+		self._smtp_sender().send(self._build_email(self.email_to, title, content, msg_type))
 
+	@timed('send_email')
 	def send_email_to(
 		self, to_email: str, title: str, content: str, msg_type: Literal['text', 'html'] = 'text'
 	):
@@ -78,110 +133,185 @@ class NotificationKit:
 		if not to_email:
 			raise ValueError('Recipient email address not provided')
 
-		# MIMEText 需要 'plain' 或 'html'，而不是 'text'
-		mime_subtype = 'plain' if msg_type == 'text' else 'html'
-		msg = MIMEText(content, mime_subtype, 'utf-8')
-		msg['From'] = f'AnyRouter Assistant <{self.email_user}>'
-		msg['To'] = to_email
-		msg['Subject'] = title
+		self._smtp_sender().send(self._build_email(to_email, title, content, msg_type))
+
+	async def asend_email_to(
+		self, to_email: str, title: str, content: str, msg_type: Literal['text', 'html'] = 'text'
+	):
+		"""异步发送邮件到指定邮箱 - SMTP 在线程中执行，不阻塞事件循环"""
+		await asyncio.to_thread(self.send_email_to, to_email, title, content, msg_type)
 
-		smtp_server = self.smtp_server if self.smtp_server else f'smtp.{self.email_user.split("@")[1]}'
+	@timed('send_email')
+	def send_emails_to(
+		self, emails: list[tuple[str, str, str]], msg_type: Literal['text', 'html'] = 'text'
+	) -> list[Exception | None]:
+		"""通过同一个 SMTP 连接批量发送邮件，emails 为 [(收件人, 标题, 正文)]，返回每封邮件的错误（成功为 None）"""
+		if not self.email_user or not self.email_pass:
+			raise ValueError('Email configuration (EMAIL_USER and EMAIL_PASS) not set')
 
-		# 尝试 SSL 连接，失败则尝试 STARTTLS
-		import ssl
-		server = None
-		try:
-			context = ssl.create_default_context()
-			server = smtplib.SMTP_SSL(smtp_server, 465, timeout=10, context=context)
-			server.login(self.email_user, self.email_pass)
-			server.send_message(msg)
-			server.quit()
-		except Exception:
-			# 如果 SSL 失败，尝试 STARTTLS (587端口)
-			if server:
-				try:
-					server.quit()
-				except Exception:
-					pass
-			server = smtplib.SMTP(smtp_server, 587, timeout=10)
-			server.starttls()
-			server.login(self.email_user, self.email_pass)
-			server.send_message(msg)
-			server.quit()
+		messages = [self._build_email(to_email, title, content, msg_type) for to_email, title, content in emails]
+		return self._smtp_sender().send_many(messages)
 
-	def send_pushplus(self, title: str, content: str):
-		if not self.pushplus_token:
-			raise ValueError('PushPlus Token not configured')
+	async def asend_emails_to(
+		self, emails: list[tuple[str, str, str]], msg_type: Literal['text', 'html'] = 'text'
+	) -> list[Exception | None]:
+		"""异步批量发送邮件 - SMTP 在线程中执行，不阻塞事件循环"""
+		return await asyncio.to_thread(self.send_emails_to, emails, msg_type)
 
+	def _pushplus_request(self, title: str, content: str) -> tuple[str, dict]:
 		data = {'token': self.pushplus_token, 'title': title, 'content': content, 'template': 'html'}
+		return 'http://www.pushplus.plus/send', data
+
+	def _server_push_request(self, title: str, content: str) -> tuple[str, dict]:
+		return f'https://sctapi.ftqq.com/{self.server_push_key}.send', {'title': title, 'desp': content}
+
+	def _dingtalk_request(self, title: str, content: str) -> tuple[str, dict]:
+		return self.dingding_webhook, {'msgtype': 'text', 'text': {'content': f'{title}\n{content}'}}
+
+	def _feishu_request(self, title: str, content: str) -> tuple[str, dict]:
+		data = {
+			'msg_type': 'interactive',
+			'card': {
+				'elements': [{'tag': 'markdown', 'content': content, 'text_align': 'left'}],
+				'header': {'template': 'blue', 'title': {'content': title, 'tag': 'plain_text'}},
+			},
+		}
+		return self.feishu_webhook, data
+
+	def _wecom_request(self, title: str, content: str) -> tuple[str, dict]:
+		return self.weixin_webhook, {'msgtype': 'text', 'text': {'content': f'{title}\n{content}'}}
+
+	def _telegram_request(self, title: str, content: str) -> tuple[str, dict]:
+		message = f'<b>{title}</b>\n\n{content}'
+		data = {'chat_id': self.telegram_chat_id, 'text': message, 'parse_mode': 'HTML'}
+		return f'https://api.telegram.org/bot{self.telegram_bot_token}/sendMessage', data
+
+	@staticmethod
+	def _post(url: str, data: dict):
 		with httpx.Client(timeout=30.0) as client:
-			client.post('http://www.pushplus.plus/send', json=data)
+			client.post(url, json=data)
+
+	def send_pushplus(self, title: str, content: str):
+		if not self.pushplus_token:
+			raise ValueError('PushPlus Token not configured')
+		self._post(*self._pushplus_request(title, content))
 
 	def send_serverPush(self, title: str, content: str):
 		if not self.server_push_key:
 			raise ValueError('Server Push key not configured')
-
-		data = {'title': title, 'desp': content}
-		with httpx.Client(timeout=30.0) as client:
-			client.post(f'https://sctapi.ftqq.com/{self.server_push_key}.send', json=data)
+		self._post(*self._server_push_request(title, content))
 
 	def send_dingtalk(self, title: str, content: str):
 		if not self.dingding_webhook:
 			raise ValueError('DingTalk Webhook not configured')
-
-		data = {'msgtype': 'text', 'text': {'content': f'{title}\n{content}'}}
-		with httpx.Client(timeout=30.0) as client:
-			client.post(self.dingding_webhook, json=data)
+		self._post(*self._dingtalk_request(title, content))
 
 	def send_feishu(self, title: str, content: str):
 		if not self.feishu_webhook:
 			raise ValueError('Feishu Webhook not configured')
-
-		data = {
-			'msg_type': 'interactive',
-			'card': {
-				'elements': [{'tag': 'markdown', 'content': content, 'text_align': 'left'}],
-				'header': {'template': 'blue', 'title': {'content': title, 'tag': 'plain_text'}},
-			},
-		}
-		with httpx.Client(timeout=30.0) as client:
-			client.post(self.feishu_webhook, json=data)
+		self._post(*self._feishu_request(title, content))
 
 	def send_wecom(self, title: str, content: str):
 		if not self.weixin_webhook:
 			raise ValueError('WeChat Work Webhook not configured')
-
-		data = {'msgtype': 'text', 'text': {'content': f'{title}\n{content}'}}
-		with httpx.Client(timeout=30.0) as client:
-			client.post(self.weixin_webhook, json=data)
+		self._post(*self._wecom_request(title, content))
 
 	def send_telegram(self, title: str, content: str):
 		if not self.telegram_bot_token or not self.telegram_chat_id:
 			raise ValueError('Telegram Bot Token or Chat ID not configured')
+		self._post(*self._telegram_request(title, content))
 
-		message = f'<b>{title}</b>\n\n{content}'
-		data = {'chat_id': self.telegram_chat_id, 'text': message, 'parse_mode': 'HTML'}
-		url = f'https://api.telegram.org/bot{self.telegram_bot_token}/sendMessage'
-		with httpx.Client(timeout=30.0) as client:
-			client.post(url, json=data)
+	def _http_channels(self, title: str, content: str) -> list[tuple[str, str, dict]]:
+		"""已配置的 HTTP 推送渠道，返回 [(渠道名, URL, 请求体)]"""
+		channels = []
+		if self.pushplus_token:
+			channels.append(('PushPlus', *self._pushplus_request(title, content)))
+		if self.server_push_key:
+			channels.append(('Server Push', *self._server_push_request(title, content)))
+		if self.dingding_webhook:
+			channels.append(('DingTalk', *self._dingtalk_request(title, content)))
+		if self.feishu_webhook:
+			channels.append(('Feishu', *self._feishu_request(title, content)))
+		if self.weixin_webhook:
+			channels.append(('WeChat Work', *self._wecom_request(title, content)))
+		if self.telegram_bot_token and self.telegram_chat_id:
+			channels.append(('Telegram', *self._telegram_request(title, content)))
+		return channels
+
+	@staticmethod
+	async def _send_with_retry(
+		name: str, send: Callable[[], Awaitable], config: NotifyConfig, timeout: float | None
+	) -> bool:
+		"""发送到单个渠道，失败后按指数退避重试（4xx 响应不重试）
 
-	def push_message(self, title: str, content: str, msg_type: Literal['text', 'html'] = 'text'):
-		notifications = [
-			('Email', lambda: self.send_email(title, content, msg_type)),
-			('PushPlus', lambda: self.send_pushplus(title, content)),
-			('Server Push', lambda: self.send_serverPush(title, content)),
-			('DingTalk', lambda: self.send_dingtalk(title, content)),
-			('Feishu', lambda: self.send_feishu(title, content)),
-			('WeChat Work', lambda: self.send_wecom(title, content)),
-			('Telegram', lambda: self.send_telegram(title, content)),
-		]
-
-		for name, func in notifications:
+		timeout 为每次尝试的超时时间。邮件在线程中发送，wait_for 超时后线程仍会继续发送，
+		重试可能导致重复邮件，所以邮件传入 None，由 SMTP 连接的 socket 超时（SMTP_TIMEOUT）保证不会一直等待。
+		"""
+		for attempt in range(config.retries + 1):
 			try:
-				func()
+				await asyncio.wait_for(send(), timeout)
 				print(f'[{name}]: Message push successful!')
+				return True
 			except Exception as e:
-				print(f'[{name}]: Message push failed! Reason: {str(e)}')
+				reason = str(e) or type(e).__name__
+				client_error = isinstance(e, httpx.HTTPStatusError) and e.response.is_client_error
+				if attempt < config.retries and not client_error:
+					delay = config.retry_backoff * 2**attempt
+					print(f'[{name}]: Message push failed ({reason}), retrying in {delay:.1f}s')
+					await asyncio.sleep(delay)
+					continue
+				print(f'[{name}]: Message push failed! Reason: {reason}')
+				return False
+		return False
+
+	def configured_channels(self) -> list[str]:
+		"""已配置的推送渠道名"""
+		channels = [name for name, _, _ in self._http_channels('', '')]
+		if self.email_user and self.email_pass and self.email_to:
+			channels.insert(0, 'Email')
+		return channels
+
+	@timed('push_message')
+	async def apush_message(
+		self,
+		title: str,
+		content: str,
+		msg_type: Literal['text', 'html'] = 'text',
+		channels: Collection[str] | None = None,
+	) -> dict[str, bool]:
+		"""并发推送到所有已配置的渠道，返回 {渠道名: 是否成功}
+
+		HTTP 渠道共用 push_http_pool 中的长连接 AsyncClient，邮件在线程中发送；未配置的渠道直接跳过，
+		总耗时取决于最慢的一个渠道，而不是所有渠道耗时之和。channels 不为 None 时只推送到其中的渠道。
+		"""
+		config = NotifyConfig.load_from_env()
+		sends: list[tuple[str, Callable[[], Awaitable], float | None]] = []
+		if self.email_user and self.email_pass and self.email_to and (channels is None or 'Email' in channels):
+			sends.append(('Email', lambda: asyncio.to_thread(self.send_email, title, content, msg_type), None))
+
+		client = push_http_pool.get_client('push')
+
+		async def post(url: str, data: dict):
+			response = await client.post(url, json=data, timeout=config.timeout)
+			response.raise_for_status()
+
+		for name, url, data in self._http_channels(title, content):
+			if channels is not None and name not in channels:
+				continue
+			sends.append((name, functools.partial(post, url, data), config.timeout))
+
+		if not sends:
+			print('[NOTIFY] No notification channel configured, skipping')
+			return {}
+
+		results = await asyncio.gather(
+			*(self._send_with_retry(name, send, config, timeout) for name, send, timeout in sends)
+		)
+		return {name: result for (name, _, _), result in zip(sends, results)}
+
+	def push_message(self, title: str, content: str, msg_type: Literal['text', 'html'] = 'text') -> dict[str, bool]:
+		"""同步版本的 apush_message，不能在运行中的事件循环里调用"""
+		return asyncio.run(self.apush_message(title, content, msg_type))
 
 
 notify = NotificationKit()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+限流工具 - 令牌桶，按 provider 限制请求发起速率
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Hashable
+
+
+class TokenBucket:
+	"""令牌桶：每秒补充 rate 个令牌，最多累积 capacity 个，rate <= 0 时不限流
+
+	clock / sleep 默认为 time.monotonic / asyncio.sleep，测试时可以替换为模拟时钟
+	"""
+
+	def __init__(
+		self,
+		rate: float,
+		capacity: float = 1,
+		clock: Callable[[], float] = time.monotonic,
+		sleep: Callable[[float], Awaitable] = asyncio.sleep,
+	):
+		self.rate = rate
+		self.capacity = max(1.0, capacity)
+		self._clock = clock
+		self._sleep = sleep
+		self._tokens = self.capacity
+		self._updated = clock()
+		self._lock = asyncio.Lock()
+
+	def _refill(self):
+		now = self._clock()
+		self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+		self._updated = now
+
+	async def acquire(self):
+		"""获取一个令牌，令牌不足时等待（按调用顺序排队）"""
+		if self.rate <= 0:
+			return
+		async with self._lock:
+			self._refill()
+			while self._tokens < 1:
+				await self._sleep((1 - self._tokens) / self.rate)
+				self._refill()
+			self._tokens -= 1
+
+
+class KeyedRateLimiter:
+	"""按 key（例如 provider）分别维护令牌桶"""
+
+	def __init__(
+		self,
+		rate: float,
+		capacity: float = 1,
+		clock: Callable[[], float] = time.monotonic,
+		sleep: Callable[[float], Awaitable] = asyncio.sleep,
+	):
+		self.rate = rate
+		self.capacity = capacity
+		self._clock = clock
+		self._sleep = sleep
+		self._buckets: dict[Hashable, TokenBucket] = {}
+
+	async def acquire(self, key: Hashable):
+		bucket = self._buckets.get(key)
+		if bucket is None:
+			bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity, self._clock, self._sleep)
+		await bucket.acquire()
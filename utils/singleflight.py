@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Single-flight - 相同 key 的并发调用只执行一次，其余调用等待并复用同一个结果
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+	"""按 key 合并并发的异步调用
+
+	第一个调用者启动真正的任务，之后到达的调用者直接等待该任务的结果；
+	任务结束后 key 被清除，下一次调用会重新执行。
+	"""
+
+	def __init__(self):
+		self._tasks: dict[Hashable, asyncio.Task] = {}
+
+	def in_flight(self, key: Hashable) -> bool:
+		"""判断 key 对应的任务是否正在执行"""
+		task = self._tasks.get(key)
+		return task is not None and not task.done()
+
+	async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+		"""执行 fn()，如果相同 key 的任务正在执行则复用其结果"""
+		task = self._tasks.get(key)
+		if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+			task = asyncio.ensure_future(fn())
+			self._tasks[key] = task
+			task.add_done_callback(lambda t: self._forget(key, t))
+
+		# shield：某个调用者被取消时不影响其他等待同一结果的调用者
+		return await asyncio.shield(task)
+
+	def _forget(self, key: Hashable, task: asyncio.Task):
+		if self._tasks.get(key) is task:
+			del self._tasks[key]
+		# 所有调用者都被取消时，避免 "exception was never retrieved" 警告
+		if not task.cancelled():
+			task.exception()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+SMTP 连接池 - 复用已登录的 SMTP 连接发送邮件，避免每封邮件都重新握手和登录
+"""
+
+import smtplib
+import ssl
+import threading
+import time
+from email.message import Message
+
+from utils.config import SmtpPoolConfig
+
+# 每个 SMTP 服务器可用的连接方式：'ssl'（465 端口）或 'starttls'（587 端口），进程内记住，下次直接使用
+_transports: dict[str, str] = {}
+
+_PORTS = {'ssl': 465, 'starttls': 587}
+
+
+class PooledSmtpSender:
+	"""同一个 SMTP 服务器和账号的连接池
+
+	- 最多保持 size 个已登录的连接，空闲超过 idle_timeout 秒的连接在下次使用前关闭
+	- 第一次连接时先尝试 465 SSL，失败再尝试 587 STARTTLS，之后直接使用成功的方式
+	- 连接被服务器断开（SMTPServerDisconnected）时重新连接并重发当前邮件
+	"""
+
+	def __init__(self, server: str, user: str, password: str, config: SmtpPoolConfig):
+		self.server = server
+		self.user = user
+		self.password = password
+		self.config = config
+		self._idle: list[tuple[smtplib.SMTP, float]] = []
+		self._lock = threading.Lock()
+		self._slots = threading.BoundedSemaphore(config.size)
+		self.connections_opened = 0
+
+	def _open(self, transport: str) -> smtplib.SMTP:
+		port = _PORTS[transport]
+		if transport == 'ssl':
+			conn = smtplib.SMTP_SSL(
+				self.server, port, timeout=self.config.timeout, context=ssl.create_default_context()
+			)
+		else:
+			conn = smtplib.SMTP(self.server, port, timeout=self.config.timeout)
+		try:
+			if transport == 'starttls':
+				conn.starttls(context=ssl.create_default_context())
+			conn.login(self.user, self.password)
+		except Exception:
+			_close_quietly(conn)
+			raise
+		return conn
+
+	def _connect(self) -> smtplib.SMTP:
+		"""建立并登录一个新连接，优先使用上次成功的连接方式"""
+		known = _transports.get(self.server)
+		candidates = [known] + [t for t in _PORTS if t != known] if known else list(_PORTS)
+		error = None
+		for transport in candidates:
+			try:
+				conn = self._open(transport)
+			except smtplib.SMTPAuthenticationError:
+				# 认证失败换端口也没有用
+				raise
+			except Exception as e:
+				error = e
+				continue
+			if known != transport:
+				print(f'[EMAIL] {self.server}: using {transport} on port {_PORTS[transport]}')
+				_transports[self.server] = transport
+			self.connections_opened += 1
+			return conn
+		raise error
+
+	def _acquire(self) -> smtplib.SMTP:
+		self._slots.acquire()
+		try:
+			now = time.monotonic()
+			with self._lock:
+				# 空闲太久的连接可能已经被服务器关闭，直接丢弃
+				expired = [conn for conn, last_used in self._idle if now - last_used >= self.config.idle_timeout]
+				self._idle = [(conn, last_used) for conn, last_used in self._idle if conn not in expired]
+				conn = self._idle.pop()[0] if self._idle else None
+			for stale in expired:
+				_close_quietly(stale)
+			return conn or self._connect()
+		except BaseException:
+			self._slots.release()
+			raise
+
+	def _release(self, conn: smtplib.SMTP | None):
+		if conn is not None:
+			with self._lock:
+				self._idle.append((conn, time.monotonic()))
+		self._slots.release()
+
+	def send_many(self, messages: list[Message]) -> list[Exception | None]:
+		"""通过同一个连接依次发送多封邮件，返回每封邮件的错误（成功为 None）"""
+		errors: list[Exception | None] = []
+		conn = self._acquire()
+		try:
+			for msg in messages:
+				try:
+					conn.send_message(msg)
+					errors.append(None)
+				except smtplib.SMTPServerDisconnected:
+					# 服务器关闭了空闲连接，重新连接后重发一次
+					_close_quietly(conn)
+					conn = None  # 重新连接失败时不再归还旧连接
+					conn = self._connect()
+					conn.send_message(msg)
+					errors.append(None)
+				except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+					# 单封邮件被拒绝，连接仍然可用
+					errors.append(e)
+		except Exception as e:
+			if conn is not None:
+				_close_quietly(conn)
+				conn = None
+			errors.extend([e] * (len(messages) - len(errors)))
+		finally:
+			self._release(conn)
+		return errors
+
+	def send(self, msg: Message):
+		"""发送一封邮件，失败时抛出异常"""
+		error = self.send_many([msg])[0]
+		if error is not None:
+			raise error
+
+	def close(self):
+		"""关闭所有空闲连接"""
+		with self._lock:
+			idle, self._idle = self._idle, []
+		for conn, _ in idle:
+			_close_quietly(conn)
+
+
+def _close_quietly(conn: smtplib.SMTP):
+	try:
+		conn.quit()
+	except Exception:
+		try:
+			conn.close()
+		except Exception:
+			pass
+
+
+class SmtpPool:
+	"""按 (服务器, 账号) 复用 PooledSmtpSender"""
+
+	def __init__(self, config: SmtpPoolConfig | None = None):
+		self._config = config
+		self._senders: dict[tuple[str, str, str], PooledSmtpSender] = {}
+		self._lock = threading.Lock()
+
+	@property
+	def config(self) -> SmtpPoolConfig:
+		"""配置在首次使用时才从环境变量读取，保证 load_dotenv() 已经执行"""
+		if self._config is None:
+			self._config = SmtpPoolConfig.load_from_env()
+		return self._config
+
+	def get_sender(self, server: str, user: str, password: str) -> PooledSmtpSender:
+		"""获取指定服务器和账号的连接池"""
+		key = (server, user, password)
+		with self._lock:
+			sender = self._senders.get(key)
+			if sender is None:
+				sender = PooledSmtpSender(server, user, password, self.config)
+				self._senders[key] = sender
+			return sender
+
+	def close(self):
+		"""关闭所有空闲连接"""
+		with self._lock:
+			senders = list(self._senders.values())
+		for sender in senders:
+			sender.close()
+
+
+smtp_pool = SmtpPool()
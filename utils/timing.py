@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+耗时统计 - 记录签到流程中各阶段（获取 WAF cookies、请求接口、发送通知等）的耗时
+
+用法：
+	with record_timings() as recorder:
+		await check_in_account(...)
+	print(recorder.spans)
+
+被 @timed 装饰的函数在 record_timings() 内执行时会自动记录一条耗时，
+同一个 asyncio 任务（以及由它创建的任务和 asyncio.to_thread 线程）内的调用都会记录到同一个 recorder。
+"""
+
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable
+
+_current_recorder: ContextVar['TimingRecorder | None'] = ContextVar('timing_recorder', default=None)
+
+
+class TimingRecorder:
+	"""收集一个账号签到过程中的各阶段耗时"""
+
+	def __init__(self):
+		self.spans: list[dict] = []
+
+	def add(self, stage: str, duration_ms: float, success: bool = True):
+		self.spans.append({'stage': stage, 'duration_ms': round(duration_ms, 3), 'success': success})
+
+
+@contextmanager
+def record_timings():
+	"""在当前上下文中开始记录耗时"""
+	recorder = TimingRecorder()
+	token = _current_recorder.set(recorder)
+	try:
+		yield recorder
+	finally:
+		_current_recorder.reset(token)
+
+
+@contextmanager
+def span(stage: str):
+	"""记录一段代码的耗时，代码抛出异常时记为失败"""
+	recorder = _current_recorder.get()
+	if recorder is None:
+		yield
+		return
+
+	start = time.perf_counter()
+	success = False
+	try:
+		yield
+		success = True
+	finally:
+		recorder.add(stage, (time.perf_counter() - start) * 1000, success)
+
+
+def timed(stage: str, success: Callable[[Any], bool] | None = None):
+	"""记录函数耗时的装饰器，支持普通函数和协程函数
+
+	success 用于根据返回值判断是否成功（例如返回 None 表示失败），未提供时只要没有抛出异常就算成功
+	"""
+
+	def decorator(func):
+		def finish(recorder: TimingRecorder, start: float, ok: bool):
+			recorder.add(stage, (time.perf_counter() - start) * 1000, ok)
+
+		if inspect.iscoroutinefunction(func):
+
+			@functools.wraps(func)
+			async def async_wrapper(*args, **kwargs):
+				recorder = _current_recorder.get()
+				if recorder is None:
+					return await func(*args, **kwargs)
+				start = time.perf_counter()
+				try:
+					result = await func(*args, **kwargs)
+				except BaseException:
+					finish(recorder, start, False)
+					raise
+				finish(recorder, start, success(result) if success else True)
+				return result
+
+			return async_wrapper
+
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			recorder = _current_recorder.get()
+			if recorder is None:
+				return func(*args, **kwargs)
+			start = time.perf_counter()
+			try:
+				result = func(*args, **kwargs)
+			except BaseException:
+				finish(recorder, start, False)
+				raise
+			finish(recorder, start, success(result) if success else True)
+			return result
+
+		return wrapper
+
+	return decorator
+
+
+def percentile(values: list[float], p: float) -> float:
+	"""计算分位数（线性插值），values 为空时返回 0"""
+	if not values:
+		return 0.0
+	values = sorted(values)
+	position = (len(values) - 1) * p
+	lower = int(position)
+	upper = min(lower + 1, len(values) - 1)
+	return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def summarize_spans(spans: list[dict]) -> dict:
+	"""按阶段汇总耗时：次数、失败次数、总耗时、p50、p95、最大值（毫秒）"""
+	durations: dict[str, list[float]] = {}
+	failures: dict[str, int] = {}
+	for item in spans:
+		durations.setdefault(item['stage'], []).append(item['duration_ms'])
+		failures[item['stage']] = failures.get(item['stage'], 0) + (0 if item['success'] else 1)
+
+	return {
+		stage: {
+			'count': len(values),
+			'failures': failures[stage],
+			'total_ms': round(sum(values), 3),
+			'p50_ms': round(percentile(values, 0.5), 3),
+			'p95_ms': round(percentile(values, 0.95), 3),
+			'max_ms': round(max(values), 3),
+		}
+		for stage, values in durations.items()
+	}
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+WAF cookies 缓存 - 进程内缓存 + 带过期时间的文件持久化
+"""
+
+import json
+import os
+import time
+
+from utils.fileio import file_lock, write_json_atomic
+
+
+class WafCookieCache:
+	"""按 provider 域名缓存 WAF cookies
+
+	文件格式: {domain: {"cookies": {...}, "fetched_at": 时间戳, "expires_at": 时间戳}}
+	旧版本直接保存 cookies 的条目会被兼容读取，视为过期时间未知。
+
+	- 读取优先走内存，只有文件被其他进程修改（mtime 变化）时才重新加载
+	- 距离过期不足 refresh_margin 秒的条目视为已过期，提前刷新，避免用即将过期的 cookies 发请求
+	- 写入时加文件锁并与磁盘上的最新内容合并，再原子重命名，调度器和 Web 进程可以安全共享
+	"""
+
+	def __init__(self, path: str, default_ttl: int = 1800, refresh_margin: int = 120):
+		self.path = path
+		self.default_ttl = default_ttl
+		self.refresh_margin = refresh_margin
+		self._entries: dict[str, dict] = {}
+		self._mtime: float | None = None
+
+	@staticmethod
+	def _normalize(entry) -> dict | None:
+		if not isinstance(entry, dict):
+			return None
+		if isinstance(entry.get('cookies'), dict):
+			return {
+				'cookies': entry['cookies'],
+				'fetched_at': entry.get('fetched_at'),
+				'expires_at': entry.get('expires_at'),
+			}
+		# 旧格式：条目本身就是 cookies
+		return {'cookies': entry, 'fetched_at': None, 'expires_at': None}
+
+	def _read_file(self) -> dict[str, dict]:
+		try:
+			with open(self.path, 'r', encoding='utf-8') as f:
+				data = json.load(f)
+		except FileNotFoundError:
+			return {}
+		except Exception as e:
+			print(f'Warning: Failed to load WAF cookies cache: {e}')
+			return {}
+
+		entries = {}
+		if isinstance(data, dict):
+			for key, entry in data.items():
+				normalized = self._normalize(entry)
+				if normalized:
+					entries[key] = normalized
+		return entries
+
+	def _reload_if_changed(self):
+		try:
+			mtime = os.stat(self.path).st_mtime
+		except OSError:
+			return
+		if mtime != self._mtime:
+			self._entries = self._read_file()
+			self._mtime = mtime
+
+	def lookup(self, key: str) -> tuple[dict | None, str]:
+		"""查询缓存，返回 (cookies, 状态)，状态为 'hit'、'miss' 或 'expired'"""
+		self._reload_if_changed()
+		entry = self._entries.get(key)
+		if not entry or not entry['cookies']:
+			return None, 'miss'
+
+		expires_at = entry.get('expires_at')
+		if expires_at is not None and time.time() >= expires_at - self.refresh_margin:
+			return None, 'expired'
+		return entry['cookies'], 'hit'
+
+	def get(self, key: str) -> dict | None:
+		"""获取未过期的 cookies"""
+		return self.lookup(key)[0]
+
+	def set(self, key: str, cookies: dict, expires_at: float | None = None):
+		"""写入 cookies，expires_at 为空时使用默认有效期"""
+		now = time.time()
+		entry = {
+			'cookies': cookies,
+			'fetched_at': now,
+			'expires_at': expires_at if expires_at is not None else now + self.default_ttl,
+		}
+		self._entries[key] = entry
+
+		try:
+			with file_lock(self.path):
+				# 合并其他进程写入的条目，同一个 key 保留较新的那一份
+				merged = self._read_file()
+				current = merged.get(key)
+				if not current or (current.get('fetched_at') or 0) <= now:
+					merged[key] = entry
+				write_json_atomic(self.path, merged)
+				self._entries = merged
+				self._mtime = os.stat(self.path).st_mtime
+		except Exception as e:
+			print(f'Warning: Failed to save WAF cookies cache: {e}')
@@ -5,12 +5,14 @@ FastAPI 后端 API
 
 import asyncio
 import sys
+import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
 
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
@@ -19,16 +21,47 @@ project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
 from utils.auto_login import login_anyrouter
+from utils.browser_pool import browser_pool
+from utils.concurrency import run_bounded
+from utils.config import SchedulerConfig, get_int_env
+from utils.email_digest import EMAIL_NOTIFY_MODES, get_email_notify_mode, normalize_email
+from utils.http_pool import http_pool
+from utils.metrics import render_metrics
+from utils.notify import notify, push_http_pool
+from utils.smtp_pool import smtp_pool
+from utils.timing import record_timings, span, summarize_spans
 
 # 使用相对导入避免路径问题
 if __name__ == '__main__':
-	from database import db
+	from database import adb
 	from auth import create_access_token, get_current_user, require_admin
+	from jobs import jobs
+	from outbox import outbox
+	from scheduler import get_schedule
 else:
-	from web.database import db
+	from web.database import adb
 	from web.auth import create_access_token, get_current_user, require_admin
+	from web.jobs import jobs
+	from web.outbox import outbox
+	from web.scheduler import get_schedule
 
-app = FastAPI(title='AnyRouter 签到管理系统', version='2.0.0')
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+	"""应用生命周期：初始化数据库并启动通知发件箱 worker，关闭时释放共享资源"""
+	# 数据库在首次使用时才创建（执行迁移），启动时提前创建，避免第一个请求等待
+	await adb.initialize()
+	outbox.start()
+	yield
+	await outbox.stop()
+	await http_pool.aclose()
+	await push_http_pool.aclose()
+	await browser_pool.close()
+	smtp_pool.close()
+	adb.shutdown()
+
+
+app = FastAPI(title='AnyRouter 签到管理系统', version='2.0.0', lifespan=lifespan)
 
 # 配置 CORS
 app.add_middleware(
@@ -90,6 +123,11 @@ class SystemConfigUpdate(BaseModel):
 	custom_smtp_server: str | None = None
 
 
+class EmailPreferenceUpdate(BaseModel):
+	email: str
+	mode: str | None = None  # immediate / digest / failures_only，None 表示使用默认值
+
+
 # ========== API 路由 ==========
 
 
@@ -139,6 +177,13 @@ async def health_check():
 	return {'status': 'ok'}
 
 
+@app.get('/metrics')
+async def metrics():
+	"""Prometheus 指标（设置 PROMETHEUS_MULTIPROC_DIR 时包含定时任务进程的指标）"""
+	content, content_type = await asyncio.to_thread(render_metrics)
+	return Response(content=content, media_type=content_type)
+
+
 # ========== 用户认证 ==========
 
 
@@ -147,7 +192,7 @@ async def login(request: LoginRequest):
 	"""用户登录"""
 	try:
 		# 验证用户
-		user = db.get_user_by_username(request.username)
+		user = await adb.get_user_by_username(request.username)
 		if not user:
 			raise HTTPException(status_code=401, detail='用户名或密码错误')
 
@@ -158,7 +203,7 @@ async def login(request: LoginRequest):
 			raise HTTPException(status_code=403, detail='账号已被禁用')
 
 		# 检查是否过期
-		if db.check_user_expired(user['id']):
+		if await adb.check_user_expired(user['id']):
 			raise HTTPException(status_code=403, detail='账号已过期，请联系管理员')
 
 		# 生成 token
@@ -178,7 +223,7 @@ async def login(request: LoginRequest):
 async def get_current_user_info(current_user: dict = Depends(get_current_user)):
 	"""获取当前登录用户信息"""
 	try:
-		user = db.get_user_by_id(current_user['user_id'])
+		user = await adb.get_user_by_id(current_user['user_id'])
 		if not user:
 			raise HTTPException(status_code=404, detail='用户不存在')
 		return {'success': True, 'data': user}
@@ -195,7 +240,7 @@ async def get_current_user_info(current_user: dict = Depends(get_current_user)):
 async def get_users(current_user: dict = Depends(require_admin)):
 	"""获取所有用户（仅管理员）"""
 	try:
-		users = db.get_all_users()
+		users = await adb.get_all_users()
 		return {'success': True, 'data': users}
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=str(e))
@@ -206,11 +251,11 @@ async def create_user(user: UserCreate, current_user: dict = Depends(require_adm
 	"""创建用户（仅管理员）"""
 	try:
 		# 检查用户名是否已存在
-		existing = db.get_user_by_username(user.username)
+		existing = await adb.get_user_by_username(user.username)
 		if existing:
 			raise HTTPException(status_code=400, detail='用户名已存在')
 
-		user_id = db.add_user(user.username, user.password, user.display_name, user.role, user.expire_date)
+		user_id = await adb.add_user(user.username, user.password, user.display_name, user.role, user.expire_date)
 		return {'success': True, 'data': {'id': user_id}, 'message': '用户创建成功'}
 	except HTTPException:
 		raise
@@ -223,11 +268,11 @@ async def update_user(user_id: int, user: UserUpdate, current_user: dict = Depen
 	"""更新用户（仅管理员）"""
 	try:
 		# 检查用户是否存在
-		existing = db.get_user_by_id(user_id)
+		existing = await adb.get_user_by_id(user_id)
 		if not existing:
 			raise HTTPException(status_code=404, detail='用户不存在')
 
-		db.update_user(user_id, display_name=user.display_name, password=user.password, expire_date=user.expire_date, enabled=user.enabled)
+		await adb.update_user(user_id, display_name=user.display_name, password=user.password, expire_date=user.expire_date, enabled=user.enabled)
 		return {'success': True, 'message': '用户更新成功'}
 	except HTTPException:
 		raise
@@ -244,11 +289,11 @@ async def delete_user(user_id: int, current_user: dict = Depends(require_admin))
 			raise HTTPException(status_code=400, detail='不能删除自己')
 
 		# 检查用户是否存在
-		existing = db.get_user_by_id(user_id)
+		existing = await adb.get_user_by_id(user_id)
 		if not existing:
 			raise HTTPException(status_code=404, detail='用户不存在')
 
-		db.delete_user(user_id)
+		await adb.delete_user(user_id)
 		return {'success': True, 'message': '用户删除成功'}
 	except HTTPException:
 		raise
@@ -264,18 +309,12 @@ async def get_accounts(current_user: dict = Depends(get_current_user)):
 	"""获取账号列表 - 管理员看所有，普通用户只看自己的"""
 	try:
 		# 管理员可以看所有账号，普通用户只能看自己的
+		# 账号和最新余额在一次查询中取出，不包含密码和 cookies
 		if current_user['role'] == 'admin':
-			accounts = db.get_all_accounts()
+			accounts = await adb.get_accounts_with_balance()
 		else:
-			accounts = db.get_all_accounts(user_id=current_user['user_id'])
-
-		# 不返回密码，并附加最新余额信息
-		for account in accounts:
-			account.pop('password', None)
-			account.pop('cookies', None)
-			# 获取最新余额
-			balance = db.get_latest_balance(account['id'])
-			account['balance'] = balance
+			accounts = await adb.get_accounts_with_balance(user_id=current_user['user_id'])
+
 		return {'success': True, 'data': accounts}
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=str(e))
@@ -285,7 +324,7 @@ async def get_accounts(current_user: dict = Depends(get_current_user)):
 async def get_account(account_id: int, include_sensitive: bool = False, current_user: dict = Depends(get_current_user)):
 	"""获取单个账号详情"""
 	try:
-		account = db.get_account(account_id)
+		account = await adb.get_account(account_id)
 		if not account:
 			raise HTTPException(status_code=404, detail='账号不存在')
 
@@ -294,12 +333,14 @@ async def get_account(account_id: int, include_sensitive: bool = False, current_
 			raise HTTPException(status_code=403, detail='无权访问此账号')
 
 		# 如果不需要敏感信息，则移除密码和cookies
+		# 用 del 而不是 pop，未访问过的加密字段不会被解密
 		if not include_sensitive:
-			account.pop('password', None)
-			account.pop('cookies', None)
+			for field in adb.SECRET_ACCOUNT_FIELDS:
+				if field in account:
+					del account[field]
 
 		# 获取最新余额
-		latest_balance = db.get_latest_balance(account_id)
+		latest_balance = await adb.get_latest_balance(account_id)
 
 		return {'success': True, 'data': {'account': account, 'balance': latest_balance}}
 	except HTTPException:
@@ -323,7 +364,7 @@ async def create_account(account: AccountCreate, current_user: dict = Depends(ge
 			)
 
 		# 调用数据库添加账号，关联到当前用户
-		account_id = db.add_account(
+		account_id = await adb.add_account(
 			user_id=current_user['user_id'],
 			name=account.name,
 			username=account.username,
@@ -353,7 +394,7 @@ async def update_account(account_id: int, account: AccountUpdate, current_user:
 	"""更新账号信息 - 支持两种认证方式"""
 	try:
 		# 检查账号是否存在
-		existing = db.get_account(account_id)
+		existing = await adb.get_account(account_id)
 		if not existing:
 			raise HTTPException(status_code=404, detail='账号不存在')
 
@@ -361,7 +402,7 @@ async def update_account(account_id: int, account: AccountUpdate, current_user:
 		if current_user['role'] != 'admin' and existing['user_id'] != current_user['user_id']:
 			raise HTTPException(status_code=403, detail='无权修改此账号')
 
-		db.update_account(
+		await adb.update_account(
 			account_id,
 			name=account.name,
 			password=account.password,
@@ -383,7 +424,7 @@ async def delete_account(account_id: int, current_user: dict = Depends(get_curre
 	"""删除账号"""
 	try:
 		# 检查账号是否存在
-		existing = db.get_account(account_id)
+		existing = await adb.get_account(account_id)
 		if not existing:
 			raise HTTPException(status_code=404, detail='账号不存在')
 
@@ -391,7 +432,7 @@ async def delete_account(account_id: int, current_user: dict = Depends(get_curre
 		if current_user['role'] != 'admin' and existing['user_id'] != current_user['user_id']:
 			raise HTTPException(status_code=403, detail='无权删除此账号')
 
-		db.delete_account(account_id)
+		await adb.delete_account(account_id)
 		return {'success': True, 'message': '账号删除成功'}
 	except HTTPException:
 		raise
@@ -430,9 +471,9 @@ async def get_logs(account_id: int | None = None, limit: int = 100, current_user
 	try:
 		# 管理员可以看所有日志，普通用户只能看自己的
 		if current_user['role'] == 'admin':
-			logs = db.get_checkin_logs(account_id=account_id, limit=limit)
+			logs = await adb.get_checkin_logs(account_id=account_id, limit=limit)
 		else:
-			logs = db.get_checkin_logs(account_id=account_id, user_id=current_user['user_id'], limit=limit)
+			logs = await adb.get_checkin_logs(account_id=account_id, user_id=current_user['user_id'], limit=limit)
 
 		return {'success': True, 'data': logs}
 	except Exception as e:
@@ -447,14 +488,14 @@ async def get_balance_history(account_id: int, limit: int = 30, current_user: di
 	"""获取余额历史"""
 	try:
 		# 权限检查
-		account = db.get_account(account_id)
+		account = await adb.get_account(account_id)
 		if not account:
 			raise HTTPException(status_code=404, detail='账号不存在')
 
 		if current_user['role'] != 'admin' and account['user_id'] != current_user['user_id']:
 			raise HTTPException(status_code=403, detail='无权查看此账号的余额历史')
 
-		history = db.get_balance_history(account_id, limit=limit)
+		history = await adb.get_balance_history(account_id, limit=limit)
 		return {'success': True, 'data': history}
 	except HTTPException:
 		raise
@@ -469,7 +510,7 @@ async def get_balance_history(account_id: int, limit: int = 30, current_user: di
 async def get_system_config(current_user: dict = Depends(require_admin)):
 	"""获取系统配置（仅管理员）"""
 	try:
-		configs = db.get_all_configs()
+		configs = await adb.get_all_configs()
 		# 返回配置，包括密码明文（仅管理员可见）
 		return {
 			'success': True,
@@ -488,27 +529,108 @@ async def update_system_config(config: SystemConfigUpdate, current_user: dict =
 	"""更新系统配置（仅管理员）"""
 	try:
 		if config.email_user is not None:
-			db.set_config('email_user', config.email_user, '发件邮箱地址')
+			await adb.set_config('email_user', config.email_user, '发件邮箱地址')
 
 		if config.email_pass is not None:
-			db.set_config('email_pass', config.email_pass, 'SMTP 密码')
+			await adb.set_config('email_pass', config.email_pass, 'SMTP 密码')
 
 		if config.custom_smtp_server is not None:
-			db.set_config('custom_smtp_server', config.custom_smtp_server, 'SMTP 服务器地址')
+			await adb.set_config('custom_smtp_server', config.custom_smtp_server, 'SMTP 服务器地址')
 
+		# 邮件配置已修改，下次发送时重新读取
+		notify.invalidate()
 		return {'success': True, 'message': '系统配置更新成功'}
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=str(e))
 
 
+def _send_test_email(email_user: str, email_pass: str, smtp_server: str | None):
+	"""发送测试邮件（阻塞，依次尝试 465/587/25 端口）"""
+	# 手动创建邮件并发送
+	from email.mime.text import MIMEText
+	import smtplib
+
+	msg = MIMEText(f'''这是一封测试邮件
+
+发件邮箱: {email_user}
+SMTP 服务器: {smtp_server or "自动推断"}
+测试时间: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+
+如果您收到此邮件，说明邮件配置正确！
+
+---
+AnyRouter 签到管理系统''', 'plain', 'utf-8')
+
+	msg['From'] = f'AnyRouter Assistant <{email_user}>'
+	msg['To'] = email_user
+	msg['Subject'] = 'AnyRouter 系统测试邮件'
+
+	# 自动推断 SMTP 服务器
+	if not smtp_server:
+		smtp_server = f'smtp.{email_user.split("@")[1]}'
+
+	print(f'[DEBUG] Sending email via {smtp_server}...')
+	print(f'[DEBUG] Email user: {email_user}')
+
+	# 尝试多种连接方式
+	last_error = None
+
+	# 方式1: SSL 端口 465
+	try:
+		print('[DEBUG] Trying SSL on port 465...')
+		server = smtplib.SMTP_SSL(smtp_server, 465, timeout=10)
+		server.set_debuglevel(1)  # 启用调试输出
+		server.login(email_user, email_pass)
+		server.send_message(msg)
+		server.quit()
+		print('[DEBUG] SSL 465 succeeded!')
+		return
+	except Exception as e:
+		last_error = str(e)
+		print(f'[DEBUG] SSL 465 failed: {e}')
+
+	# 方式2: STARTTLS 端口 587
+	try:
+		print('[DEBUG] Trying STARTTLS on port 587...')
+		server = smtplib.SMTP(smtp_server, 587, timeout=10)
+		server.set_debuglevel(1)
+		server.starttls()
+		server.login(email_user, email_pass)
+		server.send_message(msg)
+		server.quit()
+		print('[DEBUG] STARTTLS 587 succeeded!')
+		return
+	except Exception as e:
+		last_error = str(e)
+		print(f'[DEBUG] STARTTLS 587 failed: {e}')
+
+	# 方式3: 普通 SMTP 端口 25
+	try:
+		print('[DEBUG] Trying SMTP on port 25...')
+		server = smtplib.SMTP(smtp_server, 25, timeout=10)
+		server.set_debuglevel(1)
+		server.starttls()
+		server.login(email_user, email_pass)
+		server.send_message(msg)
+		server.quit()
+		print('[DEBUG] SMTP 25 succeeded!')
+		return
+	except Exception as e:
+		last_error = str(e)
+		print(f'[DEBUG] SMTP 25 failed: {e}')
+
+	# 所有方式都失败
+	raise Exception(f'所有SMTP连接方式都失败了。最后错误: {last_error}')
+
+
 @app.post('/api/test-email')
 async def test_email(current_user: dict = Depends(require_admin)):
 	"""测试邮件配置（仅管理员）"""
 	try:
 		# 先直接从数据库读取配置
-		email_user = db.get_config('email_user')
-		email_pass = db.get_config('email_pass')
-		smtp_server = db.get_config('custom_smtp_server')
+		email_user = await adb.get_config('email_user')
+		email_pass = await adb.get_config('email_pass')
+		smtp_server = await adb.get_config('custom_smtp_server')
 
 		print(f'[DEBUG] From DB - email_user: {email_user}')
 		print(f'[DEBUG] From DB - email_pass: {email_pass}')
@@ -517,87 +639,92 @@ async def test_email(current_user: dict = Depends(require_admin)):
 		if not email_user or not email_pass:
 			raise HTTPException(status_code=400, detail=f'邮件配置未完成，请先配置发件邮箱和密码 (email_user={email_user}, email_pass={"已配置" if email_pass else "未配置"})')
 
-		# 手动创建邮件并发送
-		from email.mime.text import MIMEText
-		import smtplib
-
-		msg = MIMEText(f'''这是一封测试邮件
-
-发件邮箱: {email_user}
-SMTP 服务器: {smtp_server or "自动推断"}
-测试时间: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+		# SMTP 连接和发送是阻塞操作，放到线程中执行
+		await asyncio.to_thread(_send_test_email, email_user, email_pass, smtp_server)
+		return {'success': True, 'message': f'测试邮件已发送到 {email_user}'}
+	except HTTPException:
+		raise
+	except Exception as e:
+		import traceback
+		traceback.print_exc()
+		raise HTTPException(status_code=500, detail=f'发送测试邮件失败: {str(e)}')
 
-如果您收到此邮件，说明邮件配置正确！
 
----
-AnyRouter 签到管理系统''', 'plain', 'utf-8')
+# ========== 邮件发送方式 ==========
 
-		msg['From'] = f'AnyRouter Assistant <{email_user}>'
-		msg['To'] = email_user
-		msg['Subject'] = 'AnyRouter 系统测试邮件'
 
-		# 自动推断 SMTP 服务器
-		if not smtp_server:
-			smtp_server = f'smtp.{email_user.split("@")[1]}'
+async def _account_emails(current_user: dict) -> list[str]:
+	"""当前用户可以管理的收件人 - 管理员为所有账号的邮箱，普通用户为自己账号的邮箱"""
+	if current_user['role'] == 'admin':
+		accounts = await adb.get_all_accounts(include_secrets=False)
+	else:
+		accounts = await adb.get_all_accounts(user_id=current_user['user_id'], include_secrets=False)
+	return sorted({normalize_email(account['email']) for account in accounts if account.get('email')})
 
-		print(f'[DEBUG] Sending email via {smtp_server}...')
-		print(f'[DEBUG] Email user: {email_user}')
 
-		# 尝试多种连接方式
-		last_error = None
+@app.get('/api/email-preferences')
+async def get_email_preferences(current_user: dict = Depends(get_current_user)):
+	"""获取账号邮箱的邮件发送方式（立即发送 / 汇总发送 / 只发送失败）"""
+	try:
+		emails = await _account_emails(current_user)
+		preferences = await adb.get_email_preferences(emails)
+		default_mode = get_email_notify_mode()
+		return {
+			'success': True,
+			'data': {
+				'default_mode': default_mode,
+				'modes': list(EMAIL_NOTIFY_MODES),
+				'recipients': [
+					{'email': email, 'mode': preferences.get(email, default_mode), 'custom': email in preferences}
+					for email in emails
+				],
+			},
+		}
+	except Exception as e:
+		raise HTTPException(status_code=500, detail=str(e))
 
-		# 方式1: SSL 端口 465
-		try:
-			print('[DEBUG] Trying SSL on port 465...')
-			server = smtplib.SMTP_SSL(smtp_server, 465, timeout=10)
-			server.set_debuglevel(1)  # 启用调试输出
-			server.login(email_user, email_pass)
-			server.send_message(msg)
-			server.quit()
-			print('[DEBUG] SSL 465 succeeded!')
-			return {'success': True, 'message': f'测试邮件已发送到 {email_user}'}
-		except Exception as e:
-			last_error = str(e)
-			print(f'[DEBUG] SSL 465 failed: {e}')
 
-		# 方式2: STARTTLS 端口 587
-		try:
-			print('[DEBUG] Trying STARTTLS on port 587...')
-			server = smtplib.SMTP(smtp_server, 587, timeout=10)
-			server.set_debuglevel(1)
-			server.starttls()
-			server.login(email_user, email_pass)
-			server.send_message(msg)
-			server.quit()
-			print('[DEBUG] STARTTLS 587 succeeded!')
-			return {'success': True, 'message': f'测试邮件已发送到 {email_user}'}
-		except Exception as e:
-			last_error = str(e)
-			print(f'[DEBUG] STARTTLS 587 failed: {e}')
+@app.put('/api/email-preferences')
+async def update_email_preference(preference: EmailPreferenceUpdate, current_user: dict = Depends(get_current_user)):
+	"""设置收件人的邮件发送方式 - 普通用户只能设置自己账号的邮箱"""
+	try:
+		if preference.mode is not None and preference.mode not in EMAIL_NOTIFY_MODES:
+			raise HTTPException(status_code=400, detail=f'发送方式必须是 {", ".join(EMAIL_NOTIFY_MODES)} 之一')
 
-		# 方式3: 普通 SMTP 端口 25
-		try:
-			print('[DEBUG] Trying SMTP on port 25...')
-			server = smtplib.SMTP(smtp_server, 25, timeout=10)
-			server.set_debuglevel(1)
-			server.starttls()
-			server.login(email_user, email_pass)
-			server.send_message(msg)
-			server.quit()
-			print('[DEBUG] SMTP 25 succeeded!')
-			return {'success': True, 'message': f'测试邮件已发送到 {email_user}'}
-		except Exception as e:
-			last_error = str(e)
-			print(f'[DEBUG] SMTP 25 failed: {e}')
+		email = normalize_email(preference.email)
+		if current_user['role'] != 'admin' and email not in await _account_emails(current_user):
+			raise HTTPException(status_code=403, detail='无权设置此邮箱')
 
-		# 所有方式都失败
-		raise Exception(f'所有SMTP连接方式都失败了。最后错误: {last_error}')
+		await adb.set_email_preference(email, preference.mode)
+		return {'success': True, 'message': '邮件发送方式更新成功'}
 	except HTTPException:
 		raise
 	except Exception as e:
-		import traceback
-		traceback.print_exc()
-		raise HTTPException(status_code=500, detail=f'发送测试邮件失败: {str(e)}')
+		raise HTTPException(status_code=500, detail=str(e))
+
+
+# ========== 通知发件箱 ==========
+
+
+@app.get('/api/notifications/outbox')
+async def get_notification_outbox(current_user: dict = Depends(require_admin)):
+	"""查看通知发件箱各状态的数量和死信（仅管理员）"""
+	try:
+		return {
+			'success': True,
+			'data': {'stats': await adb.get_outbox_stats(), 'dead': await adb.get_dead_notifications()},
+		}
+	except Exception as e:
+		raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post('/api/notifications/outbox/{notification_id}/retry')
+async def retry_dead_notification(notification_id: int, current_user: dict = Depends(require_admin)):
+	"""死信重新入队（仅管理员），例如修正邮件配置之后"""
+	if not await adb.retry_dead_notification(notification_id):
+		raise HTTPException(status_code=404, detail='死信不存在')
+	outbox.wake()
+	return {'success': True, 'message': '通知已重新加入发送队列'}
 
 
 # ========== 统计信息 ==========
@@ -609,24 +736,73 @@ async def get_statistics(current_user: dict = Depends(get_current_user)):
 	try:
 		# 管理员可以看所有统计，普通用户只能看自己的
 		if current_user['role'] == 'admin':
-			stats = db.get_statistics()
+			stats = await adb.get_statistics()
 		else:
-			stats = db.get_statistics(user_id=current_user['user_id'])
+			stats = await adb.get_statistics(user_id=current_user['user_id'])
 
 		return {'success': True, 'data': stats}
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=str(e))
 
 
+# ========== 定时签到计划 ==========
+
+
+@app.get('/api/schedule')
+async def get_checkin_schedule(current_user: dict = Depends(get_current_user)):
+	"""获取定时签到计划 - 每个账号在签到窗口内的偏移和下一次签到时间"""
+	try:
+		if current_user['role'] == 'admin':
+			accounts = await adb.get_all_accounts(enabled_only=True, include_secrets=False)
+		else:
+			accounts = await adb.get_all_accounts(user_id=current_user['user_id'], enabled_only=True, include_secrets=False)
+
+		scheduler_config = SchedulerConfig.load_from_env()
+		return {
+			'success': True,
+			'data': {
+				'spread_window': scheduler_config.spread_window,
+				'provider_rate_per_minute': scheduler_config.provider_rate_per_minute,
+				'accounts': get_schedule(accounts, scheduler_config),
+			},
+		}
+	except Exception as e:
+		raise HTTPException(status_code=500, detail=str(e))
+
+
 # ========== 手动签到 ==========
 
 
 @app.post('/api/checkin/{account_id}')
 async def manual_checkin(account_id: int, current_user: dict = Depends(get_current_user)):
-	"""手动触发单个账号签到"""
+	"""手动触发单个账号签到，返回的 run_id 可用于查询本次签到的耗时"""
+	run_id = uuid.uuid4().hex
+	try:
+		result = await perform_checkin(account_id, current_user, run_id)
+		return {**result, 'run_id': run_id}
+	finally:
+		# 立即写入签到结果，刷新页面即可看到
+		await adb.flush_writes()
+
+
+async def perform_checkin(account_id: int, current_user: dict, run_id: str | None = None):
+	"""执行单个账号签到，签到日志、余额、cookies 更新和各阶段耗时写入 adb.writer 缓冲，由调用方负责写入数据库
+
+	run_id 用于把同一次签到运行（单个签到或批量任务）的耗时记录归为一组，未指定时生成新的 ID
+	"""
+	run_id = run_id or uuid.uuid4().hex
+	with record_timings() as recorder:
+		try:
+			with span('total'):
+				return await _perform_checkin(account_id, current_user, run_id)
+		finally:
+			adb.writer.add_timings(run_id, account_id, recorder.spans)
+
+
+async def _perform_checkin(account_id: int, current_user: dict, run_id: str):
 	try:
 		# 获取账号信息
-		account = db.get_account(account_id)
+		account = await adb.get_account(account_id)
 		if not account:
 			raise HTTPException(status_code=404, detail='账号不存在')
 
@@ -638,7 +814,7 @@ async def manual_checkin(account_id: int, current_user: dict = Depends(get_curre
 			raise HTTPException(status_code=400, detail='账号已禁用')
 
 		# 检查用户是否过期
-		if db.check_user_expired(account['user_id']):
+		if await adb.check_user_expired(account['user_id']):
 			raise HTTPException(status_code=403, detail='用户已过期，无法签到')
 
 		# 执行签到逻辑（导入原有的签到函数）
@@ -674,14 +850,14 @@ async def manual_checkin(account_id: int, current_user: dict = Depends(get_curre
 				print(f'[API] 密码认证账号首次登录: {account["name"]}')
 				login_result = await login_anyrouter(account['username'], account['password'])
 				if not login_result or not login_result.get('success'):
-					db.add_checkin_log(account_id, False, '自动登录失败')
+					adb.writer.add_checkin_log(account_id, False, '自动登录失败')
 					raise HTTPException(status_code=400, detail='自动登录失败')
 
 				cookies = login_result['cookies']
 				api_user = login_result['api_user']
 
 				# 保存新的 cookies 和 api_user 到数据库
-				db.update_account(
+				adb.writer.update_account(
 					account_id,
 					cookies=json.dumps(cookies) if isinstance(cookies, dict) else cookies,
 					api_user=api_user
@@ -715,14 +891,14 @@ async def manual_checkin(account_id: int, current_user: dict = Depends(get_curre
 		if not success and need_login:
 			login_result = await login_anyrouter(account['username'], account['password'])
 			if not login_result or not login_result.get('success'):
-				db.add_checkin_log(account_id, False, '自动登录失败')
+				adb.writer.add_checkin_log(account_id, False, '自动登录失败')
 				raise HTTPException(status_code=400, detail='自动登录失败')
 
 			cookies = login_result['cookies']
 			api_user = login_result['api_user']
 
 			# 保存新的 cookies 和 api_user 到数据库
-			db.update_account(
+			adb.writer.update_account(
 				account_id,
 				cookies=json.dumps(cookies) if isinstance(cookies, dict) else cookies,
 				api_user=api_user
@@ -741,24 +917,17 @@ async def manual_checkin(account_id: int, current_user: dict = Depends(get_curre
 
 		# 记录日志
 		message = '签到成功' if success else '签到失败'
-		db.add_checkin_log(account_id, success, message)
+		adb.writer.add_checkin_log(account_id, success, message)
 
 		# 记录余额
 		if user_info and user_info.get('success'):
-			db.add_balance_record(account_id, user_info['quota'], user_info['used_quota'])
+			adb.writer.add_balance_record(account_id, user_info['quota'], user_info['used_quota'])
 
 		# 发送邮件通知（如果账号配置了邮箱）
 		print(f'[DEBUG] Checking email config for account: {account.get("email")}')
 		if account.get('email'):
 			print(f'[EMAIL] {account["name"]}: 检测到邮箱配置: {account["email"]}')
 			try:
-				# 每次发送邮件时创建新的 NotificationKit 实例，确保从数据库读取最新配置
-				from utils.notify import NotificationKit
-				notify = NotificationKit()
-
-				print(f'[DEBUG] notify.email_user = {notify.email_user}')
-				print(f'[DEBUG] notify.email_pass = {"configured" if notify.email_pass else "not configured"}')
-
 				status_text = 'Success' if success else 'Failed'
 				email_title = f'AnyRouter Check-in {status_text} - {account["name"]}'
 				email_content_lines = [
@@ -777,14 +946,16 @@ async def manual_checkin(account_id: int, current_user: dict = Depends(get_curre
 
 				email_content = '\n'.join(email_content_lines)
 
-				print(f'[EMAIL] {account["name"]}: 准备发送邮件到 {account["email"]}')
 				print(f'[DEBUG] Email title: {email_title}')
 				print(f'[DEBUG] Email content: {email_content}')
 
-				notify.send_email_to(account['email'], email_title, email_content, msg_type='text')
-				print(f'[EMAIL] {account["name"]}: [OK] 邮件发送成功')
+				# 写入通知发件箱，由后台 worker 发送（发送时从数据库读取最新的邮件配置），不阻塞签到响应
+				await outbox.enqueue_email(
+					f'{run_id}:account:{account_id}', account['email'], email_title, email_content, msg_type='text'
+				)
+				print(f'[EMAIL] {account["name"]}: [OK] 邮件已加入发送队列 ({account["email"]})')
 			except Exception as e:
-				print(f'[EMAIL] {account["name"]}: [FAIL] 邮件发送失败: {str(e)}')
+				print(f'[EMAIL] {account["name"]}: [FAIL] 邮件入队失败: {str(e)}')
 				import traceback
 				traceback.print_exc()
 		else:
@@ -798,43 +969,129 @@ async def manual_checkin(account_id: int, current_user: dict = Depends(get_curre
 	except HTTPException:
 		raise
 	except Exception as e:
-		db.add_checkin_log(account_id, False, f'签到异常: {str(e)[:100]}')
+		adb.writer.add_checkin_log(account_id, False, f'签到异常: {str(e)[:100]}')
 		raise HTTPException(status_code=500, detail=f'签到出错: {str(e)}')
 
 
 @app.post('/api/checkin-all')
 async def checkin_all(current_user: dict = Depends(get_current_user)):
-	"""手动触发所有账号签到 - 管理员签到所有账号，普通用户签到自己的账号"""
+	"""手动触发所有账号签到 - 管理员签到所有账号，普通用户签到自己的账号
+
+	签到在后台任务中并发执行，立即返回任务 ID，通过 /api/jobs/{job_id} 查询进度
+	或通过 /api/jobs/{job_id}/events 订阅每个账号的签到结果。任务 ID 同时也是耗时记录的 run_id。
+	"""
 	try:
 		# 管理员签到所有账号，普通用户只签到自己的
+		# 这里只需要账号 ID 和名称，不读取加密字段
 		if current_user['role'] == 'admin':
-			accounts = db.get_all_accounts(enabled_only=True)
+			accounts = await adb.get_all_accounts(enabled_only=True, include_secrets=False)
 		else:
-			accounts = db.get_all_accounts(user_id=current_user['user_id'], enabled_only=True)
+			accounts = await adb.get_all_accounts(user_id=current_user['user_id'], enabled_only=True, include_secrets=False)
 
 		# 过滤掉过期用户的账号
-		valid_accounts = [acc for acc in accounts if not db.check_user_expired(acc['user_id'])]
+		valid_accounts = [acc for acc in accounts if not await adb.check_user_expired(acc['user_id'])]
 
-		results = []
+		job = jobs.create(current_user['user_id'], len(valid_accounts))
+		job.task = asyncio.create_task(_run_checkin_all_job(job, valid_accounts, current_user))
 
-		for account in valid_accounts:
-			try:
-				# 调用单个账号签到
-				result = await manual_checkin(account['id'], current_user)
-				results.append({'account_id': account['id'], 'name': account['name'], 'success': True})
-			except Exception as e:
-				results.append({'account_id': account['id'], 'name': account['name'], 'success': False, 'error': str(e)})
-
-		success_count = sum(1 for r in results if r['success'])
 		return {
 			'success': True,
-			'message': f'签到完成: {success_count}/{len(results)} 成功',
-			'data': {'results': results, 'success_count': success_count, 'total_count': len(results)},
+			'message': f'批量签到已开始，共 {len(valid_accounts)} 个账号',
+			'data': job.to_dict(include_results=False),
 		}
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _run_checkin_all_job(job, accounts: list, current_user: dict):
+	"""后台执行批量签到，每完成一个账号就记录结果"""
+	from utils.config import AppConfig
+
+	async def worker(account: dict, index: int):
+		try:
+			# 调用单个账号签到
+			await perform_checkin(account['id'], current_user, job.id)
+			result = {'account_id': account['id'], 'name': account['name'], 'success': True}
+		except HTTPException as e:
+			result = {'account_id': account['id'], 'name': account['name'], 'success': False, 'error': e.detail}
+		except Exception as e:
+			result = {'account_id': account['id'], 'name': account['name'], 'success': False, 'error': str(e)}
+		await job.add_result(result)
+
+	try:
+		await run_bounded(
+			accounts,
+			worker,
+			max_concurrency=max(1, get_int_env('CHECKIN_ALL_CONCURRENCY', 4)),
+			per_key_limit=AppConfig.load_from_env().provider_concurrency,
+			key=lambda account: account['provider'],
+		)
+	except Exception as e:
+		print(f'[ERROR] Check-in job {job.id} failed: {e}')
+	finally:
+		# 写入缓冲中剩余的签到结果后再标记任务完成
+		await adb.flush_writes()
+		await job.finish()
+		print(f'[INFO] Check-in job {job.id} finished: {job.success_count}/{job.total} succeeded')
+
+
+def _get_job_for_user(job_id: str, current_user: dict):
+	"""获取任务并检查权限：普通用户只能查看自己发起的任务"""
+	job = jobs.get(job_id)
+	if not job:
+		raise HTTPException(status_code=404, detail='任务不存在')
+	if current_user['role'] != 'admin' and job.user_id != current_user['user_id']:
+		raise HTTPException(status_code=403, detail='无权访问此任务')
+	return job
+
+
+@app.get('/api/jobs/{job_id}')
+async def get_job(job_id: str, current_user: dict = Depends(get_current_user)):
+	"""查询批量签到任务进度"""
+	job = _get_job_for_user(job_id, current_user)
+	return {'success': True, 'data': job.to_dict()}
+
+
+@app.get('/api/jobs/{job_id}/events')
+async def get_job_events(job_id: str, current_user: dict = Depends(get_current_user)):
+	"""以 Server-Sent Events 推送批量签到任务中每个账号的结果"""
+	job = _get_job_for_user(job_id, current_user)
+	return StreamingResponse(
+		job.events(),
+		media_type='text/event-stream',
+		headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+	)
+
+
+# ========== 签到耗时 ==========
+
+
+@app.get('/api/runs/{run_id}/timings')
+async def get_run_timings(run_id: str, current_user: dict = Depends(get_current_user)):
+	"""查询一次签到运行的各阶段耗时 - 管理员看所有账号，普通用户只看自己的账号
+
+	run_id 为手动签到返回的 run_id、批量签到的任务 ID 或定时任务日志中输出的 run_id。
+	"""
+	if current_user['role'] == 'admin':
+		rows = await adb.get_run_timings(run_id)
+	else:
+		rows = await adb.get_run_timings(run_id, user_id=current_user['user_id'])
+	if not rows:
+		raise HTTPException(status_code=404, detail='没有该次签到的耗时记录')
+
+	accounts = {}
+	for row in rows:
+		account = accounts.setdefault(
+			row['account_id'], {'account_id': row['account_id'], 'account_name': row['account_name'], 'spans': []}
+		)
+		account['spans'].append({'stage': row['stage'], 'duration_ms': row['duration_ms'], 'success': bool(row['success'])})
+
+	return {
+		'success': True,
+		'data': {'run_id': run_id, 'stages': summarize_spans(rows), 'accounts': list(accounts.values())},
+	}
+
+
 if __name__ == '__main__':
 	import uvicorn
 
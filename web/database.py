@@ -3,31 +3,564 @@
 数据库模型和操作
 """
 
+import asyncio
+import atexit
+import functools
 import json
 import os
+import queue
 import sqlite3
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from datetime import datetime
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import List
 
 from cryptography.fernet import Fernet
 
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.email_digest import EMAIL_NOTIFY_MODES, normalize_email
+from utils.metrics import DB_QUERY_SECONDS
+
+
+class LazySecretRecord(dict):
+	"""账号记录 - 加密字段（password/cookies）在首次访问时才解密
+
+	未访问的加密字段不占用字典的实际存储，只记录密文；读取、遍历、复制等操作
+	与普通 dict 行为一致，需要值的操作会先完成解密。
+	"""
+
+	def __init__(self, data: dict, encrypted: dict, decrypt):
+		super().__init__(data)
+		self._encrypted = encrypted
+		self._decrypt = decrypt
+
+	def __missing__(self, key):
+		if key not in self._encrypted:
+			raise KeyError(key)
+		value = self._decrypt(self._encrypted.pop(key))
+		dict.__setitem__(self, key, value)
+		return value
+
+	def _materialize(self):
+		"""解密所有尚未解密的字段"""
+		for key in list(self._encrypted):
+			self[key]
+
+	def __contains__(self, key):
+		return dict.__contains__(self, key) or key in self._encrypted
+
+	def __iter__(self):
+		yield from dict.__iter__(self)
+		yield from list(self._encrypted)
+
+	def __len__(self):
+		return dict.__len__(self) + len(self._encrypted)
+
+	def __setitem__(self, key, value):
+		self._encrypted.pop(key, None)
+		dict.__setitem__(self, key, value)
+
+	def __delitem__(self, key):
+		if self._encrypted.pop(key, None) is None:
+			dict.__delitem__(self, key)
+
+	def __eq__(self, other):
+		self._materialize()
+		return dict.__eq__(self, other)
+
+	__hash__ = None
+
+	def __repr__(self):
+		self._materialize()
+		return dict.__repr__(self)
+
+	def get(self, key, default=None):
+		return self[key] if key in self else default
+
+	def pop(self, key, *default):
+		if key in self._encrypted:
+			self[key]
+		return dict.pop(self, key, *default)
+
+	def setdefault(self, key, default=None):
+		if key not in self:
+			self[key] = default
+		return self[key]
+
+	def update(self, *args, **kwargs):
+		for key, value in dict(*args, **kwargs).items():
+			self[key] = value
+
+	def keys(self):
+		self._materialize()
+		return dict.keys(self)
+
+	def values(self):
+		self._materialize()
+		return dict.values(self)
+
+	def items(self):
+		self._materialize()
+		return dict.items(self)
+
+	def copy(self) -> dict:
+		self._materialize()
+		return dict(dict.items(self))
+
+
+def default_pool_size() -> int:
+	"""连接池大小（DATABASE_POOL_SIZE，默认 5）"""
+	return int(os.getenv('DATABASE_POOL_SIZE', '5'))
+
+
+# 还没有关闭的写缓冲（弱引用，关闭或被回收后自动移除），进程退出时统一写入剩余记录
+_open_writers: 'weakref.WeakSet[WriteBehindWriter]' = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_open_writers():
+	for writer in list(_open_writers):
+		writer._flush_safely()
+
+
+class WriteBehindWriter:
+	"""签到结果写缓冲 - 签到日志、余额记录、账号更新和耗时记录先放入内存，再批量在一个事务中写入
+
+	缓冲达到 max_items 条，或第一条未写入的记录等待超过 flush_interval_ms 毫秒时，在后台线程写入；
+	调用 flush() 立即写入。进程退出时会自动写入剩余记录。max_items 为 0 时不缓冲，每次调用都直接写入。
+	"""
+
+	def __init__(self, database: 'Database', max_items: int = None, flush_interval_ms: int = None):
+		self._database = database
+		self.max_items = max_items if max_items is not None else int(os.getenv('DATABASE_WRITE_BATCH_SIZE', '100'))
+		if flush_interval_ms is None:
+			flush_interval_ms = int(os.getenv('DATABASE_WRITE_FLUSH_MS', '1000'))
+		self.flush_interval = flush_interval_ms / 1000
+		self._logs: list[tuple] = []
+		self._balances: list[tuple] = []
+		self._account_updates: list[tuple] = []
+		self._timings: list[tuple] = []
+		self._lock = threading.Lock()  # 保护缓冲区
+		self._flush_lock = threading.Lock()  # 同一时刻只有一个线程在写入
+		self._timer: threading.Timer | None = None
+		self._flush_started = False  # 已经启动了后台写入线程，但还没有取走缓冲区
+		_open_writers.add(self)
+
+	@property
+	def pending(self) -> int:
+		"""尚未写入的记录数"""
+		return len(self._logs) + len(self._balances) + len(self._account_updates) + len(self._timings)
+
+	@staticmethod
+	def _now() -> str:
+		# 与 SQLite 的 CURRENT_TIMESTAMP 格式一致（UTC），记录的是调用时间而不是写入时间
+		return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+	def add_checkin_log(self, account_id: int, success: bool, message: str = None):
+		"""缓冲一条签到日志"""
+		self._add('_logs', (account_id, 1 if success else 0, message, self._now()))
+
+	def add_balance_record(self, account_id: int, quota: float, used_quota: float):
+		"""缓冲一条余额记录"""
+		self._add('_balances', (account_id, quota, used_quota, self._now()))
+
+	def update_account(self, account_id: int, **fields):
+		"""缓冲一次账号更新，参数与 Database.update_account 相同"""
+		self._add('_account_updates', (account_id, fields))
+
+	def add_timings(self, run_id: str, account_id: int, spans: list[dict]):
+		"""缓冲一个账号在一次签到运行中的各阶段耗时（utils.timing 记录的 spans）"""
+		if spans:
+			self._add('_timings', (run_id, account_id, spans, self._now()))
+
+	def _add(self, buffer: str, item: tuple):
+		with self._lock:
+			# 在锁内取缓冲区，flush() 可能刚刚把它换成了新的列表
+			getattr(self, buffer).append(item)
+			if self.max_items <= 0:
+				flush_now = True
+			else:
+				flush_now = False
+				if self.pending >= self.max_items:
+					# 写入线程取走缓冲区之前只启动一个，避免每条新记录都启动线程写入零碎的小批次
+					if not self._flush_started:
+						self._flush_started = True
+						self._cancel_timer()
+						threading.Thread(target=self._flush_safely, name='database-writer', daemon=True).start()
+				elif self._timer is None:
+					self._timer = threading.Timer(self.flush_interval, self._flush_safely)
+					self._timer.daemon = True
+					self._timer.start()
+		if flush_now:
+			self.flush()
+
+	def _cancel_timer(self):
+		if self._timer is not None:
+			self._timer.cancel()
+			self._timer = None
+
+	def _flush_safely(self):
+		try:
+			self.flush()
+		except Exception as e:
+			print(f'[DATABASE] Failed to flush buffered writes: {e}')
+
+	def close(self):
+		"""写入剩余记录，之后进程退出时不再处理这个写缓冲"""
+		_open_writers.discard(self)
+		self.flush()
+
+	def flush(self) -> int:
+		"""把缓冲的记录在一个事务中写入数据库，返回写入的记录数"""
+		with self._flush_lock:
+			with self._lock:
+				self._cancel_timer()
+				self._flush_started = False
+				logs, balances, updates, timings = self._logs, self._balances, self._account_updates, self._timings
+				self._logs, self._balances, self._account_updates, self._timings = [], [], [], []
+
+			if not (logs or balances or updates or timings):
+				return 0
+
+			start = time.perf_counter()
+			try:
+				self._database._write_batch(logs, balances, updates, timings)
+			except Exception:
+				# 写入失败时放回缓冲区，下次写入时重试
+				with self._lock:
+					self._logs[:0] = logs
+					self._balances[:0] = balances
+					self._account_updates[:0] = updates
+					self._timings[:0] = timings
+				raise
+			finally:
+				DB_QUERY_SECONDS.labels(method='_write_batch').observe(time.perf_counter() - start)
+			return len(logs) + len(balances) + len(updates) + len(timings)
+
+
+# ========== 数据库迁移 ==========
+# 每个迁移只执行一次，执行后 PRAGMA user_version 记录已应用的迁移数。
+# 引入版本号之前创建的数据库 user_version 为 0，可能已经有部分表和字段，所以迁移都要可以重复执行。
+
+
+def _table_columns(cursor: sqlite3.Cursor, table: str) -> list[str]:
+	cursor.execute(f'PRAGMA table_info({table})')
+	return [col[1] for col in cursor.fetchall()]
+
+
+def _migration_initial_schema(db: 'Database', cursor: sqlite3.Cursor):
+	"""用户、账号、系统配置、签到记录和余额历史表，以及旧版账号表的升级"""
+	# 用户表
+	cursor.execute(
+		'''
+		CREATE TABLE IF NOT EXISTS users (
+			id INTEGER PRIMARY KEY AUTOINCREMENT,
+			username TEXT UNIQUE NOT NULL,
+			password TEXT NOT NULL,
+			role TEXT DEFAULT 'user',
+			display_name TEXT NOT NULL,
+			expire_date DATE,
+			enabled INTEGER DEFAULT 1,
+			created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+			updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+		)
+		'''
+	)
+
+	# 创建默认超管账号：admin / admin123
+	cursor.execute("SELECT COUNT(*) FROM users WHERE role = 'admin'")
+	if cursor.fetchone()[0] == 0:
+		cursor.execute(
+			'''
+			INSERT INTO users (username, password, role, display_name, enabled)
+			VALUES (?, ?, 'admin', '超级管理员', 1)
+			''',
+			('admin', db._encrypt('admin123')),
+		)
+		print('[DATABASE] Created default admin user: admin / admin123')
+
+	# 账号表
+	cursor.execute(
+		'''
+		CREATE TABLE IF NOT EXISTS accounts (
+			id INTEGER PRIMARY KEY AUTOINCREMENT,
+			name TEXT NOT NULL,
+			username TEXT,
+			password TEXT,
+			cookies TEXT,
+			api_user TEXT,
+			auth_type TEXT DEFAULT 'password',
+			provider TEXT DEFAULT 'anyrouter',
+			enabled INTEGER DEFAULT 1,
+			created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+			updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+		)
+		'''
+	)
+
+	# 旧版账号表只支持账号密码登录，添加 Cookies 认证字段
+	if 'cookies' not in _table_columns(cursor, 'accounts'):
+		cursor.execute('ALTER TABLE accounts ADD COLUMN cookies TEXT')
+		cursor.execute('ALTER TABLE accounts ADD COLUMN api_user TEXT')
+		cursor.execute("ALTER TABLE accounts ADD COLUMN auth_type TEXT DEFAULT 'password'")
+		print('[DATABASE] Added new fields for dual auth support')
+
+	# 旧版 username 字段有 NOT NULL 约束，SQLite 不支持直接修改约束，需要重建表
+	cursor.execute('PRAGMA table_info(accounts)')
+	if any(col[1] == 'username' and col[3] == 1 for col in cursor.fetchall()):
+		print('[DATABASE] Migrating to remove NOT NULL constraint from username...')
+		cursor.execute(
+			'''
+			CREATE TABLE accounts_new (
+				id INTEGER PRIMARY KEY AUTOINCREMENT,
+				name TEXT NOT NULL,
+				username TEXT,
+				password TEXT,
+				cookies TEXT,
+				api_user TEXT,
+				auth_type TEXT DEFAULT 'password',
+				provider TEXT DEFAULT 'anyrouter',
+				enabled INTEGER DEFAULT 1,
+				created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+				updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+			)
+			'''
+		)
+		# 只复制旧表中存在的列
+		old_columns = _table_columns(cursor, 'accounts')
+		copy_columns = [
+			col
+			for col in ['id', 'name', 'username', 'password', 'cookies', 'api_user', 'auth_type', 'provider', 'enabled', 'created_at', 'updated_at']
+			if col in old_columns
+		]  # fmt: skip
+		cursor.execute(
+			f'''
+			INSERT INTO accounts_new ({', '.join(copy_columns)})
+			SELECT {', '.join(copy_columns)}
+			FROM accounts
+			'''
+		)
+		cursor.execute('DROP TABLE accounts')
+		cursor.execute('ALTER TABLE accounts_new RENAME TO accounts')
+		print('[DATABASE] Migration completed: username is now nullable')
+
+	# 多租户支持：已有账号归属默认超管
+	columns = _table_columns(cursor, 'accounts')
+	if 'user_id' not in columns:
+		print('[DATABASE] Migrating accounts table to add user_id field...')
+		cursor.execute("SELECT id FROM users WHERE role = 'admin' LIMIT 1")
+		admin_id = cursor.fetchone()[0]
+		cursor.execute(f'ALTER TABLE accounts ADD COLUMN user_id INTEGER DEFAULT {admin_id}')
+		print(f'[DATABASE] Added user_id field, existing accounts assigned to admin (ID: {admin_id})')
+
+	# 个人邮件通知支持
+	if 'email' not in columns:
+		cursor.execute('ALTER TABLE accounts ADD COLUMN email TEXT')
+		print('[DATABASE] Added email field for per-account notifications')
+
+	# 系统配置表
+	cursor.execute(
+		'''
+		CREATE TABLE IF NOT EXISTS system_config (
+			id INTEGER PRIMARY KEY AUTOINCREMENT,
+			config_key TEXT UNIQUE NOT NULL,
+			config_value TEXT,
+			description TEXT,
+			updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+		)
+		'''
+	)
+
+	# 签到记录表
+	cursor.execute(
+		'''
+		CREATE TABLE IF NOT EXISTS checkin_logs (
+			id INTEGER PRIMARY KEY AUTOINCREMENT,
+			account_id INTEGER NOT NULL,
+			success INTEGER NOT NULL,
+			message TEXT,
+			created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+			FOREIGN KEY (account_id) REFERENCES accounts(id) ON DELETE CASCADE
+		)
+		'''
+	)
+
+	# 余额历史表
+	cursor.execute(
+		'''
+		CREATE TABLE IF NOT EXISTS balance_history (
+			id INTEGER PRIMARY KEY AUTOINCREMENT,
+			account_id INTEGER NOT NULL,
+			quota REAL NOT NULL,
+			used_quota REAL NOT NULL,
+			created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+			FOREIGN KEY (account_id) REFERENCES accounts(id) ON DELETE CASCADE
+		)
+		'''
+	)
+
+
+def _migration_composite_indexes(db: 'Database', cursor: sqlite3.Cursor):
+	"""查询用的复合索引（已覆盖单列 account_id 索引，旧索引删除）"""
+	cursor.execute('DROP INDEX IF EXISTS idx_checkin_logs_account')
+	cursor.execute('DROP INDEX IF EXISTS idx_balance_history_account')
+	cursor.execute(
+		'CREATE INDEX IF NOT EXISTS idx_checkin_logs_account_created ON checkin_logs(account_id, created_at, success)'
+	)
+	cursor.execute('CREATE INDEX IF NOT EXISTS idx_checkin_logs_created ON checkin_logs(created_at, success)')
+	cursor.execute(
+		'CREATE INDEX IF NOT EXISTS idx_balance_history_account_created ON balance_history(account_id, created_at)'
+	)
+	cursor.execute('CREATE INDEX IF NOT EXISTS idx_accounts_user ON accounts(user_id)')
+
+
+def _migration_latest_balance(db: 'Database', cursor: sqlite3.Cursor):
+	"""最新余额表（每个账号一行，随 add_balance_record 同步更新，避免统计时扫描全部历史）"""
+	cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'account_latest_balance'")
+	if cursor.fetchone() is not None:
+		return
+	cursor.execute(
+		'''
+		CREATE TABLE account_latest_balance (
+			account_id INTEGER PRIMARY KEY,
+			balance_id INTEGER NOT NULL,
+			quota REAL NOT NULL,
+			used_quota REAL NOT NULL,
+			created_at TIMESTAMP NOT NULL,
+			FOREIGN KEY (account_id) REFERENCES accounts(id) ON DELETE CASCADE
+		)
+		'''
+	)
+	# 从余额历史回填
+	cursor.execute(
+		'''
+		INSERT INTO account_latest_balance (account_id, balance_id, quota, used_quota, created_at)
+		SELECT account_id, id, quota, used_quota, created_at
+		FROM (
+			SELECT id, account_id, quota, used_quota, created_at,
+				ROW_NUMBER() OVER (PARTITION BY account_id ORDER BY created_at DESC, id DESC) AS rn
+			FROM balance_history
+		)
+		WHERE rn = 1
+		'''
+	)
+	if cursor.rowcount > 0:
+		print(f'[DATABASE] Backfilled latest balance for {cursor.rowcount} account(s)')
+
+
+def _migration_checkin_timings(db: 'Database', cursor: sqlite3.Cursor):
+	"""签到耗时表（每次签到运行中每个账号每个阶段一行）"""
+	cursor.execute(
+		'''
+		CREATE TABLE IF NOT EXISTS checkin_timings (
+			id INTEGER PRIMARY KEY AUTOINCREMENT,
+			run_id TEXT NOT NULL,
+			account_id INTEGER NOT NULL,
+			stage TEXT NOT NULL,
+			duration_ms REAL NOT NULL,
+			success INTEGER NOT NULL,
+			created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+			FOREIGN KEY (account_id) REFERENCES accounts(id) ON DELETE CASCADE
+		)
+		'''
+	)
+	cursor.execute('CREATE INDEX IF NOT EXISTS idx_checkin_timings_run ON checkin_timings(run_id, account_id)')
+
+
+def _migration_email_preferences(db: 'Database', cursor: sqlite3.Cursor):
+	"""邮件发送方式表（每个收件人一行，没有记录时使用 EMAIL_NOTIFY_MODE）"""
+	cursor.execute(
+		'''
+		CREATE TABLE IF NOT EXISTS email_preferences (
+			email TEXT PRIMARY KEY,
+			mode TEXT NOT NULL,
+			updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+		)
+		'''
+	)
+
+
+def _migration_notification_outbox(db: 'Database', cursor: sqlite3.Cursor):
+	"""通知发件箱（签到只写入待发送的通知，由 web/outbox.py 的 worker 发送）"""
+	# status: pending 等待发送 / sending 发送中（租约到期前不会被其他 worker 领取）/ sent 已发送 / dead 死信
+	cursor.execute(
+		'''
+		CREATE TABLE IF NOT EXISTS notification_outbox (
+			id INTEGER PRIMARY KEY AUTOINCREMENT,
+			idempotency_key TEXT UNIQUE NOT NULL,
+			kind TEXT NOT NULL,
+			recipient TEXT NOT NULL,
+			title TEXT NOT NULL,
+			content TEXT NOT NULL,
+			msg_type TEXT NOT NULL DEFAULT 'text',
+			status TEXT NOT NULL DEFAULT 'pending',
+			attempts INTEGER NOT NULL DEFAULT 0,
+			next_attempt_at REAL NOT NULL,
+			last_error TEXT,
+			created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+			updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+		)
+		'''
+	)
+	cursor.execute(
+		'CREATE INDEX IF NOT EXISTS idx_notification_outbox_due ON notification_outbox(status, next_attempt_at)'
+	)
+
+
+# 按顺序执行，第 N 个迁移执行后 user_version 为 N。只能在末尾追加，不能修改或删除已发布的迁移
+MIGRATIONS = [
+	_migration_initial_schema,
+	_migration_composite_indexes,
+	_migration_latest_balance,
+	_migration_checkin_timings,
+	_migration_email_preferences,
+	_migration_notification_outbox,
+]
+
 
 class Database:
-	def __init__(self, db_path: str = None, key_path: str = None):
+	# 不含敏感信息的账号字段，列表类查询只读取这些列
+	PUBLIC_ACCOUNT_COLUMNS = (
+		'id', 'user_id', 'name', 'username', 'api_user', 'auth_type', 'provider',
+		'enabled', 'email', 'created_at', 'updated_at',
+	)  # fmt: skip
+	SECRET_ACCOUNT_FIELDS = ('password', 'cookies')
+
+	def __init__(self, db_path: str = None, key_path: str = None, pool_size: int = None):
 		# 支持通过环境变量配置数据库路径
 		self.db_path = db_path or os.getenv('DATABASE_PATH', 'data/checkin.db')
 		self.key_path = key_path or os.getenv('DATABASE_KEY_PATH', 'data/secret.key')
 
+		# 连接池配置：pool_size 为 0 时每次调用都新建连接
+		self.pool_size = pool_size if pool_size is not None else default_pool_size()
+		self.busy_timeout = int(os.getenv('DATABASE_BUSY_TIMEOUT', '5000'))  # 毫秒
+		self._pool = queue.LifoQueue(maxsize=self.pool_size) if self.pool_size > 0 else None
+
+		# 解密结果缓存（按密文索引），为 0 时不缓存
+		self.decrypt_cache_size = int(os.getenv('DATABASE_DECRYPT_CACHE_SIZE', '256'))
+		self._decrypt_cache: OrderedDict[str, str] = OrderedDict()
+		self._decrypt_cache_lock = threading.Lock()
+
+		# 签到结果写缓冲
+		self.writer = WriteBehindWriter(self)
+
 		# 确保数据目录存在
 		Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
 
 		# 初始化加密密钥
 		self._init_encryption_key()
 
-		# 初始化数据库
-		self._init_database()
+		# 创建或升级数据库表
+		self._migrate()
 
 	def _init_encryption_key(self):
 		"""初始化或加载加密密钥"""
@@ -47,14 +580,69 @@ class Database:
 		return self.cipher.encrypt(text.encode()).decode()
 
 	def _decrypt(self, encrypted_text: str) -> str:
-		"""解密文本"""
-		return self.cipher.decrypt(encrypted_text.encode()).decode()
+		"""解密文本（结果按密文缓存，LRU 淘汰）"""
+		if self.decrypt_cache_size <= 0:
+			return self.cipher.decrypt(encrypted_text.encode()).decode()
+
+		with self._decrypt_cache_lock:
+			text = self._decrypt_cache.get(encrypted_text)
+			if text is not None:
+				self._decrypt_cache.move_to_end(encrypted_text)
+				return text
+
+		text = self.cipher.decrypt(encrypted_text.encode()).decode()
+		with self._decrypt_cache_lock:
+			self._decrypt_cache[encrypted_text] = text
+			self._decrypt_cache.move_to_end(encrypted_text)
+			while len(self._decrypt_cache) > self.decrypt_cache_size:
+				self._decrypt_cache.popitem(last=False)
+		return text
+
+	def _account_from_row(self, row: sqlite3.Row) -> dict:
+		"""把账号行转换为记录，敏感字段延迟到首次访问时解密"""
+		data = dict(row)
+		encrypted = {}
+		for field in self.SECRET_ACCOUNT_FIELDS:
+			if data.get(field):
+				encrypted[field] = data.pop(field)
+		if not encrypted:
+			return data
+		return LazySecretRecord(data, encrypted, self._decrypt)
+
+	def _connect(self) -> sqlite3.Connection:
+		"""新建数据库连接并设置 PRAGMA"""
+		# check_same_thread=False：连接会被归还到池中，由不同线程轮流使用（同一时刻只有一个线程持有）
+		conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout / 1000, check_same_thread=False)
+		conn.row_factory = sqlite3.Row
+		# WAL 模式下读写互不阻塞，调度器进程和 Web 进程可以同时访问
+		conn.execute('PRAGMA journal_mode=WAL')
+		conn.execute('PRAGMA synchronous=NORMAL')
+		conn.execute(f'PRAGMA busy_timeout={self.busy_timeout}')
+		conn.execute('PRAGMA cache_size=-16000')  # 约 16 MB 页缓存
+		conn.execute('PRAGMA mmap_size=268435456')  # 256 MB 内存映射
+		return conn
+
+	def _acquire_connection(self) -> sqlite3.Connection:
+		if self._pool is not None:
+			try:
+				return self._pool.get_nowait()
+			except queue.Empty:
+				pass
+		return self._connect()
+
+	def _release_connection(self, conn: sqlite3.Connection):
+		if self._pool is not None:
+			try:
+				self._pool.put_nowait(conn)
+				return
+			except queue.Full:
+				pass
+		conn.close()
 
 	@contextmanager
 	def get_connection(self):
-		"""获取数据库连接"""
-		conn = sqlite3.connect(self.db_path)
-		conn.row_factory = sqlite3.Row
+		"""获取数据库连接（从连接池借出，使用完毕后归还）"""
+		conn = self._acquire_connection()
 		try:
 			yield conn
 			conn.commit()
@@ -62,204 +650,46 @@ class Database:
 			conn.rollback()
 			raise
 		finally:
-			conn.close()
-
-	def _init_database(self):
-		"""初始化数据库表"""
-		with self.get_connection() as conn:
-			cursor = conn.cursor()
-
-			# 用户表（新增）
-			cursor.execute(
-				'''
-				CREATE TABLE IF NOT EXISTS users (
-					id INTEGER PRIMARY KEY AUTOINCREMENT,
-					username TEXT UNIQUE NOT NULL,
-					password TEXT NOT NULL,
-					role TEXT DEFAULT 'user',
-					display_name TEXT NOT NULL,
-					expire_date DATE,
-					enabled INTEGER DEFAULT 1,
-					created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-					updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-				)
-				'''
-			)
-
-			# 检查并创建默认超管账号
-			cursor.execute("SELECT COUNT(*) FROM users WHERE role = 'admin'")
-			admin_count = cursor.fetchone()[0]
-			if admin_count == 0:
-				# 创建默认超管：admin / admin123
-				default_password = self._encrypt('admin123')
-				cursor.execute(
-					'''
-					INSERT INTO users (username, password, role, display_name, enabled)
-					VALUES (?, ?, 'admin', '超级管理员', 1)
-					''',
-					('admin', default_password),
-				)
-				print('[DATABASE] Created default admin user: admin / admin123')
-
-			# 账号表
-			cursor.execute(
-				'''
-                CREATE TABLE IF NOT EXISTS accounts (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    username TEXT,
-                    password TEXT,
-                    cookies TEXT,
-                    api_user TEXT,
-                    auth_type TEXT DEFAULT 'password',
-                    provider TEXT DEFAULT 'anyrouter',
-                    enabled INTEGER DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            '''
-			)
-
-			# 检查并添加新字段（用于数据库升级）
-			try:
-				cursor.execute("SELECT cookies FROM accounts LIMIT 1")
-			except Exception:
-				# 字段不存在，添加新字段
-				cursor.execute("ALTER TABLE accounts ADD COLUMN cookies TEXT")
-				cursor.execute("ALTER TABLE accounts ADD COLUMN api_user TEXT")
-				cursor.execute("ALTER TABLE accounts ADD COLUMN auth_type TEXT DEFAULT 'password'")
-				print('[DATABASE] Added new fields for dual auth support')
-
-			# 检查并修复 username 字段的 NOT NULL 约束
-			# SQLite 不支持直接修改约束，需要重建表
+			self._release_connection(conn)
+
+	def close(self):
+		"""写入缓冲的记录并关闭连接池中的所有连接"""
+		self.writer.close()
+		if self._pool is None:
+			return
+		while True:
 			try:
-				# 检查是否存在 NOT NULL 约束问题
-				cursor.execute("PRAGMA table_info(accounts)")
-				columns = cursor.fetchall()
-				username_col = [col for col in columns if col[1] == 'username']
-
-				if username_col and username_col[0][3] == 1:  # notnull = 1
-					print('[DATABASE] Migrating to remove NOT NULL constraint from username...')
-
-					# 重建表
-					cursor.execute(
-						'''
-						CREATE TABLE accounts_new (
-							id INTEGER PRIMARY KEY AUTOINCREMENT,
-							name TEXT NOT NULL,
-							username TEXT,
-							password TEXT,
-							cookies TEXT,
-							api_user TEXT,
-							auth_type TEXT DEFAULT 'password',
-							provider TEXT DEFAULT 'anyrouter',
-							enabled INTEGER DEFAULT 1,
-							created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-							updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-						)
-						'''
-					)
-
-					# 复制数据 - 检查列是否存在
-					cursor.execute("PRAGMA table_info(accounts)")
-					old_columns = [col[1] for col in cursor.fetchall()]
-
-					# 构建列名列表（只复制存在的列）
-					copy_columns = []
-					for col in ['id', 'name', 'username', 'password', 'cookies', 'api_user', 'auth_type', 'provider', 'enabled', 'created_at', 'updated_at']:
-						if col in old_columns:
-							copy_columns.append(col)
-
-					copy_sql = f'''
-						INSERT INTO accounts_new ({', '.join(copy_columns)})
-						SELECT {', '.join(copy_columns)}
-						FROM accounts
-					'''
-					cursor.execute(copy_sql)
-
-					# 删除旧表
-					cursor.execute('DROP TABLE accounts')
-
-					# 重命名新表
-					cursor.execute('ALTER TABLE accounts_new RENAME TO accounts')
+				self._pool.get_nowait().close()
+			except queue.Empty:
+				break
 
-					print('[DATABASE] Migration completed: username is now nullable')
-			except Exception as e:
-				print(f'[DATABASE] Migration check: {e}')
+	def _migrate(self):
+		"""应用未执行的迁移（已是最新版本时只读取一次 PRAGMA user_version）"""
+		conn = self._acquire_connection()
+		try:
+			if conn.execute('PRAGMA user_version').fetchone()[0] >= len(MIGRATIONS):
+				return
 
-			# 添加 user_id 字段到 accounts 表（多租户支持）
+			# 手动管理事务：BEGIN IMMEDIATE 先拿到写锁，调度器和 Web 进程同时启动时只有一个进程执行迁移，
+			# 另一个进程等待锁释放后重新读取版本号，不会重复执行
+			conn.isolation_level = None
+			conn.execute('BEGIN IMMEDIATE')
 			try:
-				cursor.execute("SELECT user_id FROM accounts LIMIT 1")
+				version = conn.execute('PRAGMA user_version').fetchone()[0]
+				cursor = conn.cursor()
+				for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+					print(f'[DATABASE] Applying migration {number}: {migration.__name__.removeprefix("_migration_")}')
+					migration(self, cursor)
+				# PRAGMA 不支持参数绑定；user_version 与迁移在同一个事务中提交
+				conn.execute(f'PRAGMA user_version = {max(version, len(MIGRATIONS))}')
+				conn.execute('COMMIT')
 			except Exception:
-				# user_id 字段不存在，需要添加
-				print('[DATABASE] Migrating accounts table to add user_id field...')
-
-				# 获取默认超管ID
-				cursor.execute("SELECT id FROM users WHERE role = 'admin' LIMIT 1")
-				admin_user = cursor.fetchone()
-				if admin_user:
-					admin_id = admin_user[0]
-					# 添加字段，默认值为超管ID
-					cursor.execute(f"ALTER TABLE accounts ADD COLUMN user_id INTEGER DEFAULT {admin_id}")
-					print(f'[DATABASE] Added user_id field, existing accounts assigned to admin (ID: {admin_id})')
-				else:
-					# 如果没有超管，添加可空字段
-					cursor.execute("ALTER TABLE accounts ADD COLUMN user_id INTEGER")
-					print('[DATABASE] Added user_id field (nullable)')
-
-			# 添加 email 字段到 accounts 表（个人邮件通知支持）
-			try:
-				cursor.execute("SELECT email FROM accounts LIMIT 1")
-			except Exception:
-				# email 字段不存在，需要添加
-				print('[DATABASE] Migrating accounts table to add email field...')
-				cursor.execute("ALTER TABLE accounts ADD COLUMN email TEXT")
-				print('[DATABASE] Added email field for per-account notifications')
-
-			# 系统配置表
-			cursor.execute(
-				'''
-				CREATE TABLE IF NOT EXISTS system_config (
-					id INTEGER PRIMARY KEY AUTOINCREMENT,
-					config_key TEXT UNIQUE NOT NULL,
-					config_value TEXT,
-					description TEXT,
-					updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-				)
-				'''
-			)
-
-			# 签到记录表
-			cursor.execute(
-				'''
-                CREATE TABLE IF NOT EXISTS checkin_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    account_id INTEGER NOT NULL,
-                    success INTEGER NOT NULL,
-                    message TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (account_id) REFERENCES accounts(id) ON DELETE CASCADE
-                )
-            '''
-			)
-
-			# 余额历史表
-			cursor.execute(
-				'''
-                CREATE TABLE IF NOT EXISTS balance_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    account_id INTEGER NOT NULL,
-                    quota REAL NOT NULL,
-                    used_quota REAL NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (account_id) REFERENCES accounts(id) ON DELETE CASCADE
-                )
-            '''
-			)
-
-			# 创建索引
-			cursor.execute('CREATE INDEX IF NOT EXISTS idx_checkin_logs_account ON checkin_logs(account_id)')
-			cursor.execute('CREATE INDEX IF NOT EXISTS idx_balance_history_account ON balance_history(account_id)')
+				conn.execute('ROLLBACK')
+				raise
+			finally:
+				conn.isolation_level = ''
+		finally:
+			self._release_connection(conn)
 
 	# ========== 用户管理 ==========
 
@@ -418,55 +848,68 @@ class Database:
 	def update_account(self, account_id: int, name: str = None, password: str = None, cookies: str = None, api_user: str = None, provider: str = None, enabled: bool = None, email: str = None):
 		"""更新账号信息 - 支持两种认证方式"""
 		with self.get_connection() as conn:
-			cursor = conn.cursor()
-			updates = []
-			params = []
-
-			if name is not None:
-				updates.append('name = ?')
-				params.append(name)
-
-			# 密码认证：更新密码
-			if password is not None:
-				updates.append('password = ?')
-				params.append(self._encrypt(password))
-
-			# Cookies 认证：更新 cookies 和 api_user
-			if cookies is not None:
-				# 确保 cookies 是字符串格式
-				if isinstance(cookies, dict):
-					import json
-					cookies = json.dumps(cookies)
-				updates.append('cookies = ?')
-				params.append(self._encrypt(cookies))
-
-			if api_user is not None:
-				updates.append('api_user = ?')
-				params.append(api_user)
-
-			if provider is not None:
-				updates.append('provider = ?')
-				params.append(provider)
-
-			if enabled is not None:
-				updates.append('enabled = ?')
-				params.append(1 if enabled else 0)
-
-			# 更新邮箱（允许设置为空）
-			if email is not None:
-				updates.append('email = ?')
-				params.append(email if email else None)
+			self._execute_account_update(
+				conn.cursor(),
+				account_id,
+				name=name,
+				password=password,
+				cookies=cookies,
+				api_user=api_user,
+				provider=provider,
+				enabled=enabled,
+				email=email,
+			)
 
-			if updates:
-				updates.append('updated_at = CURRENT_TIMESTAMP')
-				params.append(account_id)
-				cursor.execute(f"UPDATE accounts SET {', '.join(updates)} WHERE id = ?", params)
+	def _execute_account_update(self, cursor, account_id: int, name: str = None, password: str = None, cookies: str = None, api_user: str = None, provider: str = None, enabled: bool = None, email: str = None):
+		"""在给定的游标上执行账号更新，只更新不为 None 的字段"""
+		updates = []
+		params = []
+
+		if name is not None:
+			updates.append('name = ?')
+			params.append(name)
+
+		# 密码认证：更新密码
+		if password is not None:
+			updates.append('password = ?')
+			params.append(self._encrypt(password))
+
+		# Cookies 认证：更新 cookies 和 api_user
+		if cookies is not None:
+			# 确保 cookies 是字符串格式
+			if isinstance(cookies, dict):
+				cookies = json.dumps(cookies)
+			updates.append('cookies = ?')
+			params.append(self._encrypt(cookies))
+
+		if api_user is not None:
+			updates.append('api_user = ?')
+			params.append(api_user)
+
+		if provider is not None:
+			updates.append('provider = ?')
+			params.append(provider)
+
+		if enabled is not None:
+			updates.append('enabled = ?')
+			params.append(1 if enabled else 0)
+
+		# 更新邮箱（允许设置为空）
+		if email is not None:
+			updates.append('email = ?')
+			params.append(email if email else None)
+
+		if updates:
+			updates.append('updated_at = CURRENT_TIMESTAMP')
+			params.append(account_id)
+			cursor.execute(f"UPDATE accounts SET {', '.join(updates)} WHERE id = ?", params)
 
 	def delete_account(self, account_id: int):
 		"""删除账号"""
 		with self.get_connection() as conn:
 			cursor = conn.cursor()
 			cursor.execute('DELETE FROM accounts WHERE id = ?', (account_id,))
+			cursor.execute('DELETE FROM account_latest_balance WHERE account_id = ?', (account_id,))
 
 	def get_account(self, account_id: int) -> dict | None:
 		"""获取单个账号"""
@@ -475,21 +918,19 @@ class Database:
 			cursor.execute('SELECT * FROM accounts WHERE id = ?', (account_id,))
 			row = cursor.fetchone()
 			if row:
-				account = dict(row)
-				# 解密敏感字段
-				if account.get('password'):
-					account['password'] = self._decrypt(account['password'])
-				if account.get('cookies'):
-					account['cookies'] = self._decrypt(account['cookies'])
-				return account
+				return self._account_from_row(row)
 			return None
 
-	def get_all_accounts(self, user_id: int = None, enabled_only: bool = False) -> List[dict]:
-		"""获取所有账号 - 支持按用户筛选"""
+	def get_all_accounts(self, user_id: int = None, enabled_only: bool = False, include_secrets: bool = True) -> List[dict]:
+		"""获取所有账号 - 支持按用户筛选
+
+		include_secrets 为 False 时不读取密码和 cookies 列，适用于只需要账号基本信息的列表场景
+		"""
 		with self.get_connection() as conn:
 			cursor = conn.cursor()
 
-			sql = 'SELECT * FROM accounts WHERE 1=1'
+			columns = '*' if include_secrets else ', '.join(self.PUBLIC_ACCOUNT_COLUMNS)
+			sql = f'SELECT {columns} FROM accounts WHERE 1=1'
 			params = []
 
 			if user_id is not None:
@@ -503,14 +944,44 @@ class Database:
 
 			cursor.execute(sql, params)
 
+			return [self._account_from_row(row) for row in cursor.fetchall()]
+
+	def get_accounts_with_balance(self, user_id: int = None) -> List[dict]:
+		"""获取账号列表及每个账号的最新余额（单次查询，不包含密码和 cookies）"""
+		with self.get_connection() as conn:
+			cursor = conn.cursor()
+
+			account_filter = ''
+			params = []
+			if user_id is not None:
+				account_filter = 'WHERE a.user_id = ?'
+				params.append(user_id)
+
+			cursor.execute(
+				f'''
+				SELECT {', '.join(f'a.{column}' for column in self.PUBLIC_ACCOUNT_COLUMNS)},
+					lb.balance_id, lb.quota AS balance_quota, lb.used_quota AS balance_used_quota,
+					lb.created_at AS balance_created_at
+				FROM accounts a
+				LEFT JOIN account_latest_balance lb ON lb.account_id = a.id
+				{account_filter}
+				ORDER BY a.id
+				''',
+				params,
+			)
+
 			accounts = []
 			for row in cursor.fetchall():
 				account = dict(row)
-				# 解密敏感字段
-				if account.get('password'):
-					account['password'] = self._decrypt(account['password'])
-				if account.get('cookies'):
-					account['cookies'] = self._decrypt(account['cookies'])
+				balance_id = account.pop('balance_id')
+				balance = {
+					'id': balance_id,
+					'account_id': account['id'],
+					'quota': account.pop('balance_quota'),
+					'used_quota': account.pop('balance_used_quota'),
+					'created_at': account.pop('balance_created_at'),
+				}
+				account['balance'] = balance if balance_id is not None else None
 				accounts.append(account)
 			return accounts
 
@@ -554,10 +1025,31 @@ class Database:
 			cursor.execute(sql, params)
 			return [dict(row) for row in cursor.fetchall()]
 
+	def get_run_timings(self, run_id: str, user_id: int = None) -> List[dict]:
+		"""获取一次签到运行的耗时记录 - 支持按用户筛选"""
+		with self.get_connection() as conn:
+			cursor = conn.cursor()
+
+			sql = '''
+				SELECT ct.account_id, a.name as account_name, ct.stage, ct.duration_ms, ct.success, ct.created_at
+				FROM checkin_timings ct
+				JOIN accounts a ON ct.account_id = a.id
+				WHERE ct.run_id = ?
+			'''
+			params = [run_id]
+
+			if user_id:
+				sql += ' AND a.user_id = ?'
+				params.append(user_id)
+
+			sql += ' ORDER BY ct.account_id, ct.id'
+			cursor.execute(sql, params)
+			return [dict(row) for row in cursor.fetchall()]
+
 	# ========== 余额历史 ==========
 
 	def add_balance_record(self, account_id: int, quota: float, used_quota: float):
-		"""添加余额记录"""
+		"""添加余额记录（同一事务内更新最新余额表）"""
 		with self.get_connection() as conn:
 			cursor = conn.cursor()
 			cursor.execute(
@@ -567,6 +1059,75 @@ class Database:
             ''',
 				(account_id, quota, used_quota),
 			)
+			self._upsert_latest_balance(cursor, cursor.lastrowid)
+
+	@staticmethod
+	def _upsert_latest_balance(cursor, balance_id: int):
+		"""用指定的余额历史记录更新最新余额表"""
+		cursor.execute(
+			'''
+			INSERT INTO account_latest_balance (account_id, balance_id, quota, used_quota, created_at)
+			SELECT account_id, id, quota, used_quota, created_at FROM balance_history WHERE id = ?
+			ON CONFLICT(account_id) DO UPDATE SET
+				balance_id = excluded.balance_id,
+				quota = excluded.quota,
+				used_quota = excluded.used_quota,
+				created_at = excluded.created_at
+			''',
+			(balance_id,),
+		)
+
+	# ========== 批量写入 ==========
+
+	def _write_batch(self, logs: list, balances: list, account_updates: list, timings: list = ()):
+		"""在一个事务中写入缓冲的账号更新、签到日志、余额记录和耗时记录（供 WriteBehindWriter 使用）"""
+		with self.get_connection() as conn:
+			cursor = conn.cursor()
+			for account_id, fields in account_updates:
+				self._execute_account_update(cursor, account_id, **fields)
+
+			if logs:
+				cursor.executemany(
+					'INSERT INTO checkin_logs (account_id, success, message, created_at) VALUES (?, ?, ?, ?)', logs
+				)
+
+			if balances:
+				cursor.executemany(
+					'INSERT INTO balance_history (account_id, quota, used_quota, created_at) VALUES (?, ?, ?, ?)', balances
+				)
+				# 每个账号用最新的一条余额记录更新最新余额表
+				cursor.executemany(
+					'''
+					INSERT INTO account_latest_balance (account_id, balance_id, quota, used_quota, created_at)
+					SELECT account_id, id, quota, used_quota, created_at FROM balance_history
+					WHERE account_id = ?
+					ORDER BY created_at DESC, id DESC
+					LIMIT 1
+					ON CONFLICT(account_id) DO UPDATE SET
+						balance_id = excluded.balance_id,
+						quota = excluded.quota,
+						used_quota = excluded.used_quota,
+						created_at = excluded.created_at
+					''',
+					[(account_id,) for account_id in dict.fromkeys(balance[0] for balance in balances)],
+				)
+
+			if timings:
+				cursor.executemany(
+					'''
+					INSERT INTO checkin_timings (run_id, account_id, stage, duration_ms, success, created_at)
+					VALUES (?, ?, ?, ?, ?, ?)
+					''',
+					[
+						(run_id, account_id, item['stage'], item['duration_ms'], 1 if item['success'] else 0, created_at)
+						for run_id, account_id, spans, created_at in timings
+						for item in spans
+					],
+				)
+
+	def flush_writes(self) -> int:
+		"""立即写入签到结果写缓冲中的记录"""
+		return self.writer.flush()
 
 	def get_balance_history(self, account_id: int, limit: int = 30) -> List[dict]:
 		"""获取余额历史"""
@@ -590,11 +1151,10 @@ class Database:
 			cursor = conn.cursor()
 			cursor.execute(
 				'''
-                SELECT * FROM balance_history
-                WHERE account_id = ?
-                ORDER BY created_at DESC
-                LIMIT 1
-            ''',
+				SELECT balance_id AS id, account_id, quota, used_quota, created_at
+				FROM account_latest_balance
+				WHERE account_id = ?
+				''',
 				(account_id,),
 			)
 
@@ -640,6 +1200,161 @@ class Database:
 			cursor = conn.cursor()
 			cursor.execute('DELETE FROM system_config WHERE config_key = ?', (key,))
 
+	# ========== 邮件发送方式 ==========
+
+	def get_email_preferences(self, emails: list[str] = None) -> dict[str, str]:
+		"""获取收件人的邮件发送方式 {email: mode}，emails 为 None 时返回全部"""
+		with self.get_connection() as conn:
+			cursor = conn.cursor()
+			if emails is None:
+				cursor.execute('SELECT email, mode FROM email_preferences')
+			else:
+				emails = sorted({normalize_email(email) for email in emails if email})
+				if not emails:
+					return {}
+				placeholders = ', '.join('?' * len(emails))
+				cursor.execute(f'SELECT email, mode FROM email_preferences WHERE email IN ({placeholders})', emails)
+			return {row['email']: row['mode'] for row in cursor.fetchall()}
+
+	def set_email_preference(self, email: str, mode: str | None):
+		"""设置收件人的邮件发送方式，mode 为 None 时恢复默认（EMAIL_NOTIFY_MODE）"""
+		if mode is not None and mode not in EMAIL_NOTIFY_MODES:
+			raise ValueError(f'Invalid email notify mode: {mode}')
+		with self.get_connection() as conn:
+			cursor = conn.cursor()
+			if mode is None:
+				cursor.execute('DELETE FROM email_preferences WHERE email = ?', (normalize_email(email),))
+				return
+			cursor.execute(
+				'''
+				INSERT INTO email_preferences (email, mode)
+				VALUES (?, ?)
+				ON CONFLICT(email) DO UPDATE SET
+					mode = excluded.mode,
+					updated_at = CURRENT_TIMESTAMP
+				''',
+				(normalize_email(email), mode),
+			)
+
+	# ========== 通知发件箱 ==========
+
+	def enqueue_notification(
+		self, idempotency_key: str, kind: str, recipient: str, title: str, content: str, msg_type: str = 'text'
+	) -> bool:
+		"""通知入队，幂等键已存在时忽略，返回是否新入队"""
+		with self.get_connection() as conn:
+			cursor = conn.cursor()
+			cursor.execute(
+				'''
+				INSERT OR IGNORE INTO notification_outbox
+					(idempotency_key, kind, recipient, title, content, msg_type, next_attempt_at)
+				VALUES (?, ?, ?, ?, ?, ?, ?)
+				''',
+				(idempotency_key, kind, recipient, title, content, msg_type, time.time()),
+			)
+			return cursor.rowcount > 0
+
+	def claim_notifications(self, limit: int, lease_seconds: float) -> List[dict]:
+		"""领取到期的通知并标记为发送中
+
+		单条 UPDATE ... RETURNING 完成领取，Web 和调度器两个进程的 worker 不会领取到同一条通知；
+		发送中的通知在租约到期后可以被重新领取（进程在发送过程中退出）。
+		"""
+		now = time.time()
+		with self.get_connection() as conn:
+			cursor = conn.cursor()
+			cursor.execute(
+				'''
+				UPDATE notification_outbox
+				SET status = 'sending', attempts = attempts + 1, next_attempt_at = ?, updated_at = CURRENT_TIMESTAMP
+				WHERE id IN (
+					SELECT id FROM notification_outbox
+					WHERE status IN ('pending', 'sending') AND next_attempt_at <= ?
+					ORDER BY next_attempt_at, id
+					LIMIT ?
+				)
+				RETURNING id, idempotency_key, kind, recipient, title, content, msg_type, attempts
+				''',
+				(now + lease_seconds, now, limit),
+			)
+			return sorted((dict(row) for row in cursor.fetchall()), key=lambda row: row['id'])
+
+	def complete_notification(self, notification_id: int):
+		"""标记通知已发送"""
+		with self.get_connection() as conn:
+			cursor = conn.cursor()
+			cursor.execute(
+				'''
+				UPDATE notification_outbox
+				SET status = 'sent', last_error = NULL, updated_at = CURRENT_TIMESTAMP
+				WHERE id = ?
+				''',
+				(notification_id,),
+			)
+
+	def fail_notification(self, notification_id: int, error: str, retry_at: float | None):
+		"""记录发送失败，retry_at 为下次发送时间，为 None 时标记为死信"""
+		with self.get_connection() as conn:
+			cursor = conn.cursor()
+			cursor.execute(
+				'''
+				UPDATE notification_outbox
+				SET status = ?, last_error = ?, next_attempt_at = COALESCE(?, next_attempt_at),
+					updated_at = CURRENT_TIMESTAMP
+				WHERE id = ?
+				''',
+				('dead' if retry_at is None else 'pending', error, retry_at, notification_id),
+			)
+
+	def get_outbox_stats(self) -> dict:
+		"""各状态的通知数"""
+		with self.get_connection() as conn:
+			cursor = conn.cursor()
+			cursor.execute('SELECT status, COUNT(*) as count FROM notification_outbox GROUP BY status')
+			stats = {'pending': 0, 'sending': 0, 'sent': 0, 'dead': 0}
+			stats.update({row['status']: row['count'] for row in cursor.fetchall()})
+			return stats
+
+	def get_dead_notifications(self, limit: int = 100) -> List[dict]:
+		"""获取死信（不包含正文）"""
+		with self.get_connection() as conn:
+			cursor = conn.cursor()
+			cursor.execute(
+				'''
+				SELECT id, idempotency_key, kind, recipient, title, attempts, last_error, created_at, updated_at
+				FROM notification_outbox
+				WHERE status = 'dead'
+				ORDER BY updated_at DESC, id DESC
+				LIMIT ?
+				''',
+				(limit,),
+			)
+			return [dict(row) for row in cursor.fetchall()]
+
+	def retry_dead_notification(self, notification_id: int) -> bool:
+		"""死信重新入队，返回是否找到该死信"""
+		with self.get_connection() as conn:
+			cursor = conn.cursor()
+			cursor.execute(
+				'''
+				UPDATE notification_outbox
+				SET status = 'pending', attempts = 0, next_attempt_at = ?, updated_at = CURRENT_TIMESTAMP
+				WHERE id = ? AND status = 'dead'
+				''',
+				(time.time(), notification_id),
+			)
+			return cursor.rowcount > 0
+
+	def purge_sent_notifications(self, days: int = 7) -> int:
+		"""删除发送成功超过指定天数的通知"""
+		with self.get_connection() as conn:
+			cursor = conn.cursor()
+			cursor.execute(
+				"DELETE FROM notification_outbox WHERE status = 'sent' AND updated_at < datetime('now', ?)",
+				(f'-{days} days',),
+			)
+			return cursor.rowcount
+
 	# ========== 统计信息 ==========
 
 	def get_statistics(self, user_id: int = None) -> dict:
@@ -665,7 +1380,7 @@ class Database:
 					SELECT COUNT(*) as total, SUM(cl.success) as success
 					FROM checkin_logs cl
 					JOIN accounts a ON cl.account_id = a.id
-					WHERE DATE(cl.created_at) = DATE('now') AND a.user_id = ?
+					WHERE cl.created_at >= DATE('now') AND cl.created_at < DATE('now', '+1 day') AND a.user_id = ?
 					''',
 					(user_id,)
 				)
@@ -674,54 +1389,24 @@ class Database:
 					'''
 					SELECT COUNT(*) as total, SUM(success) as success
 					FROM checkin_logs
-					WHERE DATE(created_at) = DATE('now')
+					WHERE created_at >= DATE('now') AND created_at < DATE('now', '+1 day')
 					'''
 				)
 			today_stats = dict(cursor.fetchone())
 
-			# 总余额 - 获取每个账号的最新余额（只统计启用的、未过期用户的账号）
-			if user_id:
-				cursor.execute(
-					'''
-					SELECT SUM(quota) as total_quota, SUM(used_quota) as total_used
-					FROM (
-						SELECT bh.account_id, bh.quota, bh.used_quota
-						FROM balance_history bh
-						JOIN accounts a ON bh.account_id = a.id
-						JOIN users u ON a.user_id = u.id
-						WHERE a.user_id = ?
-							AND a.enabled = 1
-							AND (u.enabled = 1 AND (u.expire_date IS NULL OR u.expire_date >= DATE('now')))
-							AND bh.created_at = (
-								SELECT MAX(created_at)
-								FROM balance_history bh2
-								WHERE bh2.account_id = bh.account_id
-							)
-						GROUP BY bh.account_id
-					)
-					''',
-					(user_id,)
-				)
-			else:
-				cursor.execute(
-					'''
-					SELECT SUM(quota) as total_quota, SUM(used_quota) as total_used
-					FROM (
-						SELECT bh.account_id, bh.quota, bh.used_quota
-						FROM balance_history bh
-						JOIN accounts a ON bh.account_id = a.id
-						JOIN users u ON a.user_id = u.id
-						WHERE a.enabled = 1
-							AND (u.enabled = 1 AND (u.expire_date IS NULL OR u.expire_date >= DATE('now')))
-							AND bh.created_at = (
-								SELECT MAX(created_at)
-								FROM balance_history bh2
-								WHERE bh2.account_id = bh.account_id
-							)
-						GROUP BY bh.account_id
-					)
-					'''
-				)
+			# 总余额 - 直接读取最新余额表（只统计启用的、未过期用户的账号）
+			cursor.execute(
+				f'''
+				SELECT SUM(lb.quota) as total_quota, SUM(lb.used_quota) as total_used
+				FROM account_latest_balance lb
+				JOIN accounts a ON lb.account_id = a.id
+				JOIN users u ON a.user_id = u.id
+				WHERE a.enabled = 1
+					AND (u.enabled = 1 AND (u.expire_date IS NULL OR u.expire_date >= DATE('now')))
+					{'AND a.user_id = ?' if user_id else ''}
+				''',
+				params,
+			)
 			balance_stats = dict(cursor.fetchone())
 
 			return {
@@ -734,8 +1419,101 @@ class Database:
 			}
 
 
-# 全局数据库实例
-db = Database()
+class AsyncDatabase:
+	"""Database 的异步门面 - 在独立的有界线程池中执行数据库方法，避免阻塞事件循环
+
+	用法与 Database 相同，只是方法需要 await：``await adb.get_account(account_id)``。
+	线程数默认与连接池大小一致，可通过 DATABASE_EXECUTOR_WORKERS 调整。
+	"""
+
+	def __init__(self, database: 'Database | LazyDatabase', max_workers: int = None):
+		self._database = database
+		self._max_workers = max_workers
+		self._executor: ThreadPoolExecutor | None = None
+		self._methods = {}
+
+	@property
+	def executor(self) -> ThreadPoolExecutor:
+		if self._executor is None:
+			# 线程数在首次使用时才确定；LazyDatabase 还没创建时从环境变量读取连接池大小，
+			# 避免在事件循环中同步执行迁移（adb.initialize() 会在线程池中创建数据库）
+			if isinstance(self._database, LazyDatabase) and not self._database.initialized:
+				pool_size = default_pool_size()
+			else:
+				pool_size = self._database.pool_size
+			max_workers = self._max_workers or int(os.getenv('DATABASE_EXECUTOR_WORKERS', str(max(pool_size, 1))))
+			self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='database')
+		return self._executor
+
+	def __getattr__(self, name):
+		attr = getattr(self._database, name)
+		if not callable(attr):
+			return attr
+
+		method = self._methods.get(name)
+		if method is None:
+
+			histogram = DB_QUERY_SECONDS.labels(method=name)
+
+			def call(*args, **kwargs):
+				# 只统计方法本身的执行时间，不包括在线程池中排队的时间
+				start = time.perf_counter()
+				try:
+					return attr(*args, **kwargs)
+				finally:
+					histogram.observe(time.perf_counter() - start)
+
+			@functools.wraps(attr)
+			async def method(*args, **kwargs):
+				loop = asyncio.get_running_loop()
+				return await loop.run_in_executor(self.executor, functools.partial(call, *args, **kwargs))
+
+			self._methods[name] = method
+		return method
+
+	def shutdown(self):
+		"""关闭线程池"""
+		if self._executor is not None:
+			self._executor.shutdown(wait=True)
+			self._executor = None
+
+
+class LazyDatabase:
+	"""首次访问属性时才创建 Database
+
+	创建 Database 会执行所有迁移并打开连接，导入 web.database 时不创建，
+	只读取配置的模块（utils.notify、utils.config）在没有数据库的环境（GitHub Actions）中也不会创建数据库文件。
+	"""
+
+	def __init__(self, factory=Database):
+		self._factory = factory
+		self._instance: Database | None = None
+		self._lock = threading.Lock()
+
+	@property
+	def initialized(self) -> bool:
+		return self._instance is not None
+
+	def initialize(self) -> Database:
+		"""创建（或返回已创建的）Database 实例"""
+		if self._instance is None:
+			with self._lock:
+				if self._instance is None:
+					self._instance = self._factory()
+		return self._instance
+
+	def __getattr__(self, name):
+		return getattr(self.initialize(), name)
+
+
+def database_exists() -> bool:
+	"""数据库是否已经创建（当前进程已初始化，或数据库文件已存在）"""
+	return db.initialized or os.path.exists(os.getenv('DATABASE_PATH', 'data/checkin.db'))
+
+
+# 全局数据库实例（首次使用时创建）
+db = LazyDatabase()
+adb = AsyncDatabase(db)
 
 
 if __name__ == '__main__':
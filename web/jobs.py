@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+后台任务 - 批量签到在后台运行，通过任务 ID 查询进度或订阅事件流
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from typing import AsyncIterator
+
+# 已完成的任务保留时间（秒）和最多保留的任务数
+JOB_RETENTION_SECONDS = 3600
+MAX_FINISHED_JOBS = 50
+
+# SSE 心跳间隔（秒），避免反向代理因长时间无数据断开连接
+SSE_HEARTBEAT_SECONDS = 15
+
+
+class CheckinJob:
+	"""一次批量签到任务，记录每个账号的签到结果"""
+
+	def __init__(self, user_id: int, total: int):
+		self.id = uuid.uuid4().hex
+		self.user_id = user_id
+		self.total = total
+		self.status = 'running'
+		self.results: list[dict] = []
+		self.created_at = time.time()
+		self.finished_at: float | None = None
+		self.task: asyncio.Task | None = None
+		self._changed = asyncio.Condition()
+
+	@property
+	def success_count(self) -> int:
+		return sum(1 for r in self.results if r['success'])
+
+	async def add_result(self, result: dict):
+		"""记录一个账号的签到结果并通知订阅者"""
+		async with self._changed:
+			self.results.append(result)
+			self._changed.notify_all()
+
+	async def finish(self):
+		"""标记任务完成并通知订阅者"""
+		async with self._changed:
+			self.status = 'completed'
+			self.finished_at = time.time()
+			self._changed.notify_all()
+
+	def to_dict(self, include_results: bool = True) -> dict:
+		data = {
+			'job_id': self.id,
+			'status': self.status,
+			'total_count': self.total,
+			'completed_count': len(self.results),
+			'success_count': self.success_count,
+			'created_at': self.created_at,
+			'finished_at': self.finished_at,
+		}
+		if include_results:
+			data['results'] = list(self.results)
+		return data
+
+	async def events(self) -> AsyncIterator[str]:
+		"""以 Server-Sent Events 格式输出已有和后续的签到结果，任务完成后结束"""
+		sent = 0
+		while True:
+			async with self._changed:
+				if sent == len(self.results) and self.status == 'running':
+					try:
+						await asyncio.wait_for(self._changed.wait(), SSE_HEARTBEAT_SECONDS)
+					except asyncio.TimeoutError:
+						pass
+				pending = self.results[sent:]
+				done = self.status != 'running'
+
+			if not pending and not done:
+				yield ': keep-alive\n\n'
+			for result in pending:
+				yield f'event: result\ndata: {json.dumps(result, ensure_ascii=False)}\n\n'
+			sent += len(pending)
+
+			if done and sent == len(self.results):
+				yield f'event: done\ndata: {json.dumps(self.to_dict(include_results=False))}\n\n'
+				return
+
+
+class JobRegistry:
+	"""进程内的任务表，已完成的任务过期后清理"""
+
+	def __init__(self):
+		self._jobs: dict[str, CheckinJob] = {}
+
+	def create(self, user_id: int, total: int) -> CheckinJob:
+		self._prune()
+		job = CheckinJob(user_id, total)
+		self._jobs[job.id] = job
+		return job
+
+	def get(self, job_id: str) -> CheckinJob | None:
+		return self._jobs.get(job_id)
+
+	def _prune(self):
+		now = time.time()
+		finished = sorted(
+			(job for job in self._jobs.values() if job.finished_at is not None), key=lambda job: job.finished_at
+		)
+		expired = [job for job in finished if now - job.finished_at > JOB_RETENTION_SECONDS]
+		expired += finished[len(expired) : max(len(expired), len(finished) - MAX_FINISHED_JOBS)]
+		for job in expired:
+			self._jobs.pop(job.id, None)
+
+
+jobs = JobRegistry()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+通知发件箱 - 签到只把通知写入 notification_outbox 表，由后台 worker 发送
+
+- 每条通知带幂等键（签到运行 ID + 账号 / 收件人 / 渠道），重复入队只保留一条
+- worker 限制同时发送的通知数，失败后按指数退避重新发送，超过最大次数或不可恢复的错误标记为死信
+- 通知在数据库中持久化，渠道暂时不可用或进程重启都不会丢失
+"""
+
+import asyncio
+import smtplib
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.config import OutboxConfig
+from utils.metrics import NOTIFICATION_DELIVERIES
+from utils.notify import NotificationKit
+from utils.smtp_pool import smtp_pool
+
+# 直接运行 web/scheduler.py 或 web/api.py 时 web 目录在 sys.path 中，与入口脚本使用同一个数据库模块
+if __package__ == 'web':
+	from web.database import adb
+else:
+	from database import adb
+
+# 领取后多久没有完成的通知可以被重新领取（秒），大于单条通知的最长发送时间
+SEND_LEASE_SECONDS = 300
+
+# 已发送的通知保留天数，以及清理间隔（秒）
+SENT_RETENTION_DAYS = 7
+PURGE_INTERVAL_SECONDS = 3600
+
+
+class ChannelRemovedError(Exception):
+	"""通知入队后推送渠道被删除"""
+
+
+# 重试也不会成功的错误：收件人被拒绝、渠道已删除。
+# 邮件配置缺失（ValueError）可能只是管理员暂时没有配置好，按普通失败重试
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused, ChannelRemovedError)
+
+
+class NotificationOutbox:
+	"""通知发件箱：入队写入数据库，后台 worker 按到期时间发送"""
+
+	def __init__(self, config: OutboxConfig | None = None):
+		self._config = config
+		self._task: asyncio.Task | None = None
+		self._wakeup: asyncio.Event | None = None
+		self._last_purge = 0.0
+
+	@property
+	def config(self) -> OutboxConfig:
+		"""配置在首次使用时才从环境变量读取，保证 load_dotenv() 已经执行"""
+		if self._config is None:
+			self._config = OutboxConfig.load_from_env()
+		return self._config
+
+	async def enqueue_email(
+		self, idempotency_key: str, to_email: str, title: str, content: str, msg_type: str = 'text'
+	) -> bool:
+		"""个人邮件入队，返回是否新入队（幂等键已存在时为 False）"""
+		return await self._enqueue(idempotency_key, 'email', to_email, title, content, msg_type)
+
+	async def enqueue_push(self, idempotency_key: str, title: str, content: str, msg_type: str = 'text') -> int:
+		"""推送消息入队，每个已配置的渠道一条（单独重试，成功的渠道不会重复推送），返回新入队的条数"""
+		notify = await NotificationKit.acreate()
+		queued = 0
+		for channel in notify.configured_channels():
+			if await self._enqueue(f'{idempotency_key}:{channel}', 'push', channel, title, content, msg_type):
+				queued += 1
+		if not queued:
+			print('[OUTBOX] No notification channel configured, skipping')
+		return queued
+
+	async def _enqueue(
+		self, idempotency_key: str, kind: str, recipient: str, title: str, content: str, msg_type: str
+	) -> bool:
+		inserted = await adb.enqueue_notification(idempotency_key, kind, recipient, title, content, msg_type)
+		if inserted:
+			self.wake()
+		return inserted
+
+	def wake(self):
+		"""有新的通知可以发送时唤醒 worker（没有运行时启动）"""
+		self.start()
+		self._wakeup.set()
+
+	def start(self):
+		"""在当前事件循环中启动 worker（已经在运行时不重复启动）"""
+		if self._task is not None and not self._task.done():
+			return
+		self._wakeup = asyncio.Event()
+		self._task = asyncio.get_running_loop().create_task(self._run())
+
+	async def stop(self):
+		"""停止 worker，未发送的通知留在数据库中，下次启动后继续发送"""
+		if self._task is None:
+			return
+		self._task.cancel()
+		try:
+			await self._task
+		except asyncio.CancelledError:
+			pass
+		self._task = None
+
+	async def _run(self):
+		while True:
+			self._wakeup.clear()
+			try:
+				await self.drain()
+				# 到期的通知已经发送完，关闭复用的 SMTP 连接，避免空闲连接挂到下一次签到
+				smtp_pool.close()
+				if time.monotonic() - self._last_purge >= PURGE_INTERVAL_SECONDS:
+					self._last_purge = time.monotonic()
+					await adb.purge_sent_notifications(SENT_RETENTION_DAYS)
+			except Exception as e:
+				print(f'[OUTBOX] Worker error: {e}')
+			try:
+				await asyncio.wait_for(self._wakeup.wait(), self.config.poll_interval)
+			except asyncio.TimeoutError:
+				pass
+
+	async def drain(self) -> int:
+		"""发送所有已到期的通知，返回发送成功的条数"""
+		sent = 0
+		while True:
+			items = await adb.claim_notifications(self.config.concurrency, SEND_LEASE_SECONDS)
+			if not items:
+				return sent
+			# 每批重新读取配置，管理员修改的邮件配置对之后的通知生效
+			notify = await NotificationKit.acreate()
+			results = await asyncio.gather(*(self._deliver(notify, item) for item in items))
+			sent += sum(results)
+
+	async def _deliver(self, notify: NotificationKit, item: dict) -> bool:
+		"""发送一条通知并记录结果"""
+		try:
+			if item['kind'] == 'email':
+				await notify.asend_email_to(
+					item['recipient'], item['title'], item['content'], msg_type=item['msg_type']
+				)
+			else:
+				if item['recipient'] not in notify.configured_channels():
+					raise ChannelRemovedError(f'{item["recipient"]} is no longer configured')
+				results = await notify.apush_message(
+					item['title'], item['content'], msg_type=item['msg_type'], channels=[item['recipient']]
+				)
+				if not results.get(item['recipient']):
+					raise RuntimeError(f'{item["recipient"]} push failed')
+		except Exception as e:
+			error = str(e) or type(e).__name__
+			if isinstance(e, PERMANENT_ERRORS) or item['attempts'] >= self.config.max_attempts:
+				await adb.fail_notification(item['id'], error, None)
+				NOTIFICATION_DELIVERIES.labels(kind=item['kind'], result='dead').inc()
+				print(
+					f'[OUTBOX] {item["kind"]} to {item["recipient"]} moved to dead letters '
+					f'after {item["attempts"]} attempt(s): {error}'
+				)
+			else:
+				delay = min(self.config.backoff * 2 ** (item['attempts'] - 1), self.config.max_backoff)
+				await adb.fail_notification(item['id'], error, time.time() + delay)
+				NOTIFICATION_DELIVERIES.labels(kind=item['kind'], result='retry').inc()
+				print(f'[OUTBOX] {item["kind"]} to {item["recipient"]} failed ({error}), retrying in {delay:.0f}s')
+			return False
+
+		await adb.complete_notification(item['id'])
+		NOTIFICATION_DELIVERIES.labels(kind=item['kind'], result='sent').inc()
+		return True
+
+
+outbox = NotificationOutbox()
@@ -4,8 +4,12 @@
 """
 
 import asyncio
+import hashlib
+import json
 import sys
-from datetime import datetime
+import time
+import uuid
+from datetime import datetime, timedelta
 from pathlib import Path
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
@@ -17,74 +21,156 @@ sys.path.insert(0, str(project_root))
 
 from checkin import check_in_account
 from utils.auto_login import login_anyrouter
-from utils.config import AccountConfig, AppConfig
-from utils.notify import notify
+from utils.browser_pool import browser_pool
+from utils.concurrency import run_bounded
+from utils.config import AccountConfig, AppConfig, SchedulerConfig
+from utils.email_digest import DigestEntry, EmailDigest
+from utils.http_pool import http_pool
+from utils.metrics import SCHEDULER_RUN_SECONDS
+from utils.notify import push_http_pool
+from utils.rate_limit import KeyedRateLimiter
+from utils.smtp_pool import smtp_pool
+from utils.timing import record_timings, span
 
 # 使用相对导入避免路径问题
 if __name__ == '__main__':
-    from database import db
+    from database import adb
+    from outbox import outbox
 else:
-    from web.database import db
+    from web.database import adb
+    from web.outbox import outbox
 
 
-async def auto_checkin_task():
-	"""自动签到任务"""
-	print(f'\n[SCHEDULER] 开始执行自动签到任务 - {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}')
+# 定时签到间隔（小时），与 GitHub Actions 保持一致
+CHECKIN_INTERVAL_HOURS = 6
 
-	# 获取所有启用的账号
-	accounts = db.get_all_accounts(enabled_only=True)
-	if not accounts:
-		print('[SCHEDULER] 没有启用的账号，跳过签到任务')
-		return
 
-	# 过滤掉过期用户的账号
-	valid_accounts = []
-	for account in accounts:
-		if db.check_user_expired(account['user_id']):
-			print(f'[SCHEDULER] 跳过过期用户的账号: {account["name"]} (user_id: {account["user_id"]})')
-			continue
-		valid_accounts.append(account)
+def checkin_trigger() -> CronTrigger:
+	"""定时签到的触发器"""
+	return CronTrigger(hour=f'*/{CHECKIN_INTERVAL_HOURS}')
 
-	if not valid_accounts:
-		print('[SCHEDULER] 没有有效的账号（所有用户都已过期），跳过签到任务')
-		return
 
-	print(f'[SCHEDULER] 找到 {len(valid_accounts)} 个有效账号（过滤掉 {len(accounts) - len(valid_accounts)} 个过期账号）')
+def account_offset(account_id: int, window: int) -> float:
+	"""账号在签到窗口内的固定偏移（秒），由账号 ID 哈希得到，每次运行都相同"""
+	if window <= 0:
+		return 0.0
+	digest = hashlib.sha256(f'checkin:{account_id}'.encode()).digest()
+	return int.from_bytes(digest[:8], 'big') % (window * 1000) / 1000
 
-	app_config = AppConfig.load_from_env()
-	success_count = 0
-	failed_accounts = []
 
-	for account in valid_accounts:
-		try:
-			print(f'\n[SCHEDULER] 处理账号: {account["name"]}')
-
-			# 根据认证类型获取 cookies 和 api_user
-			import json
-			cookies = None
-			api_user = None
-			need_login = False
-
-			if account.get('auth_type') == 'password':
-				# 密码认证：优先使用已保存的 cookies，失效时才重新登录
-				if account.get('cookies') and account.get('api_user'):
-					# 尝试使用已保存的 cookies
-					try:
-						cookies = json.loads(account['cookies']) if isinstance(account['cookies'], str) else account['cookies']
-						api_user = account['api_user']
-						print(f'[SCHEDULER] 使用已保存的 Cookies: {account["name"]} (密码认证)')
-					except:
-						need_login = True
-				else:
-					# 第一次登录，没有保存的 cookies
+def get_schedule(accounts: list, scheduler_config: SchedulerConfig, now: datetime | None = None) -> list[dict]:
+	"""计算每个账号的偏移和下一次签到时间"""
+	trigger = checkin_trigger()
+	now = now or datetime.now(trigger.timezone)
+	window = min(scheduler_config.spread_window, CHECKIN_INTERVAL_HOURS * 3600)
+	next_fire = trigger.get_next_fire_time(None, now)
+	previous_fire = next_fire - timedelta(hours=CHECKIN_INTERVAL_HOURS)
+
+	schedule = []
+	for account in accounts:
+		offset = account_offset(account['id'], window)
+		# 本轮的签到时间还没到就是本轮，否则是下一轮
+		next_run = previous_fire + timedelta(seconds=offset)
+		if next_run <= now:
+			next_run = next_fire + timedelta(seconds=offset)
+		schedule.append(
+			{
+				'account_id': account['id'],
+				'name': account['name'],
+				'provider': account['provider'],
+				'offset_seconds': offset,
+				'next_run_at': next_run.isoformat(),
+			}
+		)
+	return schedule
+
+
+def filter_shard(accounts: list, shard_index: int, shard_count: int) -> list:
+	"""按账号 ID 取模筛选当前分片负责的账号"""
+	if shard_count <= 1:
+		return accounts
+	return [account for account in accounts if account['id'] % shard_count == shard_index]
+
+
+async def checkin_scheduled_account(
+	account: dict, app_config: AppConfig, digest: EmailDigest | None = None, run_id: str | None = None
+) -> dict:
+	"""对单个账号执行定时签到，返回 {'name', 'success', 'error'}
+
+	签到日志、余额和 cookies 更新写入 adb.writer 缓冲，由任务结束时统一写入数据库；
+	个人邮件写入通知发件箱，由后台 worker 发送（幂等键为 run_id + 账号 ID）；
+	收件人的邮件发送方式不是 immediate 时，个人邮件记录到 digest，由任务结束时按收件人合并发送
+	"""
+	email_key = f'{run_id or uuid.uuid4().hex}:account:{account["id"]}'
+	email_mode = digest.mode_for(account['email']) if digest is not None and account.get('email') else 'immediate'
+	try:
+		print(f'\n[SCHEDULER] 处理账号: {account["name"]}')
+
+		# 根据认证类型获取 cookies 和 api_user
+		cookies = None
+		api_user = None
+		need_login = False
+
+		if account.get('auth_type') == 'password':
+			# 密码认证：优先使用已保存的 cookies，失效时才重新登录
+			if account.get('cookies') and account.get('api_user'):
+				# 尝试使用已保存的 cookies
+				try:
+					cookies = json.loads(account['cookies']) if isinstance(account['cookies'], str) else account['cookies']
+					api_user = account['api_user']
+					print(f'[SCHEDULER] 使用已保存的 Cookies: {account["name"]} (密码认证)')
+				except:
 					need_login = True
 			else:
-				# Cookies认证：直接使用保存的 cookies 和 api_user
-				print(f'[SCHEDULER] 使用已保存的 Cookies: {account["name"]} (Cookies认证)')
-				cookies = json.loads(account['cookies']) if isinstance(account['cookies'], str) else account['cookies']
-				api_user = account['api_user']
+				# 第一次登录，没有保存的 cookies
+				need_login = True
+		else:
+			# Cookies认证：直接使用保存的 cookies 和 api_user
+			print(f'[SCHEDULER] 使用已保存的 Cookies: {account["name"]} (Cookies认证)')
+			cookies = json.loads(account['cookies']) if isinstance(account['cookies'], str) else account['cookies']
+			api_user = account['api_user']
+
+		# 构造账号配置
+		account_config = AccountConfig(
+			cookies=cookies,
+			api_user=api_user,
+			provider=account['provider'],
+			name=account['name'],
+			email=account.get('email'),
+		)
+
+		# 执行签到
+		success, user_info = await check_in_account(account_config, 0, app_config)
+
+		# 如果签到失败且是密码认证，可能是 cookies 过期，尝试重新登录
+		if not success and account.get('auth_type') == 'password' and not need_login:
+			print(f'[SCHEDULER] Cookies 可能已过期，尝试重新登录账号: {account["name"]}')
+			need_login = True
+
+		# 需要登录的情况：重新登录并保存 cookies
+		if need_login:
+			print(f'[SCHEDULER] 正在登录账号: {account["name"]} (密码认证)')
+			login_result = await login_anyrouter(account['username'], account['password'])
+
+			if not login_result or not login_result.get('success'):
+				error_msg = '自动登录失败'
+				print(f'[SCHEDULER] ❌ {account["name"]}: {error_msg}')
+				adb.writer.add_checkin_log(account['id'], False, error_msg)
+				return {'name': account['name'], 'success': False, 'error': error_msg}
+
+			print(f'[SCHEDULER] ✅ {account["name"]}: 登录成功')
+			cookies = login_result['cookies']
+			api_user = login_result['api_user']
+
+			# 保存新的 cookies 和 api_user 到数据库
+			adb.writer.update_account(
+				account['id'],
+				cookies=json.dumps(cookies) if isinstance(cookies, dict) else cookies,
+				api_user=api_user
+			)
+			print(f'[SCHEDULER] 已更新账号 {account["name"]} 的 cookies 和 api_user')
 
-			# 构造账号配置
+			# 使用新的 cookies 重新签到
 			account_config = AccountConfig(
 				cookies=cookies,
 				api_user=api_user,
@@ -92,111 +178,176 @@ async def auto_checkin_task():
 				name=account['name'],
 				email=account.get('email'),
 			)
-
-			# 执行签到
 			success, user_info = await check_in_account(account_config, 0, app_config)
 
-			# 如果签到失败且是密码认证，可能是 cookies 过期，尝试重新登录
-			if not success and account.get('auth_type') == 'password' and not need_login:
-				print(f'[SCHEDULER] Cookies 可能已过期，尝试重新登录账号: {account["name"]}')
-				need_login = True
+		# 记录日志
+		if success:
+			message = '签到成功'
+			print(f'[SCHEDULER] ✅ {account["name"]}: 签到成功')
+		else:
+			message = '签到失败'
+			print(f'[SCHEDULER] ❌ {account["name"]}: 签到失败')
+
+		adb.writer.add_checkin_log(account['id'], success, message)
+
+		# 记录余额
+		if user_info and user_info.get('success'):
+			adb.writer.add_balance_record(account['id'], user_info['quota'], user_info['used_quota'])
+			print(f'[SCHEDULER] 💰 {account["name"]}: 余额 ${user_info["quota"]}, 已使用 ${user_info["used_quota"]}')
+
+		# 发送个人邮件通知（如果配置了邮箱）
+		if account.get('email') and email_mode != 'immediate':
+			has_balance = bool(user_info and user_info.get('success'))
+			digest.add(
+				account['email'],
+				DigestEntry(
+					account['name'],
+					account['provider'],
+					success,
+					quota=user_info['quota'] if has_balance else None,
+					used_quota=user_info['used_quota'] if has_balance else None,
+					error=None if success else message,
+				),
+			)
+		elif account.get('email'):
+			status_text = '成功' if success else '失败'
+			email_title = f'AnyRouter 签到{status_text} - {account["name"]}'
+			email_content_lines = [
+				f'账号: {account["name"]}',
+				f'平台: {account["provider"]}',
+				f'状态: {"✅ 成功" if success else "❌ 失败"}',
+				f'时间: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}',
+				'',
+			]
 
-			# 需要登录的情况：重新登录并保存 cookies
-			if need_login:
-				print(f'[SCHEDULER] 正在登录账号: {account["name"]} (密码认证)')
-				login_result = await login_anyrouter(account['username'], account['password'])
-
-				if not login_result or not login_result.get('success'):
-					error_msg = '自动登录失败'
-					print(f'[SCHEDULER] ❌ {account["name"]}: {error_msg}')
-					db.add_checkin_log(account['id'], False, error_msg)
-					failed_accounts.append({'name': account['name'], 'error': error_msg})
-					continue
-
-				print(f'[SCHEDULER] ✅ {account["name"]}: 登录成功')
-				cookies = login_result['cookies']
-				api_user = login_result['api_user']
-
-				# 保存新的 cookies 和 api_user 到数据库
-				db.update_account(
-					account['id'],
-					cookies=json.dumps(cookies) if isinstance(cookies, dict) else cookies,
-					api_user=api_user
-				)
-				print(f'[SCHEDULER] 已更新账号 {account["name"]} 的 cookies 和 api_user')
-
-				# 使用新的 cookies 重新签到
-				account_config = AccountConfig(
-					cookies=cookies,
-					api_user=api_user,
-					provider=account['provider'],
-					name=account['name'],
-					email=account.get('email'),
+			if user_info and user_info.get('success'):
+				email_content_lines.append(f'余额: ${user_info["quota"]}')
+				email_content_lines.append(f'已用: ${user_info["used_quota"]}')
+			elif not success:
+				email_content_lines.append(f'错误: {message}')
+
+			email_content = '\n'.join(email_content_lines)
+
+			try:
+				await outbox.enqueue_email(email_key, account['email'], email_title, email_content, msg_type='text')
+				print(f'[SCHEDULER] 📧 {account["name"]}: 邮件通知已加入发送队列 ({account["email"]})')
+			except Exception as e:
+				print(f'[SCHEDULER] ⚠️ {account["name"]}: 邮件通知入队失败 - {str(e)[:50]}...')
+
+		return {'name': account['name'], 'success': success, 'error': None if success else message}
+
+	except Exception as e:
+		error_msg = f'签到异常: {str(e)[:100]}'
+		print(f'[SCHEDULER] ❌ {account["name"]}: {error_msg}')
+		adb.writer.add_checkin_log(account['id'], False, error_msg)
+
+		# 异常情况也发送个人邮件通知
+		if account.get('email') and email_mode != 'immediate':
+			digest.add(account['email'], DigestEntry(account['name'], account['provider'], False, error=error_msg))
+		elif account.get('email'):
+			try:
+				error_email_title = f'AnyRouter 签到异常 - {account["name"]}'
+				error_email_content = f'账号: {account["name"]}\n状态: ❌ 异常\n错误: {str(e)}\n时间: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'
+				await outbox.enqueue_email(
+					email_key, account['email'], error_email_title, error_email_content, msg_type='text'
 				)
-				success, user_info = await check_in_account(account_config, 0, app_config)
-
-			# 记录日志
-			if success:
-				success_count += 1
-				message = '签到成功'
-				print(f'[SCHEDULER] ✅ {account["name"]}: 签到成功')
-			else:
-				message = '签到失败'
-				print(f'[SCHEDULER] ❌ {account["name"]}: 签到失败')
-				failed_accounts.append({'name': account['name'], 'error': message})
+				print(f'[SCHEDULER] 📧 {account["name"]}: 异常通知已加入发送队列 ({account["email"]})')
+			except Exception as email_error:
+				print(f'[SCHEDULER] ⚠️ {account["name"]}: 异常邮件入队失败 - {str(email_error)[:50]}...')
+
+		return {'name': account['name'], 'success': False, 'error': error_msg}
+
+
+async def auto_checkin_task(spread: bool = True, clock=time.monotonic, sleep=asyncio.sleep):
+	"""自动签到任务
+
+	spread 为 True 时，每个账号在触发后按固定偏移分散签到，并且每个 provider 按令牌桶限速，
+	避免所有账号在整点同时请求 provider 触发 WAF。clock / sleep 用于计算和等待偏移，测试时可以替换为模拟时钟。
+	"""
+	run_id = uuid.uuid4().hex
+	print(f'\n[SCHEDULER] 开始执行自动签到任务 - {datetime.now().strftime("%Y-%m-%d %H:%M:%S")} (run_id: {run_id})')
+	scheduler_config = SchedulerConfig.load_from_env()
+	started_at = clock()
+
+	# 获取所有启用的账号（多实例部署时只处理当前分片的账号）
+	accounts = filter_shard(
+		await adb.get_all_accounts(enabled_only=True), scheduler_config.shard_index, scheduler_config.shard_count
+	)
+	if scheduler_config.shard_count > 1:
+		print(f'[SCHEDULER] 分片 {scheduler_config.shard_index}/{scheduler_config.shard_count}: 负责 {len(accounts)} 个账号')
+	if not accounts:
+		print('[SCHEDULER] 没有启用的账号，跳过签到任务')
+		return
 
-			db.add_checkin_log(account['id'], success, message)
+	# 过滤掉过期用户的账号
+	valid_accounts = []
+	for account in accounts:
+		if await adb.check_user_expired(account['user_id']):
+			print(f'[SCHEDULER] 跳过过期用户的账号: {account["name"]} (user_id: {account["user_id"]})')
+			continue
+		valid_accounts.append(account)
 
-			# 记录余额
-			if user_info and user_info.get('success'):
-				db.add_balance_record(account['id'], user_info['quota'], user_info['used_quota'])
-				print(f'[SCHEDULER] 💰 {account["name"]}: 余额 ${user_info["quota"]}, 已使用 ${user_info["used_quota"]}')
-
-			# 发送个人邮件通知（如果配置了邮箱）
-			if account.get('email'):
-				status_text = '成功' if success else '失败'
-				email_title = f'AnyRouter 签到{status_text} - {account["name"]}'
-				email_content_lines = [
-					f'账号: {account["name"]}',
-					f'平台: {account["provider"]}',
-					f'状态: {"✅ 成功" if success else "❌ 失败"}',
-					f'时间: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}',
-					'',
-				]
-
-				if user_info and user_info.get('success'):
-					email_content_lines.append(f'余额: ${user_info["quota"]}')
-					email_content_lines.append(f'已用: ${user_info["used_quota"]}')
-				elif not success:
-					email_content_lines.append(f'错误: {message}')
-
-				email_content = '\n'.join(email_content_lines)
+	if not valid_accounts:
+		print('[SCHEDULER] 没有有效的账号（所有用户都已过期），跳过签到任务')
+		return
 
-				try:
-					notify.send_email_to(account['email'], email_title, email_content, msg_type='text')
-					print(f'[SCHEDULER] 📧 {account["name"]}: 邮件通知已发送到 {account["email"]}')
-				except Exception as e:
-					print(f'[SCHEDULER] ⚠️ {account["name"]}: 发送邮件失败 - {str(e)[:50]}...')
+	print(f'[SCHEDULER] 找到 {len(valid_accounts)} 个有效账号（过滤掉 {len(accounts) - len(valid_accounts)} 个过期账号）')
 
-		except Exception as e:
-			error_msg = f'签到异常: {str(e)[:100]}'
-			print(f'[SCHEDULER] ❌ {account["name"]}: {error_msg}')
-			db.add_checkin_log(account['id'], False, error_msg)
-			failed_accounts.append({'name': account['name'], 'error': error_msg})
+	# 个人邮件按收件人的发送方式（immediate / digest / failures_only）立即发送或在任务结束后合并发送
+	preferences = await adb.get_email_preferences([account.get('email') for account in valid_accounts])
+	digest = EmailDigest('zh', preferences=preferences)
 
-			# 异常情况也发送个人邮件通知
-			if account.get('email'):
-				try:
-					error_email_title = f'AnyRouter 签到异常 - {account["name"]}'
-					error_email_content = f'账号: {account["name"]}\n状态: ❌ 异常\n错误: {str(e)}\n时间: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'
-					notify.send_email_to(account['email'], error_email_title, error_email_content, msg_type='text')
-					print(f'[SCHEDULER] 📧 {account["name"]}: 异常通知已发送到 {account["email"]}')
-				except Exception as email_error:
-					print(f'[SCHEDULER] ⚠️ {account["name"]}: 发送异常邮件失败 - {str(email_error)[:50]}...')
+	app_config = AppConfig.load_from_env()
+	window = min(scheduler_config.spread_window, CHECKIN_INTERVAL_HOURS * 3600) if spread else 0
+	rate_limiter = KeyedRateLimiter(
+		scheduler_config.provider_rate_per_minute / 60, scheduler_config.provider_rate_burst, clock, sleep
+	)
+	if window:
+		print(f'[SCHEDULER] 账号将在 {window} 秒内分散签到')
+
+	# 按偏移排序，先到时间的账号先占用并发名额
+	valid_accounts.sort(key=lambda account: account_offset(account['id'], window))
+
+	async def wait_offset(account: dict, index: int):
+		# 在占用并发名额之前等待，等待中的账号不会挡住已经到时间的账号
+		delay = account_offset(account['id'], window) - (clock() - started_at)
+		if delay > 0:
+			await sleep(delay)
+
+	async def worker(account: dict, index: int) -> dict:
+		await rate_limiter.acquire(account['provider'])
+		# 记录各阶段耗时，可通过 /api/runs/{run_id}/timings 查询
+		with record_timings() as recorder:
+			try:
+				with span('total'):
+					return await checkin_scheduled_account(account, app_config, digest, run_id)
+			finally:
+				adb.writer.add_timings(run_id, account['id'], recorder.spans)
+
+	try:
+		results = await run_bounded(
+			valid_accounts,
+			worker,
+			max_concurrency=scheduler_config.concurrency,
+			per_key_limit=app_config.provider_concurrency,
+			key=lambda account: account['provider'],
+			wait=wait_offset,
+		)
+	finally:
+		# 写入缓冲中剩余的签到结果
+		await adb.flush_writes()
+		SCHEDULER_RUN_SECONDS.observe(clock() - started_at)
+	success_count = sum(1 for result in results if result['success'])
+	failed_accounts = [result for result in results if not result['success']]
+
+	if digest.recipients:
+		print(f'[SCHEDULER] 📧 {len(digest.recipients)} 封汇总邮件加入发送队列')
+		for email, title, content in digest.messages():
+			await outbox.enqueue_email(f'{run_id}:digest:{email}', email, title, content)
 
 	# 发送通知
-	total_count = len(accounts)
-	print(f'\n[SCHEDULER] 签到任务完成: {success_count}/{total_count} 成功')
+	total_count = len(valid_accounts)
+	print(f'\n[SCHEDULER] 签到任务完成: {success_count}/{total_count} 成功 (run_id: {run_id})')
 
 	# 只在有失败时发送通知
 	if failed_accounts:
@@ -213,10 +364,10 @@ async def auto_checkin_task():
 			notification_content += f'\n❌ {account["name"]}: {account["error"]}'
 
 		try:
-			notify.push_message('AnyRouter 自动签到提醒', notification_content, msg_type='text')
-			print('[SCHEDULER] 📧 通知已发送')
+			await outbox.enqueue_push(f'{run_id}:summary', 'AnyRouter 自动签到提醒', notification_content, msg_type='text')
+			print('[SCHEDULER] 📧 通知已加入发送队列')
 		except Exception as e:
-			print(f'[SCHEDULER] ⚠️ 发送通知失败: {e}')
+			print(f'[SCHEDULER] ⚠️ 通知入队失败: {e}')
 
 
 def start_scheduler():
@@ -224,12 +375,26 @@ def start_scheduler():
 	scheduler = AsyncIOScheduler()
 
 	# 每 6 小时执行一次签到任务（与 GitHub Actions 保持一致）
-	scheduler.add_job(auto_checkin_task, CronTrigger(hour='*/6'), id='auto_checkin', name='自动签到任务')
+	# 上一次任务未结束时不会重复启动，错过的多次触发合并为一次
+	scheduler_config = SchedulerConfig.load_from_env()
+	scheduler.add_job(
+		auto_checkin_task,
+		checkin_trigger(),
+		id='auto_checkin',
+		name='自动签到任务',
+		max_instances=1,
+		coalesce=True,
+		misfire_grace_time=scheduler_config.misfire_grace_time,
+	)
 
 	# 启动调度器
 	scheduler.start()
 	print('🚀 定时任务调度器已启动')
 	print('📅 签到任务将每 6 小时执行一次')
+	if scheduler_config.spread_window:
+		print(f'⏱️ 每个账号在触发后 {scheduler_config.spread_window} 秒内按固定偏移签到')
+	if scheduler_config.shard_count > 1:
+		print(f'🧩 当前实例负责分片 {scheduler_config.shard_index}/{scheduler_config.shard_count}')
 
 	return scheduler
 
@@ -237,7 +402,18 @@ def start_scheduler():
 async def test_checkin_task():
 	"""测试签到任务"""
 	print('🧪 测试签到任务...\n')
-	await auto_checkin_task()
+	try:
+		# 测试时不分散，立即签到所有账号
+		await auto_checkin_task(spread=False)
+		# 发送入队的通知后再退出
+		await outbox.drain()
+	finally:
+		await outbox.stop()
+		smtp_pool.close()
+		await http_pool.aclose()
+		await push_http_pool.aclose()
+		await browser_pool.close()
+		adb.shutdown()
 	print('\n✅ 测试完成')
 
 
@@ -248,6 +424,8 @@ if __name__ == '__main__':
 	else:
 		# 正常模式：启动调度器并保持运行
 		scheduler = start_scheduler()
+		# 启动通知发件箱 worker，继续发送上次退出前没有发送完的通知
+		asyncio.get_event_loop().call_soon(outbox.start)
 
 		try:
 			# 保持程序运行
@@ -255,4 +433,11 @@ if __name__ == '__main__':
 		except (KeyboardInterrupt, SystemExit):
 			print('\n⚠️ 调度器正在关闭...')
 			scheduler.shutdown()
+			loop = asyncio.get_event_loop()
+			loop.run_until_complete(outbox.stop())
+			smtp_pool.close()
+			loop.run_until_complete(http_pool.aclose())
+			loop.run_until_complete(push_http_pool.aclose())
+			loop.run_until_complete(browser_pool.close())
+			adb.shutdown()
 			print('✅ 调度器已停止')